@@ -52,6 +52,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -87,13 +88,83 @@ WSGI_APPLICATION = 'Sasha.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
+# Одно пишущее соединение default и соединение только для чтения read к тому же
+# файлу, по одному на поток, живут CONN_MAX_AGE секунд. Бэкенд apps.sqlite_backend
+# включает WAL и PRAGMA из PRAGMAS, см. DEFAULT_PRAGMAS в нём.
+# Чтение вне transaction.atomic идёт через read, см. apps.db_router.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'apps.sqlite_backend',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 60,
+        'PRAGMAS': {
+            'busy_timeout': 5000,
+        },
+    },
+    'read': {
+        'ENGINE': 'apps.sqlite_backend',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 60,
+        'READ_ONLY': True,
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
+}
+
+DATABASE_ROUTERS = ['apps.db_router.ReadWriteRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sasha-default',
     }
 }
 
+# Тема и аватарка пользователя для get_base_context
+BASE_CONTEXT_CACHE_ALIAS = 'default'
+BASE_CONTEXT_CACHE_TIMEOUT = 60 * 15
+
+# Каталог работ: карточек на странице и время жизни готовых страниц.
+# Страницы сбрасываются при любом изменении работ.
+WORKS_PAGE_SIZE = 24
+WORKS_CACHE_TIMEOUT = 60 * 60
+
+# Полнотекстовый поиск по работам и сохранённым постам: результатов на странице
+SEARCH_PAGE_SIZE = 20
+
+# Сохранённые посты: постов на странице и тегов в одном фильтре
+SAVED_POSTS_PAGE_SIZE = 20
+SAVED_POSTS_MAX_TAGS = 20
+
+# Выгрузка и загрузка сохранённых постов в NDJSON: постов за один запрос к базе
+SAVED_POSTS_EXPORT_CHUNK_SIZE = 2000
+SAVED_POSTS_IMPORT_BATCH_SIZE = 1000
+# Выгрузка собирается до ответа: до этого размера в памяти, дальше во временном файле
+SAVED_POSTS_EXPORT_SPOOL_SIZE = 1024 * 1024
+
+# Ленты каналов: постов на странице, сколько последних постов канала получает
+# новый участник, размер пачки при раскладке поста по лентам.
+# Посты каналов, где участников больше CANAL_FANOUT_MAX_MEMBERS,
+# не раскладываются по лентам, а читаются при выводе ленты.
+CANAL_FEED_PAGE_SIZE = 20
+CANAL_TIMELINE_BACKFILL = 50
+CANAL_FANOUT_BATCH_SIZE = 1000
+CANAL_FANOUT_MAX_MEMBERS = 5000
+
+# Счётчики лайков копятся в памяти и записываются в базу не реже раза
+# в LIKES_FLUSH_INTERVAL секунд или когда изменилось LIKES_FLUSH_MAX_PENDING постов
+LIKES_FLUSH_INTERVAL = 2
+LIKES_FLUSH_MAX_PENDING = 500
+
+# Метрики обработчиков (apps.metrics): токен для сборщика Prometheus
+# на /admin/metrics/prometheus/, пустой - только для администраторов
+METRICS_TOKEN = os.environ.get('SASHA_METRICS_TOKEN', '')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -139,6 +210,15 @@ LOGIN_URL = '/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Размер страницы в списке пользователей администратора
+ADMIN_USERS_PAGE_SIZE = 50
+ADMIN_USERS_MAX_PAGE_SIZE = 500
+
+# Ограничения для загружаемых аватарок
+AVATAR_UPLOAD_MAX_SIZE = 2 * 1024 * 1024
+AVATAR_UPLOAD_MAX_SIDE = 1600
+AVATAR_UPLOAD_FORMATS = ['png', 'jpeg']
+
 #EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 #EMAIL_HOST = 'smtp.gmail.com'
 #EMAIL_PORT = 465
@@ -147,6 +227,40 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 #EMAIL_USE_SSL = True
 #DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Очередь исходящих писем, отправляется командой run_mail_queue.
+# Для тестов подойдут django.core.mail.backends.console.EmailBackend
+# или django.core.mail.backends.filebased.EmailBackend с EMAIL_FILE_PATH.
+MAIL_QUEUE_BACKEND = 'apps.mail_backends.PooledSMTPBackend'
+MAIL_QUEUE_BATCH_SIZE = 50
+MAIL_QUEUE_POLL_INTERVAL = 5
+MAIL_QUEUE_MAX_ATTEMPTS = 5
+MAIL_QUEUE_RETRY_DELAY = 30
+MAIL_QUEUE_MAX_RETRY_DELAY = 60 * 60
+
+# Пул SMTP-соединений для apps.mail_backends.PooledSMTPBackend
+MAIL_POOL_SIZE = 4
+MAIL_POOL_IDLE_TIMEOUT = 60
+MAIL_POOL_ACQUIRE_TIMEOUT = 30
+
+# Решение квадратных уравнений через equations/solve/
+EQUATIONS_MAX_BATCH = 10000
+# С какого размера пачки считать через NumPy (если установлен)
+EQUATIONS_VECTORIZE_THRESHOLD = 64
+# Движок задач equations/problems/: размер систем и степень многочленов,
+# число шагов интегрирования по умолчанию и максимальное
+EQUATIONS_MAX_SIZE = 100
+EQUATIONS_INTEGRAL_STEPS = 1000
+EQUATIONS_INTEGRAL_MAX_STEPS = 100000
+# Предел объёма вычислений на запрос: сумма точек интегрирования, n³ для систем,
+# степень³ для многочленов и по единице на квадратное уравнение
+EQUATIONS_MAX_WORK = 5000000
+# Кэш решений в памяти процесса и файл прогрева от команды warm_equation_cache
+EQUATIONS_CACHE_SIZE = 10000
+EQUATIONS_CACHE_TTL = 60 * 60 * 24
+EQUATIONS_CACHE_WARM_FILE = os.path.join(BASE_DIR, 'equations_warm.ndjson')
+# Загрузка файлов через equations/upload/: сколько строк решать и отдавать за раз
+EQUATIONS_UPLOAD_CHUNK_SIZE = 1000
+
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, "static_in_dev"),
 ]
@@ -1,3 +1,10 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Work
+
+
+@admin.register(Work)
+class WorkAdmin(admin.ModelAdmin):
+    list_display = ('title', 'slug', 'price', 'updated')
+    search_fields = ('title',)
+    prepopulated_fields = {'slug': ('title',)}
@@ -0,0 +1,113 @@
+"""
+Уменьшенные копии аватарок.
+Для каждого размера из AVATAR_SIZES создаются WebP и JPEG рядом с оригиналом,
+чтобы страницы не загружали исходное изображение целиком.
+"""
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+
+DEFAULT_AVATAR = '/static/default.jpg'
+
+# Стороны квадратов в пикселях: 1.5rem, 10rem и 15rem из base.html с запасом для HiDPI
+AVATAR_SIZES = {
+    'small': 48,
+    'big': 320,
+    'extra': 480
+}
+
+AVATAR_FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg')
+}
+
+THUMBNAIL_QUALITY = 85
+
+
+def thumbnail_name(name, size, image_format):
+    """
+    Имя уменьшенной копии.
+    :param name: имя оригинала в хранилище
+    :param size: ключ из AVATAR_SIZES
+    :param image_format: ключ из AVATAR_FORMATS
+    :return: имя вида avatars/photo.png.small.webp
+    """
+    return '{}.{}.{}'.format(name, size, AVATAR_FORMATS[image_format][1])
+
+
+def thumbnail_names(name):
+    """
+    Имена всех уменьшенных копий.
+    :param name: имя оригинала в хранилище
+    :return: список имён
+    """
+    return [
+        thumbnail_name(name, size, image_format)
+        for size in AVATAR_SIZES for image_format in AVATAR_FORMATS
+    ]
+
+
+def thumbnail_source(name):
+    """
+    Имя оригинала по имени уменьшенной копии.
+    :param name: имя файла в хранилище
+    :return: имя оригинала или None, если файл не является копией
+    """
+    for size in AVATAR_SIZES:
+        for _, extension in AVATAR_FORMATS.values():
+            suffix = '.{}.{}'.format(size, extension)
+            if name.endswith(suffix):
+                return name[:-len(suffix)]
+    return None
+
+
+def build_thumbnails(image, force=False):
+    """
+    Создание уменьшенных копий аватарки.
+    Изображение обрезается до квадрата по центру, как background-size: cover.
+    Содержимое оригинала под одним именем не меняется, поэтому готовые копии
+    не пересоздаются.
+    :param image: значение поля UserAvatar.image
+    :param force: пересоздать копии, даже если они уже есть
+    """
+    storage = image.storage
+    names = thumbnail_names(image.name)
+    if not force and all(storage.exists(name) for name in names):
+        return
+    image.open('rb')
+    try:
+        with Image.open(image) as original:
+            original = ImageOps.exif_transpose(original).convert('RGB')
+            for size, side in AVATAR_SIZES.items():
+                thumbnail = ImageOps.fit(original, (side, side), Image.LANCZOS)
+                for image_format, (pil_format, _) in AVATAR_FORMATS.items():
+                    buffer = BytesIO()
+                    thumbnail.save(buffer, pil_format, quality=THUMBNAIL_QUALITY)
+                    name = thumbnail_name(image.name, size, image_format)
+                    storage.save_derivative(name, ContentFile(buffer.getvalue()))
+    finally:
+        image.close()
+
+
+def avatar_urls(image):
+    """
+    Ссылки на аватарку каждого размера.
+    Если уменьшенной копии нет, используется оригинал.
+    :param image: значение поля UserAvatar.image или None
+    :return: словарь вида {'small': {'webp': url, 'jpeg': url}, ...}
+    """
+    urls = dict()
+    for size in AVATAR_SIZES:
+        urls[size] = dict()
+        for image_format in AVATAR_FORMATS:
+            if not image:
+                urls[size][image_format] = DEFAULT_AVATAR
+                continue
+            name = thumbnail_name(image.name, size, image_format)
+            if image.storage.exists(name):
+                urls[size][image_format] = image.storage.url(name)
+            else:
+                urls[size][image_format] = image.url
+    return urls
@@ -0,0 +1,817 @@
+"""
+Нагрузочный прогон страниц из apps/urls.py.
+seed() заполняет пустую базу пользователями, темами, аватарками, работами,
+сохранёнными постами и каналами, run_route() открывает страницу тестовым
+клиентом Django из нескольких потоков одновременно и считает задержки
+(p50/p95/p99), пропускную способность и число SQL-запросов на запрос.
+compare() сравнивает результат с сохранённым эталоном.
+Как открывать каждую страницу, описано в ROUTES, страницы с параметрами
+в адресе без описания пропускаются.
+"""
+import asyncio
+import contextvars
+import itertools
+import json
+import random
+import threading
+import time
+from datetime import timedelta
+from http.cookies import SimpleCookie
+from io import BytesIO
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.tokens import default_token_generator
+from django.core.asgi import get_asgi_application
+from django.core.files.base import ContentFile
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.middleware.csrf import _get_new_csrf_token
+from django.test import Client
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from PIL import Image
+
+from . import models
+from .avatars import build_thumbnails
+from .feeds import fan_out_post
+from .likes import get_like_buffer, reconcile_likes
+from .post_transfer import save_batch
+from .text_search import index_work
+from .themes import BACKGROUND_THEMES, THEMES
+from .tokens import CONFIRM_TOKEN
+from .user_search import index_user
+
+
+PASSWORD = 'benchmark-password'
+# Второй пароль для смены пароля: новый не может совпадать со старым
+OTHER_PASSWORD = 'benchmark-changed'
+
+# Как открываются страницы: Client через WSGI или AsgiClient через приложение ASGI
+WSGI = 'wsgi'
+ASGI = 'asgi'
+
+# От чьего имени открывается страница
+ANONYMOUS = 'anonymous'
+USER = 'user'
+ADMIN = 'admin'
+# Отдельный пользователь для страниц, которые меняют его данные
+VICTIM = 'victim'
+# Свой пользователь у каждого потока для смены пароля
+PASSWORD_OWNER = 'password_owner'
+
+WORDS = (
+    'python', 'django', 'база', 'данных', 'индекс', 'запрос', 'очередь', 'кэш',
+    'поиск', 'лента', 'канал', 'шаблон', 'уравнение', 'матрица', 'интеграл',
+    'сервер', 'клиент', 'поток', 'профиль', 'аватарка', 'тема', 'работа',
+)
+TAGS = ('python', 'django', 'sql', 'news', 'math', 'web', 'music', 'books', 'travel', 'work')
+
+QUANTILES = (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))
+
+
+class Fixture(object):
+    """
+    Данные, созданные seed(), на которые ссылаются описания страниц.
+    """
+    def __init__(self, users, admin, victim, inactive, signer, password_owners, work_slugs,
+                 canal_post_ids, avatar_name):
+        self.users = users
+        self.admin = admin
+        self.victim = victim
+        self.inactive = inactive
+        self.signer = signer
+        self.password_owners = password_owners
+        self.work_slugs = work_slugs
+        self.canal_post_ids = canal_post_ids
+        self.avatar_name = avatar_name
+        self.passwords = {user.id: PASSWORD for user in password_owners}
+        self.registrations = itertools.count()
+        self._lock = threading.Lock()
+
+    def login_user(self, login, worker):
+        """
+        Пользователь, под которым работает поток.
+        Обычные пользователи и владельцы паролей у потоков разные.
+        :param login: ANONYMOUS, USER, ADMIN, VICTIM или PASSWORD_OWNER
+        :param worker: номер потока
+        :return: пользователь или None
+        """
+        if login == USER:
+            return self.users[worker % len(self.users)]
+        if login == PASSWORD_OWNER:
+            # Пароль мог смениться в прошлых прогонах, хэш для сессии берётся из базы
+            return User.objects.get(pk=self.password_owners[worker % len(self.password_owners)].pk)
+        return {ADMIN: self.admin, VICTIM: self.victim}.get(login)
+
+    def login_form(self, user):
+        return {'username': self.signer.username, 'password': PASSWORD}
+
+    def registration_form(self, user):
+        """
+        Данные формы регистрации, у каждого запроса новый логин и почта.
+        """
+        with self._lock:
+            number = next(self.registrations)
+        return {
+            'username': 'bench-reg{}'.format(number), 'password': PASSWORD,
+            'first_name': 'Имя', 'last_name': 'Фамилия',
+            'email': 'bench-reg{}@example.com'.format(number),
+        }
+
+    def password_form(self, user):
+        """
+        Данные формы смены пароля: пароль пользователя меняется по очереди
+        на один из двух, чтобы новый всегда отличался от текущего.
+        """
+        with self._lock:
+            old_password = self.passwords[user.id]
+            new_password = OTHER_PASSWORD if old_password == PASSWORD else PASSWORD
+            self.passwords[user.id] = new_password
+        return {'old_password': old_password, 'new_password': new_password,
+                'password_confirmation': new_password}
+
+
+def uid(user):
+    return urlsafe_base64_encode(force_bytes(user.pk))
+
+
+def random_title(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))).capitalize()
+
+
+def avatar_content():
+    """
+    Небольшая PNG-картинка для аватарок.
+    """
+    buffer = BytesIO()
+    Image.new('RGB', (256, 256), (52, 101, 164)).save(buffer, 'PNG')
+    return ContentFile(buffer.getvalue(), name='benchmark.png')
+
+
+def seed(users=200, posts_per_user=20, works=50, canals=5, random_seed=0, clients=16):
+    """
+    Заполнение пустой базы данными для прогона.
+    Пользователи, темы, аватарки и работы создаются через bulk_create,
+    посты - как при загрузке из NDJSON, публикации в каналах раскладываются
+    по лентам, как при обычной публикации.
+    Все аватарки - один файл, поэтому в MEDIA_ROOT добавляется одна картинка.
+    :param users: число обычных пользователей
+    :param posts_per_user: сохранённых постов у каждого
+    :param works: число работ в каталоге
+    :param canals: число каналов, в первом состоят все пользователи
+    :param random_seed: зерно генератора, одинаковое зерно даёт одинаковые данные
+    :param clients: наибольшее число одновременных клиентов, каждому свой
+        пользователь для смены пароля
+    :return: объект Fixture
+    """
+    rng = random.Random(random_seed)
+    now = timezone.now()
+    password = make_password(PASSWORD)
+
+    User.objects.bulk_create([
+        User(username='bench{}'.format(number), email='bench{}@example.com'.format(number),
+             first_name='Имя{}'.format(number), last_name='Фамилия{}'.format(number),
+             password=password, date_joined=now)
+        for number in range(users)
+    ])
+    user_list = list(User.objects.filter(username__startswith='bench').order_by('id'))
+    admin = User.objects.create_superuser('bench-admin', 'bench-admin@example.com', PASSWORD)
+    victim = User.objects.create_user('bench-victim', 'bench-victim@example.com', PASSWORD)
+    inactive = User.objects.create_user('bench-inactive', 'bench-inactive@example.com', PASSWORD,
+                                        is_active=False)
+    signer = User.objects.create_user('bench-login', 'bench-login@example.com', PASSWORD)
+    User.objects.bulk_create([
+        User(username='bench-password{}'.format(number),
+             email='bench-password{}@example.com'.format(number), password=password, date_joined=now)
+        for number in range(clients)
+    ])
+    password_owners = list(User.objects.filter(username__startswith='bench-password').order_by('id'))
+    for user in user_list:
+        index_user(user)
+
+    models.ThemeChanger.objects.bulk_create([
+        models.ThemeChanger(user=user, theme=rng.choice(list(THEMES)),
+                            background_theme=rng.choice(list(BACKGROUND_THEMES)))
+        for user in user_list
+    ])
+
+    first_avatar = models.UserAvatar(user=user_list[0])
+    first_avatar.image.save('benchmark.png', avatar_content())
+    build_thumbnails(first_avatar.image)
+    models.UserAvatar.objects.bulk_create([
+        models.UserAvatar(user=user, image=first_avatar.image.name)
+        for user in user_list[4::4]
+    ])
+
+    models.Work.objects.bulk_create([
+        models.Work(title=random_title(rng), slug='bench-work-{}'.format(number),
+                    description=' '.join(random_title(rng) for _ in range(5)),
+                    price=rng.randint(100, 10000))
+        for number in range(works)
+    ])
+    for work in models.Work.objects.iterator():
+        index_work(work)
+
+    for user in user_list:
+        save_batch(user, [
+            (random_title(rng), 'https://example.com/{}/{}'.format(user.id, number),
+             now - timedelta(minutes=rng.randint(0, 60 * 24 * 30)),
+             rng.sample(TAGS, rng.randint(1, 3)))
+            for number in range(posts_per_user)
+        ])
+
+    models.Canals.objects.bulk_create([
+        models.Canals(name='Канал {}'.format(number), code='bench-canal-{}'.format(number),
+                      admin=rng.choice(user_list))
+        for number in range(canals)
+    ])
+    canal_list = list(models.Canals.objects.order_by('id'))
+    memberships = {(user.id, canal_list[0].id) for user in user_list}
+    for user in user_list:
+        for canal in rng.sample(canal_list, rng.randint(0, min(2, len(canal_list)))):
+            memberships.add((user.id, canal.id))
+    models.UserCanals.objects.bulk_create([
+        models.UserCanals(user_id=user_id, canal_id=canal_id, datetime=now)
+        for user_id, canal_id in sorted(memberships)
+    ])
+    members = dict()
+    for user_id, canal_id in sorted(memberships):
+        members.setdefault(canal_id, []).append(user_id)
+    for canal in canal_list:
+        canal.members_count = len(members.get(canal.id, []))
+        canal.fan_out_on_read = canal.members_count > settings.CANAL_FANOUT_MAX_MEMBERS
+    models.Canals.objects.bulk_update(canal_list, ['members_count', 'fan_out_on_read'])
+
+    user_canals = dict()
+    for user_id, canal_id in sorted(memberships):
+        user_canals.setdefault(user_id, []).append(canal_id)
+    posts = list(models.SavedPosts.objects.filter(user__in=user_list).order_by('id')
+                 .values_list('id', 'user_id', 'datetime'))
+    canal_posts = []
+    for post_id, user_id, datetime in rng.sample(posts, len(posts) // 5):
+        canal_id = rng.choice(user_canals[user_id])
+        canal_posts.append(models.PostsCanals(post_id=post_id, canal_id=canal_id,
+                                              user_id=user_id, datetime=datetime))
+    models.PostsCanals.objects.bulk_create(canal_posts)
+    canal_post_list = list(models.PostsCanals.objects.order_by('id'))
+    for post in canal_post_list:
+        fan_out_post(post)
+
+    models.LikesPostInCanals.objects.bulk_create([
+        models.LikesPostInCanals(user_id=user_id, post=post, datetime=now)
+        for post in canal_post_list
+        for user_id in rng.sample(members[post.canal_id], min(len(members[post.canal_id]), rng.randint(0, 5)))
+    ], ignore_conflicts=True)
+    reconcile_likes()
+
+    return Fixture(
+        user_list, admin, victim, inactive, signer, password_owners,
+        [slug for slug in models.Work.objects.order_by('id').values_list('slug', flat=True)],
+        [post.id for post in canal_post_list if post.canal_id == canal_list[0].id],
+        first_avatar.image.name,
+    )
+
+
+class Route(object):
+    """
+    Описание того, как открыть страницу.
+    Значения kwargs, query и data могут быть функциями от (Fixture, пользователь потока).
+    :param login: ANONYMOUS, USER, ADMIN или VICTIM
+    :param method: метод HTTP
+    :param kwargs: параметры адреса
+    :param query: параметры строки запроса
+    :param data: данные формы или тело запроса
+    :param content_type: Content-Type тела, если это не форма
+    :param fresh_session: входить заново перед каждым запросом, если страница меняет сессию
+    """
+    def __init__(self, login=USER, method='get', kwargs=None, query=None, data=None,
+                 content_type=None, fresh_session=False):
+        self.login = login
+        self.method = method
+        self.kwargs = kwargs or dict()
+        self.query = query or dict()
+        self.data = data
+        self.content_type = content_type
+        self.fresh_session = fresh_session
+
+    def resolve(self, value, fixture, user):
+        return value(fixture, user) if callable(value) else value
+
+
+def import_body(fixture, user):
+    return '\n'.join(json.dumps({
+        'title': 'Импорт {}'.format(number), 'url': 'https://example.com/import/{}'.format(number),
+        'tags': ['python', 'import'],
+    }, ensure_ascii=False) for number in range(20))
+
+
+EQUATIONS_CSV = 'a,b,c\n' + '\n'.join('1,{},{}'.format(-number, number - 1) for number in range(1, 51))
+
+# Описания страниц по шаблону адреса из apps/urls.py
+ROUTES = {
+    'admin/': Route(ADMIN),
+    'admin/users/': Route(ADMIN),
+    'admin/users/bulk/': Route(ADMIN, 'post', data=lambda fixture, user: {
+        'action': 'unblock', 'user_ids': [fixture.victim.id]
+    }),
+    'admin/metrics/': Route(ADMIN),
+    'admin/metrics/prometheus/': Route(ADMIN),
+    'admin/make-admin/<int:user_id>': Route(ADMIN, kwargs=lambda fixture, user: {
+        'user_id': fixture.victim.id
+    }),
+    'admin/make-user/<int:user_id>': Route(ADMIN, kwargs=lambda fixture, user: {
+        'user_id': fixture.victim.id
+    }),
+    'admin/block-user/<int:user_id>': Route(ADMIN, kwargs=lambda fixture, user: {
+        'user_id': fixture.victim.id
+    }),
+    'admin/unblock-user/<int:user_id>': Route(ADMIN, kwargs=lambda fixture, user: {
+        'user_id': fixture.victim.id
+    }),
+    '': Route(USER),
+    'profile/edit/confirm/<uidb64>/<token>/': Route(USER, kwargs=lambda fixture, user: {
+        'uidb64': uid(user), 'token': CONFIRM_TOKEN.make_token(user)
+    }),
+    'profile/reg/': Route(ANONYMOUS, 'post', data=Fixture.registration_form),
+    'profile/password/': Route(PASSWORD_OWNER, 'post', data=Fixture.password_form),
+    'profile/activate/<uidb64>/<token>/': Route(ANONYMOUS, fresh_session=True, kwargs=lambda fixture, user: {
+        'uidb64': uid(fixture.inactive), 'token': CONFIRM_TOKEN.make_token(fixture.inactive)
+    }),
+    'profile/logout/': Route(USER, fresh_session=True),
+    'profile/login/': Route(ANONYMOUS, 'post', fresh_session=True, data=Fixture.login_form),
+    'profile/avatar/remove/': Route(VICTIM, 'post'),
+    'reset-password/': Route(ANONYMOUS),
+    'reset-password/done': Route(ANONYMOUS),
+    'reset/<uidb64>/<token>/': Route(ANONYMOUS, kwargs=lambda fixture, user: {
+        'uidb64': uid(fixture.users[0]), 'token': default_token_generator.make_token(fixture.users[0])
+    }),
+    'reset/done/': Route(ANONYMOUS),
+    'search/': Route(USER, query={'q': 'django индекс'}),
+    'posts/tags/': Route(USER, query={'tags': 'python,sql', 'type': 'or'}),
+    'posts/import/': Route(VICTIM, 'post', data=import_body, content_type='application/x-ndjson'),
+    'feed/<int:post_id>/like/': Route(USER, 'post', kwargs=lambda fixture, user: {
+        'post_id': fixture.canal_post_ids[user.id % len(fixture.canal_post_ids)]
+    }, data={'liked': '1'}),
+    'equations/solve/': Route(ANONYMOUS, query={'a': '1', 'b': '-3', 'c': '2'}),
+    'equations/upload/': Route(ANONYMOUS, 'post', data=EQUATIONS_CSV, content_type='text/csv'),
+    'equations/problems/': Route(ANONYMOUS, 'post', data=json.dumps({'problems': [
+        {'type': 'quadratic', 'a': 1, 'b': -3, 'c': 2},
+        {'type': 'polynomial', 'coefficients': [1, 0, -1]},
+        {'type': 'linear', 'a': [[2, 1], [1, 3]], 'b': [3, 5]},
+    ]}), content_type='application/json'),
+    'works/<str:slug>/': Route(USER, kwargs=lambda fixture, user: {'slug': fixture.work_slugs[0]}),
+    '^media/(?P<path>.*)$': Route(ANONYMOUS, kwargs=lambda fixture, user: {'path': fixture.avatar_name}),
+}
+
+
+def url_patterns(resolver=None, prefix=''):
+    """
+    Все страницы проекта.
+    :return: список пар (шаблон адреса, URLPattern)
+    """
+    resolver = resolver or get_resolver()
+    result = []
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            result += url_patterns(pattern, prefix + str(pattern.pattern))
+        elif isinstance(pattern, URLPattern):
+            result.append((prefix + str(pattern.pattern), pattern))
+    return result
+
+
+def route_spec(route, pattern):
+    """
+    Описание страницы из ROUTES, для страниц без параметров по умолчанию GET
+    от имени обычного пользователя.
+    :return: объект Route или None, если страницу открыть нельзя
+    """
+    if route in ROUTES:
+        return ROUTES[route]
+    if pattern.pattern.regex.groups:
+        return None
+    return Route()
+
+
+def build_url(route, pattern, spec, fixture, user):
+    """
+    Адрес страницы с подставленными параметрами.
+    """
+    kwargs = spec.resolve(spec.kwargs, fixture, user)
+    url = '/' + route.lstrip('^').rstrip('$')
+    for name, value in kwargs.items():
+        for placeholder in ('(?P<{}>.*)'.format(name), '<{}>'.format(name), '<int:{}>'.format(name),
+                            '<str:{}>'.format(name)):
+            url = url.replace(placeholder, str(value))
+    return url
+
+
+def percentile(values, q):
+    """
+    Квантиль отсортированного списка с линейной интерполяцией.
+    """
+    if not values:
+        return None
+    position = (len(values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class QueryCounter(object):
+    """
+    Число SQL-запросов одного запроса к странице.
+    """
+    def __init__(self):
+        self.count = 0
+
+
+_counter = contextvars.ContextVar('benchmark_queries', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    """
+    Обёртка выполнения SQL, учитывает запрос в счётчике текущего запроса.
+    Счётчик лежит в contextvar, поэтому учитываются и запросы
+    из потоков sync_to_async асинхронных обработчиков.
+    """
+    counter = _counter.get()
+    if counter is not None:
+        counter.count += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class AsgiClient(object):
+    """
+    Клиент, открывающий страницы через приложение ASGI проекта
+    так же, как сервер ASGI: один запрос - один вызов application(scope, receive, send).
+    Вход выполняется через Client, его cookie передаются в запросах,
+    а токен CSRF из cookie повторяется в заголовке, как это делает браузер.
+    """
+    def __init__(self, application):
+        self.application = application
+        self.session_client = Client()
+        self.cookies = SimpleCookie()
+
+    def login(self, user):
+        self.session_client.logout()
+        if user is not None:
+            self.session_client.force_login(user)
+        self.cookies = SimpleCookie()
+        self.cookies.update(self.session_client.cookies)
+        self.cookies[settings.CSRF_COOKIE_NAME] = _get_new_csrf_token()
+
+    def scope(self, method, path, query, body, content_type):
+        headers = [
+            (b'host', b'testserver'),
+            (b'x-csrftoken', self.cookies[settings.CSRF_COOKIE_NAME].value.encode()),
+            (b'content-length', str(len(body)).encode()),
+            (b'cookie', '; '.join(
+                '{}={}'.format(name, morsel.value) for name, morsel in self.cookies.items()
+            ).encode()),
+        ]
+        if content_type:
+            headers.append((b'content-type', content_type.encode()))
+        return {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': method.upper(), 'scheme': 'http', 'root_path': '',
+            'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+            'headers': headers, 'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+        }
+
+    async def request(self, method, url, data, content_type=None):
+        """
+        Один запрос с телом целиком, ответ читается полностью.
+        :return: код ответа
+        """
+        path, _, query = url.partition('?')
+        if method == 'get':
+            query, body = urlencode(data or dict(), doseq=True), b''
+        elif content_type is None:
+            body, content_type = encode_multipart(BOUNDARY, data or dict()), MULTIPART_CONTENT
+        else:
+            body = data.encode() if isinstance(data, str) else data or b''
+        received = False
+        response = dict()
+
+        async def receive():
+            nonlocal received
+            if received:
+                return {'type': 'http.disconnect'}
+            received = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                for name, value in message['headers']:
+                    if name.lower() == b'set-cookie':
+                        self.set_cookie(value.decode('latin-1'))
+
+        await self.application(self.scope(method, path, query, body, content_type), receive, send)
+        return response['status']
+
+    def set_cookie(self, header):
+        cookie = SimpleCookie(header)
+        for name, morsel in cookie.items():
+            if morsel['max-age'] == '0' or not morsel.value:
+                self.cookies.pop(name, None)
+            else:
+                self.cookies[name] = morsel.value
+
+
+class Worker(object):
+    """
+    Клиент, открывающий страницу заданное число раз.
+    В режиме WSGI у каждого клиента свой поток и Client,
+    в режиме ASGI все клиенты - задачи одного цикла событий с AsgiClient.
+    """
+    def __init__(self, number, route, pattern, spec, fixture, requests, warmup):
+        self.number = number
+        self.route = route
+        self.pattern = pattern
+        self.spec = spec
+        self.fixture = fixture
+        self.requests = requests
+        self.warmup = warmup
+        self.user = fixture.login_user(spec.login, number)
+        self.samples = []
+        self.started = self.finished = None
+        self.error = None
+        self.exception = None
+
+    def login(self, client):
+        client.logout()
+        if self.user is not None:
+            client.force_login(self.user)
+
+    def arguments(self):
+        """
+        Метод клиента и его аргументы для одного запроса.
+        :return: кортеж (метод, адрес, данные, дополнительные параметры)
+        """
+        spec = self.spec
+        url = build_url(self.route, self.pattern, spec, self.fixture, self.user)
+        data = spec.resolve(spec.data, self.fixture, self.user)
+        extra = dict()
+        if spec.content_type:
+            extra['content_type'] = spec.content_type
+        if spec.method == 'get':
+            data = spec.resolve(spec.query, self.fixture, self.user)
+        elif spec.query:
+            url += '?' + '&'.join('{}={}'.format(name, value) for name, value in spec.query.items())
+        return spec.method, url, data, extra
+
+    def request(self, client):
+        """
+        Один запрос. Потоковый ответ читается целиком.
+        :return: кортеж (секунды, SQL-запросы, код ответа)
+        """
+        method, url, data, extra = self.arguments()
+        counter = QueryCounter()
+        token = _counter.set(counter)
+        try:
+            started = time.perf_counter()
+            response = getattr(client, method)(url, data, **extra)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            return time.perf_counter() - started, counter.count, response.status_code
+        finally:
+            _counter.reset(token)
+
+    async def arequest(self, client):
+        """
+        Один запрос через AsgiClient.
+        Исключение внутри приложения считается ответом с кодом 'exception'.
+        :return: кортеж (секунды, SQL-запросы, код ответа)
+        """
+        method, url, data, extra = self.arguments()
+        counter = QueryCounter()
+        token = _counter.set(counter)
+        try:
+            started = time.perf_counter()
+            try:
+                status = await client.request(method, url, data, extra.get('content_type'))
+            except Exception as error:
+                status = 'exception'
+                self.exception = error
+            return time.perf_counter() - started, counter.count, status
+        finally:
+            _counter.reset(token)
+
+    def run(self, barrier):
+        try:
+            client = Client(raise_request_exception=False)
+            self.login(client)
+            for _ in range(self.warmup):
+                self.request(client)
+            barrier.wait()
+            self.started = time.perf_counter()
+            for _ in range(self.requests):
+                if self.spec.fresh_session:
+                    self.login(client)
+                self.samples.append(self.request(client))
+            self.finished = time.perf_counter()
+        except threading.BrokenBarrierError:
+            pass
+        except Exception as error:
+            self.error = error
+            barrier.abort()
+        finally:
+            connections.close_all()
+
+    async def arun(self, application, ready, start):
+        try:
+            client = AsgiClient(application)
+            await sync_to_async(client.login)(self.user)
+            for _ in range(self.warmup):
+                await self.arequest(client)
+        except Exception as error:
+            self.error = error
+            return
+        finally:
+            ready.release()
+        await start.wait()
+        try:
+            self.started = time.perf_counter()
+            for _ in range(self.requests):
+                if self.spec.fresh_session:
+                    await sync_to_async(client.login)(self.user)
+                self.samples.append(await self.arequest(client))
+            self.finished = time.perf_counter()
+        except Exception as error:
+            self.error = error
+
+
+def run_threads(workers):
+    """
+    Прогон клиентов WSGI, каждый в своём потоке.
+    Замер начинается, когда все потоки сделали разогревочные запросы.
+    """
+    barrier = threading.Barrier(len(workers))
+    threads = [threading.Thread(target=worker.run, args=(barrier,), daemon=True) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+async def run_tasks(workers):
+    """
+    Прогон клиентов ASGI задачами одного цикла событий.
+    Замер начинается, когда все задачи сделали разогревочные запросы.
+    """
+    application = get_asgi_application()
+    ready = asyncio.Semaphore(0)
+    start = asyncio.Event()
+    tasks = [asyncio.ensure_future(worker.arun(application, ready, start)) for worker in workers]
+    for _ in workers:
+        await ready.acquire()
+    start.set()
+    await asyncio.gather(*tasks)
+    await sync_to_async(connections.close_all)()
+
+
+def run_route(route, pattern, spec, fixture, concurrency, requests, warmup=2, server=WSGI):
+    """
+    Прогон одной страницы при заданном числе одновременных клиентов.
+    :param route: шаблон адреса
+    :param pattern: URLPattern
+    :param spec: объект Route
+    :param fixture: объект Fixture
+    :param concurrency: число одновременных клиентов
+    :param requests: всего запросов, делятся между клиентами
+    :param warmup: запросов на клиента перед замером, не учитываются
+    :param server: WSGI - Client в потоках, ASGI - AsgiClient в цикле событий
+    :return: словарь с квантилями задержки в миллисекундах, пропускной
+        способностью в запросах в секунду, числом SQL-запросов и кодами ответов
+    """
+    workers = [
+        Worker(number, route, pattern, spec, fixture,
+               requests // concurrency + (number < requests % concurrency), warmup)
+        for number in range(concurrency)
+    ]
+    if server == ASGI:
+        asyncio.run(run_tasks(workers))
+    else:
+        run_threads(workers)
+    errors = [worker.error for worker in workers if worker.error is not None]
+    if errors:
+        return {'error': '{}: {}'.format(type(errors[0]).__name__, errors[0])}
+    exceptions = [worker.exception for worker in workers if worker.exception is not None]
+
+    samples = [sample for worker in workers for sample in worker.samples]
+    latencies = sorted(seconds * 1000 for seconds, _, _ in samples)
+    queries = sorted(count for _, count, _ in samples)
+    elapsed = max(worker.finished for worker in workers) - min(worker.started for worker in workers)
+    statuses = dict()
+    for _, _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    result = {
+        'requests': len(samples),
+        'throughput': round(len(samples) / elapsed, 2) if elapsed else None,
+        'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else None,
+        'queries_mean': round(sum(queries) / len(queries), 2) if queries else None,
+        'queries_max': queries[-1] if queries else None,
+        'statuses': statuses,
+        'server_errors': sum(count for status, count in statuses.items()
+                             if status.startswith('5') or status == 'exception'),
+    }
+    for name, q in QUANTILES:
+        value = percentile(latencies, q)
+        result[name + '_ms'] = None if value is None else round(value, 3)
+    if exceptions:
+        result['exception'] = '{}: {}'.format(type(exceptions[0]).__name__, exceptions[0])
+    return result
+
+
+def run(fixture, concurrency_levels, requests, warmup=2, only=None, progress=None, server=WSGI):
+    """
+    Прогон всех страниц.
+    :param fixture: объект Fixture
+    :param concurrency_levels: список чисел одновременных клиентов
+    :param requests: запросов на страницу при каждом уровне
+    :param warmup: запросов на клиента перед замером
+    :param only: список подстрок, открываются только страницы с ними в шаблоне адреса
+    :param progress: функция, вызываемая с шаблоном адреса перед прогоном
+    :param server: WSGI или ASGI
+    :return: кортеж (словарь {шаблон адреса: результат}, список пропущенных шаблонов)
+    """
+    connection_created.connect(install_query_counter, dispatch_uid='apps.benchmark')
+    for connection in connections.all():
+        install_query_counter(None, connection)
+    routes = dict()
+    skipped = []
+    for route, pattern in url_patterns():
+        if only and not any(part in route for part in only):
+            continue
+        spec = route_spec(route, pattern)
+        if spec is None:
+            skipped.append(route)
+            continue
+        if progress is not None:
+            progress(route)
+        view = getattr(pattern.callback, 'view_class', pattern.callback)
+        routes[route] = {
+            'view': '{}.{}'.format(view.__module__, view.__name__),
+            'method': spec.method.upper(),
+            'login': spec.login,
+            'levels': {
+                str(level): run_route(route, pattern, spec, fixture, level, requests, warmup, server)
+                for level in concurrency_levels
+            },
+        }
+    get_like_buffer().flush()
+    return routes, skipped
+
+
+def compare(current, baseline, threshold=0.1):
+    """
+    Сравнение результата с эталоном.
+    Регрессия - рост p95 или падение пропускной способности больше чем на threshold,
+    рост среднего числа SQL-запросов или новые ответы 5xx.
+    :param current: результат прогона
+    :param baseline: сохранённый эталон
+    :param threshold: допустимое относительное ухудшение
+    :return: список словарей по странице и уровню с изменениями и признаком регрессии
+    """
+    rows = []
+    for route, result in current['routes'].items():
+        base_route = baseline.get('routes', dict()).get(route)
+        if base_route is None:
+            continue
+        for level, values in result['levels'].items():
+            base = base_route['levels'].get(level)
+            if base is None or 'error' in base or 'error' in values:
+                continue
+            row = {'route': route, 'concurrency': int(level), 'regressions': []}
+            for name in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput', 'queries_mean', 'server_errors'):
+                row[name] = {'baseline': base[name], 'current': values[name],
+                             'change': relative_change(base[name], values[name])}
+            if (row['p95_ms']['change'] or 0) > threshold:
+                row['regressions'].append('p95_ms')
+            if (row['throughput']['change'] or 0) < -threshold:
+                row['regressions'].append('throughput')
+            if (values['queries_mean'] or 0) > (base['queries_mean'] or 0):
+                row['regressions'].append('queries_mean')
+            if values['server_errors'] > base['server_errors']:
+                row['regressions'].append('server_errors')
+            rows.append(row)
+    return rows
+
+
+def relative_change(old, new):
+    if old is None or new is None or not old:
+        return None
+    return round((new - old) / old, 4)
@@ -0,0 +1,123 @@
+"""
+Кэширование пользовательских данных базового контекста
+и готовых фрагментов каталога работ.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+
+from . import models
+from .avatars import avatar_urls
+from .pagination import keyset_paginate
+from .themes import DEFAULT_THEME, DEFAULT_BACKGROUND_THEME
+
+
+USER_CONTEXT_KEY = 'base-context:user:{}'
+WORKS_VERSION_KEY = 'works:version'
+WORKS_PAGE_KEY = 'works:page:{}:{}'
+WORKS_ORDERING = ('title', 'id')
+
+
+def get_context_cache():
+    """
+    Получение кэша для базового контекста.
+    :return: объект кэша из settings.CACHES
+    """
+    return caches[settings.BASE_CONTEXT_CACHE_ALIAS]
+
+
+def build_user_context(user):
+    """
+    Сбор темы и аватарки пользователя из БД.
+    Отсутствующая тема не создаётся, вместо неё берутся значения по умолчанию.
+    :param user: пользователь
+    :return: словарь с ключом темы, темой фона и ссылками на аватарку каждого размера
+    """
+    theme, bg_theme = models.ThemeChanger.objects.filter(user=user).values_list(
+        'theme', 'background_theme'
+    ).first() or (DEFAULT_THEME.key, DEFAULT_BACKGROUND_THEME.key)
+    avatar = models.UserAvatar.objects.filter(user=user).first()
+    return {
+        'theme': theme,
+        'bg_theme': bg_theme,
+        'avatar': avatar_urls(avatar.image if avatar else None),
+        'default_avatar': avatar is None,
+    }
+
+
+def get_user_context(user):
+    """
+    Получение темы и аватарки пользователя через кэш.
+    :param user: пользователь
+    :return: словарь из build_user_context
+    """
+    cache = get_context_cache()
+    key = USER_CONTEXT_KEY.format(user.pk)
+    user_context = cache.get(key)
+    if user_context is None:
+        user_context = build_user_context(user)
+        cache.set(key, user_context, settings.BASE_CONTEXT_CACHE_TIMEOUT)
+    return user_context
+
+
+def invalidate_user_context(user_id):
+    """
+    Сброс кэша базового контекста пользователя.
+    :param user_id: ID пользователя
+    """
+    get_context_cache().delete(USER_CONTEXT_KEY.format(user_id))
+
+
+def get_works_version():
+    """
+    Текущая версия каталога работ, входит в ключи кэша страниц.
+    Если версия пропала из кэша, начинается с текущего времени,
+    чтобы не совпасть со старыми ключами.
+    :return: число
+    """
+    cache = get_context_cache()
+    version = cache.get(WORKS_VERSION_KEY)
+    if version is None:
+        cache.add(WORKS_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(WORKS_VERSION_KEY)
+    return version
+
+
+def bump_works_version():
+    """
+    Сброс всех закэшированных страниц каталога сменой версии.
+    """
+    cache = get_context_cache()
+    try:
+        cache.incr(WORKS_VERSION_KEY)
+    except ValueError:
+        cache.set(WORKS_VERSION_KEY, int(time.time() * 1000), None)
+
+
+def get_works_page(after=None, before=None):
+    """
+    Страница каталога работ: готовый HTML карточек и курсоры соседних страниц.
+    При попадании в кэш к БД не обращается.
+    :param after: курсор, после которого начинается страница
+    :param before: курсор, перед которым заканчивается страница
+    :return: словарь с ключами html, next_cursor, previous_cursor
+    """
+    cache = get_context_cache()
+    cursor = hashlib.md5('{}|{}'.format(after or '', before or '').encode()).hexdigest()
+    key = WORKS_PAGE_KEY.format(get_works_version(), cursor)
+    works_page = cache.get(key)
+    if works_page is None:
+        page = keyset_paginate(
+            models.Work.objects.only('title', 'slug', 'price', 'preview'),
+            WORKS_ORDERING, settings.WORKS_PAGE_SIZE, after=after, before=before
+        )
+        works_page = {
+            'html': render_to_string('components/works_list.html', {'works': page.items}),
+            'next_cursor': page.next_cursor,
+            'previous_cursor': page.previous_cursor,
+        }
+        cache.set(key, works_page, settings.WORKS_CACHE_TIMEOUT)
+    return works_page
@@ -0,0 +1,30 @@
+"""
+Маршрутизация запросов между пишущим соединением и соединениями для чтения.
+"""
+from django.db import connections
+
+
+WRITE_ALIAS = 'default'
+READ_ALIAS = 'read'
+
+
+class ReadWriteRouter(object):
+    """
+    Чтение идёт через соединение READ_ALIAS (query_only), запись и миграции -
+    через единственное пишущее соединение WRITE_ALIAS.
+    Внутри transaction.atomic чтение тоже идёт через пишущее соединение,
+    чтобы видеть свои ещё не зафиксированные изменения.
+    """
+    def db_for_read(self, model, **hints):
+        if READ_ALIAS not in connections.databases or connections[WRITE_ALIAS].in_atomic_block:
+            return WRITE_ALIAS
+        return READ_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return WRITE_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == WRITE_ALIAS
@@ -0,0 +1,184 @@
+"""
+Кэш решений квадратных уравнений.
+Одни и те же задачи из учебников приходят снова и снова, поэтому решение
+ищется сначала в ограниченном LRU-кэше процесса со сроком жизни записей.
+Ключ - коэффициенты, делённые на степень двойки (деление точное) и со знаком,
+при котором первый ненулевой коэффициент положителен: у 2x² - 6x + 4, -x² + 3x - 2
+и 4x² - 12x + 8 одна запись. Решение по ключу всегда совпадает с solve_quadratic.
+Заранее посчитанные решения частых задач команда warm_equation_cache
+пишет в EQUATIONS_CACHE_WARM_FILE, процессы подгружают его при первом обращении
+и после каждого обновления файла.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .solvers import scale_coefficients, solve_quadratic, solve_quadratics
+
+
+# Как часто проверять, не обновился ли файл прогрева, в секундах
+WARM_FILE_CHECK_INTERVAL = 60
+
+
+def normalize_coefficients(a, b, c):
+    """
+    Ключ кэша для уравнения: коэффициенты после scale_coefficients
+    со знаком, при котором первый ненулевой из них положителен.
+    Оба преобразования точные, поэтому у уравнений с одним ключом
+    solve_quadratic даёт одинаковый ответ.
+    :return: кортеж (a, b, c)
+    """
+    scaled = scale_coefficients(a, b, c)
+    if scaled is None:
+        return 0.0, 0.0, 0.0
+    if (scaled[0] or scaled[1] or scaled[2]) < 0:
+        scaled = tuple(-value for value in scaled)
+    return tuple(value + 0.0 for value in scaled)
+
+
+class SolutionCache(object):
+    """
+    LRU-кэш решений со сроком жизни записей.
+    Хранит счётчики попаданий, промахов, вытеснений и устаревших записей.
+    Решения отдаются общими объектами, изменять их нельзя.
+    """
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = dict(hits=0, misses=0, evictions=0, expired=0)
+        self.warm_file_mtime = None
+        self.warm_file_checked = None
+
+    def get(self, key):
+        """
+        Поиск решения.
+        :param key: нормированные коэффициенты
+        :return: решение или None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] < time.monotonic():
+                del self._entries[key]
+                self._counters['expired'] += 1
+                entry = None
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return entry[0]
+
+    def set(self, key, value):
+        """
+        Сохранение решения, самые давно использованные записи вытесняются.
+        :param key: нормированные коэффициенты
+        :param value: решение
+        """
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Снимок счётчиков кэша.
+        :return: словарь счётчиков, число записей и размер кэша
+        """
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries), size=self.size)
+
+    def load_warm_file(self, path):
+        """
+        Загрузка решений из файла прогрева, если он появился или изменился.
+        Файл проверяется не чаще раза в WARM_FILE_CHECK_INTERVAL секунд.
+        :param path: путь к файлу NDJSON с объектами {"key": [a, b, c], "result": {..}}
+        :return: число загруженных решений
+        """
+        now = time.monotonic()
+        checked = self.warm_file_checked
+        if checked is not None and now - checked < WARM_FILE_CHECK_INTERVAL:
+            return 0
+        self.warm_file_checked = now
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return 0
+        if mtime == self.warm_file_mtime:
+            return 0
+        self.warm_file_mtime = mtime
+        loaded = 0
+        with open(path, encoding='utf-8') as warm_file:
+            for line in warm_file:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self.set(tuple(entry['key']), entry['result'])
+                loaded += 1
+        return loaded
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_solution_cache():
+    """
+    Кэш решений процесса, создаётся при первом обращении.
+    :return: объект SolutionCache
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SolutionCache(settings.EQUATIONS_CACHE_SIZE, settings.EQUATIONS_CACHE_TTL)
+        if settings.EQUATIONS_CACHE_WARM_FILE:
+            _cache.load_warm_file(settings.EQUATIONS_CACHE_WARM_FILE)
+        return _cache
+
+
+def cached_solve_quadratic(a, b, c):
+    """
+    Решение одного уравнения через кэш.
+    :return: словарь с видом решения и корнями
+    """
+    cache = get_solution_cache()
+    key = normalize_coefficients(a, b, c)
+    result = cache.get(key)
+    if result is None:
+        result = solve_quadratic(a, b, c)
+        cache.set(key, result)
+    return result
+
+
+def cached_solve_quadratics(coefficients):
+    """
+    Решение пачки уравнений через кэш.
+    Промахи решаются одним вызовом solve_quadratics по исходным коэффициентам,
+    повторы внутри пачки - один раз.
+    :param coefficients: список кортежей (a, b, c)
+    :return: список словарей с решениями в том же порядке
+    """
+    cache = get_solution_cache()
+    keys = [normalize_coefficients(*item) for item in coefficients]
+    found = {}
+    missing = {}
+    for key, item in zip(keys, coefficients):
+        if key not in found:
+            found[key] = cache.get(key)
+            if found[key] is None:
+                missing[key] = item
+    for key, result in zip(missing, solve_quadratics(list(missing.values()))):
+        cache.set(key, result)
+        found[key] = result
+    return [found[key] for key in keys]
@@ -0,0 +1,206 @@
+"""
+Потоковое решение больших файлов с уравнениями.
+Файл CSV или NDJSON читается построчно, строки решаются пачками по chunk_size
+и сразу отдаются клиенту, так что ни входной файл, ни ответ целиком в памяти не лежат.
+"""
+import csv
+import io
+import json
+
+from .solvers import CoefficientsError, parse_coefficients
+from .equation_cache import cached_solve_quadratics
+
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+
+CONTENT_TYPES = {
+    CSV: 'text/csv; charset=utf-8',
+    NDJSON: 'application/x-ndjson; charset=utf-8',
+}
+
+FORMAT_ALIASES = {
+    'csv': CSV,
+    'text/csv': CSV,
+    'ndjson': NDJSON,
+    'jsonl': NDJSON,
+    'application/x-ndjson': NDJSON,
+    'application/jsonl': NDJSON,
+    'application/json-lines': NDJSON,
+}
+
+CSV_COLUMNS = ['line', 'a', 'b', 'c', 'kind', 'x1_real', 'x1_imag', 'x2_real', 'x2_imag', 'error']
+
+
+def detect_format(*hints):
+    """
+    Определяет формат по первой подходящей подсказке:
+    явному параметру, расширению имени файла или Content-Type.
+    :param hints: строки-подсказки, пустые пропускаются
+    :return: CSV, NDJSON или None
+    """
+    for hint in hints:
+        if not hint:
+            continue
+        hint = hint.split(';')[0].strip().lower()
+        if hint in FORMAT_ALIASES:
+            return FORMAT_ALIASES[hint]
+        extension = hint.rsplit('.', 1)[-1]
+        if '.' in hint and extension in FORMAT_ALIASES:
+            return FORMAT_ALIASES[extension]
+    return None
+
+
+def decode_lines(lines):
+    """
+    Декодирует строки файла из UTF-8 (с BOM или без).
+    :param lines: итератор байтовых строк
+    :return: генератор пар (номер строки, текст или None, если строка не в UTF-8)
+    """
+    for number, line in enumerate(lines, 1):
+        if number == 1 and line.startswith(b'\xef\xbb\xbf'):
+            line = line[3:]
+        try:
+            yield number, line.decode('utf-8').rstrip('\r\n')
+        except UnicodeDecodeError:
+            yield number, None
+
+
+def iter_csv_rows(lines):
+    """
+    Разбирает CSV: по строке a,b,c на уравнение, заголовок a,b,c необязателен.
+    Если разделитель ";", запятая считается десятичной, как в русском Excel.
+    :param lines: итератор байтовых строк
+    :return: генератор пар (номер строки, кортеж (a, b, c) или CoefficientsError)
+    """
+    delimiter = None
+    for number, text in decode_lines(lines):
+        if text is None:
+            yield number, CoefficientsError('Строка не в кодировке UTF-8.')
+            continue
+        if not text.strip():
+            continue
+        if delimiter is None:
+            delimiter = ';' if ';' in text else ','
+            cells = next(csv.reader([text], delimiter=delimiter))
+            if [cell.strip().lower() for cell in cells] == ['a', 'b', 'c']:
+                continue
+        else:
+            cells = next(csv.reader([text], delimiter=delimiter))
+        if delimiter == ';':
+            cells = [cell.replace(',', '.') for cell in cells]
+        try:
+            yield number, parse_coefficients([cell.strip() for cell in cells])
+        except CoefficientsError as error:
+            yield number, error
+
+
+def iter_ndjson_rows(lines):
+    """
+    Разбирает NDJSON: по JSON-значению [a, b, c] или {"a", "b", "c"} на строку.
+    :param lines: итератор байтовых строк
+    :return: генератор пар (номер строки, кортеж (a, b, c) или CoefficientsError)
+    """
+    for number, text in decode_lines(lines):
+        if text is None:
+            yield number, CoefficientsError('Строка не в кодировке UTF-8.')
+            continue
+        if not text.strip():
+            continue
+        try:
+            item = json.loads(text)
+        except ValueError:
+            yield number, CoefficientsError('Строка не является JSON.')
+            continue
+        try:
+            yield number, parse_coefficients(item)
+        except CoefficientsError as error:
+            yield number, error
+
+
+ROW_READERS = {
+    CSV: iter_csv_rows,
+    NDJSON: iter_ndjson_rows,
+}
+
+
+def render_csv(rows, header=False):
+    """
+    Записывает пачку решённых строк в CSV.
+    :param rows: список троек (номер строки, коэффициенты, решение или ошибка)
+    :param header: добавить строку с названиями колонок
+    :return: текст CSV
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    if header:
+        writer.writerow(CSV_COLUMNS)
+    for number, coefficients, result in rows:
+        if isinstance(result, CoefficientsError):
+            writer.writerow([number, '', '', '', '', '', '', '', '', str(result)])
+            continue
+        cells = [number, *coefficients, result['kind']]
+        for root in result['roots']:
+            cells += [root['real'], root['imag']]
+        cells += [''] * (len(CSV_COLUMNS) - len(cells))
+        writer.writerow(cells)
+    return buffer.getvalue()
+
+
+def render_ndjson(rows, header=False):
+    """
+    Записывает пачку решённых строк в NDJSON, по объекту на строку.
+    :param rows: список троек (номер строки, коэффициенты, решение или ошибка)
+    :param header: не используется, у NDJSON нет заголовка
+    :return: текст NDJSON
+    """
+    lines = []
+    for number, coefficients, result in rows:
+        if isinstance(result, CoefficientsError):
+            item = {'line': number, 'error': str(result)}
+        else:
+            item = dict(line=number, **result)
+        lines.append(json.dumps(item, ensure_ascii=False))
+    return ''.join(line + '\n' for line in lines)
+
+
+RENDERERS = {
+    CSV: render_csv,
+    NDJSON: render_ndjson,
+}
+
+
+def solve_chunk(chunk):
+    """
+    Решает пачку строк одним вызовом cached_solve_quadratics, ошибки оставляет на месте.
+    :param chunk: список пар (номер строки, коэффициенты или CoefficientsError)
+    :return: список троек (номер строки, коэффициенты, решение или ошибка)
+    """
+    valid = [row for row in chunk if not isinstance(row[1], CoefficientsError)]
+    results = iter(cached_solve_quadratics([coefficients for number, coefficients in valid]))
+    return [
+        (number, None, row) if isinstance(row, CoefficientsError)
+        else (number, row, next(results))
+        for number, row in chunk
+    ]
+
+
+def stream_solutions(lines, file_format, chunk_size):
+    """
+    Читает, решает и отдаёт уравнения пачками.
+    :param lines: итератор байтовых строк входного файла
+    :param file_format: CSV или NDJSON, в нём же будет ответ
+    :param chunk_size: сколько строк решать за раз
+    :return: генератор кусков текста ответа
+    """
+    render = RENDERERS[file_format]
+    header = True
+    chunk = []
+    for row in ROW_READERS[file_format](lines):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield render(solve_chunk(chunk), header)
+            header = False
+            chunk = []
+    if chunk or header:
+        yield render(solve_chunk(chunk), header)
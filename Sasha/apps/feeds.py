@@ -0,0 +1,133 @@
+"""
+Ленты постов из каналов.
+При публикации поста в канал он сразу раскладывается по лентам всех
+участников (TimelineEntry), и лента читается одним запросом по индексу
+(user, datetime, post). Каналы, в которых больше CANAL_FANOUT_MAX_MEMBERS
+участников, помечаются fan_out_on_read: их посты не раскладываются,
+а подмешиваются в ленту при чтении из PostsCanals.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import Canals, PostsCanals, TimelineEntry, UserCanals
+from .pagination import KeysetPage, decode_cursor, encode_cursor, keyset_filter
+
+
+# Ключ ленты: время публикации и ID PostsCanals, новые первыми
+FEED_FIELDS = ('datetime', 'post_id')
+CANAL_POST_FIELDS = ('datetime', 'id')
+
+
+def fan_out_post(post):
+    """
+    Раскладывает публикацию по лентам участников канала.
+    Для больших каналов ничего не делает.
+    :param post: объект PostsCanals
+    :return: число добавленных записей
+    """
+    if Canals.objects.filter(id=post.canal_id, fan_out_on_read=True).exists():
+        return 0
+    member_ids = UserCanals.objects.filter(canal_id=post.canal_id) \
+        .values_list('user_id', flat=True).distinct()
+    entries = [
+        TimelineEntry(user_id=user_id, post=post, canal_id=post.canal_id, datetime=post.datetime)
+        for user_id in member_ids.iterator()
+    ]
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=settings.CANAL_FANOUT_BATCH_SIZE, ignore_conflicts=True
+    )
+    return len(entries)
+
+
+def backfill_timeline(user_id, canal_id):
+    """
+    Добавляет в ленту нового участника последние посты канала.
+    :param user_id: ID пользователя
+    :param canal_id: ID канала
+    """
+    posts = PostsCanals.objects.filter(canal_id=canal_id) \
+        .order_by('-datetime', '-id')[:settings.CANAL_TIMELINE_BACKFILL]
+    TimelineEntry.objects.bulk_create([
+        TimelineEntry(user_id=user_id, post_id=post_id, canal_id=canal_id, datetime=datetime)
+        for post_id, datetime in posts.values_list('id', 'datetime')
+    ], ignore_conflicts=True)
+
+
+def add_member(membership):
+    """
+    Учитывает нового участника канала.
+    Канал, переросший CANAL_FANOUT_MAX_MEMBERS, навсегда переходит
+    на чтение постов при выводе ленты.
+    :param membership: объект UserCanals
+    """
+    with transaction.atomic():
+        Canals.objects.filter(id=membership.canal_id).update(members_count=F('members_count') + 1)
+        Canals.objects.filter(
+            id=membership.canal_id, members_count__gt=settings.CANAL_FANOUT_MAX_MEMBERS
+        ).update(fan_out_on_read=True)
+        if not Canals.objects.filter(id=membership.canal_id, fan_out_on_read=True).exists():
+            backfill_timeline(membership.user_id, membership.canal_id)
+
+
+def remove_member(membership):
+    """
+    Учитывает выход участника из канала и убирает посты канала из его ленты.
+    :param membership: удалённый объект UserCanals
+    """
+    with transaction.atomic():
+        Canals.objects.filter(id=membership.canal_id, members_count__gt=0) \
+            .update(members_count=F('members_count') - 1)
+        still_member = UserCanals.objects.filter(
+            user_id=membership.user_id, canal_id=membership.canal_id
+        ).exists()
+        if not still_member:
+            TimelineEntry.objects.filter(
+                user_id=membership.user_id, canal_id=membership.canal_id
+            ).delete()
+
+
+def get_feed(user, after=None, per_page=None):
+    """
+    Страница ленты пользователя, новые посты первыми.
+    Записи ленты и посты каждого большого канала выбираются отдельными запросами
+    по индексу и сливаются по ключу (время, ID публикации). Посты канала читаются
+    по одному каналу: с canal_id__in SQLite сортирует их во временном дереве.
+    Публикация, попавшая в ленту до того, как канал стал большим, выводится
+    один раз.
+    :param user: пользователь
+    :param after: курсор, после которого начинается страница
+    :param per_page: размер страницы, по умолчанию CANAL_FEED_PAGE_SIZE
+    :return: объект KeysetPage с объектами PostsCanals
+    """
+    per_page = per_page or settings.CANAL_FEED_PAGE_SIZE
+    after_values = decode_cursor(after, FEED_FIELDS, TimelineEntry) if after else None
+
+    timeline = TimelineEntry.objects.filter(user=user)
+    if after_values is not None:
+        timeline = timeline.filter(keyset_filter(FEED_FIELDS, after_values, True))
+    keys = list(timeline.order_by('-datetime', '-post_id')[:per_page + 1]
+                .values_list('datetime', 'post_id'))
+
+    large_canals = list(UserCanals.objects.filter(user=user, canal__fan_out_on_read=True)
+                        .values_list('canal_id', flat=True).distinct())
+    if large_canals:
+        merged = set(keys)
+        for canal_id in large_canals:
+            canal_posts = PostsCanals.objects.filter(canal_id=canal_id)
+            if after_values is not None:
+                canal_posts = canal_posts.filter(keyset_filter(CANAL_POST_FIELDS, after_values, True))
+            merged.update(canal_posts.order_by('-datetime', '-id')[:per_page + 1]
+                          .values_list('datetime', 'id'))
+        keys = sorted(merged, reverse=True)
+
+    has_next = len(keys) > per_page
+    keys = keys[:per_page]
+    posts = PostsCanals.objects.select_related('post', 'canal', 'user') \
+        .in_bulk([post_id for _, post_id in keys])
+    items = [posts[post_id] for _, post_id in keys if post_id in posts]
+    return KeysetPage(
+        items,
+        encode_cursor(list(keys[-1])) if keys and has_next else None,
+        None
+    )
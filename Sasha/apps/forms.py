@@ -2,10 +2,23 @@
 Формы для получения входных данных.
 """
 from django import forms
-from django.core.files.images import get_image_dimensions
-from .models import THEMES, BG_THEMES, POST_SORTS
+from django.conf import settings
+from django.contrib.auth.forms import PasswordResetForm
+from django.template.loader import render_to_string
+from .models import POST_SORTS
+from .themes import THEME_CHOICES, BACKGROUND_THEME_CHOICES
+from .mail_queue import enqueue_mail
+from .post_tags import parse_tags
+from .uploads import IMAGE_EXTENSIONS, validate_image_file, UploadRejected
 
 
+BULK_USER_ACTIONS = [
+    ('block', 'Заблокировать'),
+    ('unblock', 'Разблокировать'),
+    ('promote', 'Сделать администраторами'),
+    ('demote', 'Сделать пользователями')
+]
+
 SEARCH_TAGS_TYPE = [
     ('and', 'И'),
     ('or', 'Или')
@@ -173,13 +186,119 @@ class PasswordEditForm(forms.Form):
     )
 
 
+class SearchUser(forms.Form):
+    """
+    Форма поиска пользователя администратором.
+    """
+    user = forms.CharField(
+        max_length=100,
+        required=False,
+        widget=forms.TextInput(
+            attrs={
+                'class': 'form-control',
+                'placeholder': 'Логин, имя, фамилия или E-mail'
+            }
+        )
+    )
+
+
+class BulkUserActionForm(forms.Form):
+    """
+    Форма действия над несколькими пользователями.
+    """
+    action = forms.ChoiceField(
+        label='Действие',
+        choices=BULK_USER_ACTIONS,
+        widget=forms.Select(
+            attrs={
+                'class': 'form-control',
+                'form': 'bulk-users'
+            }
+        )
+    )
+    user_ids = forms.Field(
+        widget=forms.MultipleHiddenInput
+    )
+
+    def clean_user_ids(self):
+        """
+        Проверяет список ID пользователей.
+        :return: список ID
+        """
+        try:
+            user_ids = [int(user_id) for user_id in self.cleaned_data['user_ids']]
+        except (TypeError, ValueError):
+            raise forms.ValidationError('Некорректный ID пользователя.')
+        if len(user_ids) > settings.ADMIN_USERS_MAX_PAGE_SIZE:
+            raise forms.ValidationError('Слишком много пользователей за раз.')
+        return user_ids
+
+
+class SearchPostForm(forms.Form):
+    """
+    Форма фильтра сохранённых постов по тегам.
+    """
+    tags = forms.CharField(
+        max_length=1000,
+        required=False,
+        widget=forms.TextInput(
+            attrs={
+                'class': 'form-control',
+                'placeholder': 'Теги через запятую'
+            }
+        )
+    )
+    type = forms.ChoiceField(
+        choices=SEARCH_TAGS_TYPE,
+        required=False,
+        widget=forms.Select(
+            attrs={
+                'class': 'form-control'
+            }
+        )
+    )
+    page = forms.IntegerField(
+        min_value=1,
+        required=False,
+        widget=forms.HiddenInput
+    )
+
+    def clean_tags(self):
+        """
+        Разбирает строку тегов.
+        :return: список тегов
+        """
+        tags = parse_tags(self.cleaned_data['tags'])
+        if len(tags) > settings.SAVED_POSTS_MAX_TAGS:
+            raise forms.ValidationError(
+                'Не больше {} тегов за раз.'.format(settings.SAVED_POSTS_MAX_TAGS)
+            )
+        return tags
+
+
+class QueuedPasswordResetForm(PasswordResetForm):
+    """
+    Форма восстановления пароля.
+    Письмо не отправляется сразу, а добавляется в очередь.
+    """
+    def send_mail(self, subject_template_name, email_template_name,
+                  context, from_email, to_email, html_email_template_name=None):
+        subject = render_to_string(subject_template_name, context)
+        subject = ''.join(subject.splitlines())
+        body = render_to_string(email_template_name, context)
+        html_body = ''
+        if html_email_template_name is not None:
+            html_body = render_to_string(html_email_template_name, context)
+        enqueue_mail(subject, body, [to_email], from_email, html_body)
+
+
 class ThemeForm(forms.Form):
     """
     Форма выбора темы сайта.
     """
     bg_theme = forms.ChoiceField(
         label='Основная тема',
-        choices=BG_THEMES,
+        choices=BACKGROUND_THEME_CHOICES,
         widget=forms.Select(
             attrs={
                 'class': 'form-control'
@@ -188,7 +307,7 @@ class ThemeForm(forms.Form):
     )
     theme = forms.ChoiceField(
         label='Цвет компонентов',
-        choices=THEMES,
+        choices=THEME_CHOICES,
         widget=forms.Select(
             attrs={
                 'class': 'form-control'
@@ -199,48 +318,28 @@ class ThemeForm(forms.Form):
 class AddImageUser(forms.Form):
     """
     Форма добавления изображения пользователем.
+    Изображение проверяется по заголовку, без чтения файла целиком.
     """
-    image = forms.ImageField(
+    image = forms.FileField(
         widget=forms.ClearableFileInput(
             attrs={
-                'class': 'custom-file-input'
+                'class': 'custom-file-input',
+                'accept': 'image/png,image/jpeg'
             }
         )
     )
 
-    def check_resolution(self):
-        """
-        Проверяет разрешение изображения.
-        :return True: если разрешение меньше 800x800
-        :return False: если разрешение больше 800x800
-        """
-        image = self.cleaned_data['image']
-        width, height = get_image_dimensions(image)
-        if width > 1600 or height > 1600:
-            return False
-        return True
-
-    def check_size(self):
-        """
-        Проверяет размер изображения.
-        :return True: если размер меньше 200 КБ
-        :return False: если размер больше 200 КБ
-        """
-        image = self.cleaned_data['image']
-        print(len(image))
-        if len(image) > 2* 1024 * 1024:
-            return False
-        return True
-
-    def check_content(self):
+    def clean_image(self):
         """
-        Проверяет тип изображения.
-        :return True: если png или jpeg
-        :return False: если любой другой тип
+        Проверяет формат, размер и разрешение изображения.
+        Расширение имени файла заменяется на соответствующее формату,
+        имя от клиента дальше не используется.
+        :return: загруженный файл
         """
         image = self.cleaned_data['image']
-        main, sub = image.content_type.split('/')
-        print(main, sub)
-        if main == 'image' and (sub in ['jpeg', 'png']):
-            return True
-        return False
\ No newline at end of file
+        try:
+            self.image_format, self.width, self.height = validate_image_file(image)
+        except UploadRejected as error:
+            raise forms.ValidationError(str(error))
+        image.name = 'avatar' + IMAGE_EXTENSIONS[self.image_format]
+        return image
@@ -0,0 +1,206 @@
+"""
+Лайки постов в каналах.
+Каждый лайк - строка LikesPostInCanals, а число лайков хранится
+в PostsCanals.likes_count, чтобы не считать COUNT(*) при выводе.
+Изменения счётчиков копятся в памяти процесса и записываются одним
+UPDATE раз в LIKES_FLUSH_INTERVAL секунд или когда накопилось
+LIKES_FLUSH_MAX_PENDING постов, так что волна лайков на популярный пост
+не превращается в очередь записей в SQLite. Команда reconcile_likes
+пересчитывает счётчики по строкам лайков.
+Пересчёт увеличивает PostsCanals.likes_epoch. Изменение из буфера помечено
+номером пересчёта, прочитанным в одной транзакции с записью лайка, и
+прибавляется, только пока номер не сменился: лайки до пересчёта уже учтены
+в пересчитанном счётчике, и буферы процессов сайта не нужно сбрасывать.
+"""
+import atexit
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import LikesPostInCanals, PostsCanals
+
+
+# Сколько постов исправлять одним UPDATE при пересчёте
+RECONCILE_BATCH_SIZE = 500
+
+
+class LikeCounterBuffer(object):
+    """
+    Буфер изменений счётчиков лайков.
+    Хранит суммарное изменение для каждого поста и номера пересчёта
+    до следующей записи в базу.
+    """
+    def __init__(self, interval, max_pending):
+        self.interval = interval
+        self.max_pending = max_pending
+        self._deltas = dict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+        self.flushed = time.monotonic()
+
+    def add(self, post_id, epoch, delta):
+        """
+        Учитывает изменение счётчика.
+        Если подошёл срок или постов слишком много, буфер сразу записывается,
+        иначе запись откладывается таймером.
+        :param post_id: ID PostsCanals
+        :param epoch: номер пересчёта, при котором записан лайк
+        :param delta: +1 или -1
+        """
+        with self._lock:
+            key = (post_id, epoch)
+            self._deltas[key] = self._deltas.get(key, 0) + delta
+            due = len(self._deltas) >= self.max_pending or \
+                time.monotonic() - self.flushed >= self.interval
+            if not due and self._timer is None:
+                self._timer = threading.Timer(self.interval, self._flush_in_thread)
+                self._timer.daemon = True
+                self._timer.start()
+        if due:
+            self.flush()
+
+    def pending(self, post_id, epoch):
+        """
+        Ещё не записанное изменение счётчика поста при данном номере пересчёта.
+        """
+        with self._lock:
+            return self._deltas.get((post_id, epoch), 0)
+
+    def flush(self):
+        """
+        Записывает накопленные изменения одним UPDATE.
+        Если запись не удалась, изменения возвращаются в буфер.
+        :return: число обновлённых постов
+        """
+        with self._flush_lock:
+            with self._lock:
+                deltas = {key: delta for key, delta in self._deltas.items() if delta}
+                self._deltas = dict()
+                self.flushed = time.monotonic()
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not deltas:
+                return 0
+            try:
+                return apply_deltas(deltas)
+            except Exception:
+                with self._lock:
+                    for key, delta in deltas.items():
+                        self._deltas[key] = self._deltas.get(key, 0) + delta
+                raise
+
+    def _flush_in_thread(self):
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+
+def apply_deltas(deltas):
+    """
+    Прибавляет изменения к счётчикам одним запросом.
+    Изменения с устаревшим номером пересчёта отбрасываются.
+    :param deltas: словарь {(ID PostsCanals, номер пересчёта): изменение}
+    :return: число обновлённых постов
+    """
+    change = Case(
+        *[When(id=post_id, likes_epoch=epoch, then=Value(delta))
+          for (post_id, epoch), delta in deltas.items()],
+        default=Value(0),
+        output_field=IntegerField()
+    )
+    return PostsCanals.objects.filter(id__in={post_id for post_id, _ in deltas}) \
+        .update(likes_count=Greatest(F('likes_count') + change, Value(0)))
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_like_buffer():
+    """
+    Буфер счётчиков процесса, создаётся при первом обращении.
+    При завершении процесса несохранённые изменения записываются.
+    :return: объект LikeCounterBuffer
+    """
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = LikeCounterBuffer(settings.LIKES_FLUSH_INTERVAL, settings.LIKES_FLUSH_MAX_PENDING)
+            atexit.register(_buffer.flush)
+        return _buffer
+
+
+def set_like(user, post, liked):
+    """
+    Ставит или снимает лайк. Повторный вызов с тем же liked ничего не меняет.
+    :param user: пользователь
+    :param post: объект PostsCanals
+    :param liked: True - поставить лайк, False - снять
+    :return: изменение счётчика: 1, -1 или 0
+    """
+    epoch = None
+    with transaction.atomic():
+        if liked:
+            try:
+                with transaction.atomic():
+                    _, created = LikesPostInCanals.objects.get_or_create(
+                        user=user, post=post, defaults={'datetime': timezone.now()}
+                    )
+            except IntegrityError:
+                created = False
+            delta = 1 if created else 0
+        else:
+            deleted, _ = LikesPostInCanals.objects.filter(user=user, post=post).delete()
+            delta = -deleted
+        if delta:
+            # В той же транзакции, что и лайк: пересчёт видит либо лайк, либо новый номер
+            epoch = PostsCanals.objects.filter(id=post.id) \
+                .values_list('likes_epoch', flat=True).first()
+    if delta and epoch is not None:
+        get_like_buffer().add(post.id, epoch, delta)
+    return delta
+
+
+def like_count(post):
+    """
+    Число лайков поста с учётом ещё не записанных изменений этого процесса.
+    :param post: объект PostsCanals
+    :return: число лайков
+    """
+    return max(post.likes_count + get_like_buffer().pending(post.id, post.likes_epoch), 0)
+
+
+def reconcile_likes(post_ids=None):
+    """
+    Пересчитывает счётчики по строкам LikesPostInCanals и увеличивает номер
+    пересчёта, так что ещё не записанные изменения из буферов всех процессов
+    отбрасываются. Пересчёт идёт в одной транзакции, а она начинается
+    с блокировки записи, поэтому каждый лайк попадает либо в пересчёт,
+    либо в изменение с новым номером.
+    :param post_ids: список ID PostsCanals или None для всех
+    :return: число постов, у которых счётчик был неверным
+    """
+    actual = Subquery(
+        LikesPostInCanals.objects.filter(post=OuterRef('id')).order_by()
+        .values('post').annotate(count=Count('id')).values('count'),
+        output_field=IntegerField()
+    )
+    posts = PostsCanals.objects.all()
+    if post_ids is not None:
+        posts = posts.filter(id__in=post_ids)
+    with transaction.atomic():
+        wrong = list(posts.annotate(actual=Coalesce(actual, Value(0)))
+                     .exclude(likes_count=F('actual')).values_list('id', flat=True))
+        for start in range(0, len(wrong), RECONCILE_BATCH_SIZE):
+            PostsCanals.objects.filter(id__in=wrong[start:start + RECONCILE_BATCH_SIZE]) \
+                .update(likes_count=Coalesce(actual, Value(0)))
+        posts.update(likes_epoch=F('likes_epoch') + 1)
+    return len(wrong)
@@ -0,0 +1,202 @@
+"""
+Почтовый бэкенд с пулом SMTP-соединений.
+Соединения открываются и авторизуются один раз и переиспользуются
+между письмами, пока сервер их не закроет.
+"""
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail.backends import smtp
+
+
+class SMTPPoolTimeout(smtplib.SMTPException):
+    """
+    Свободное соединение не появилось за MAIL_POOL_ACQUIRE_TIMEOUT секунд.
+    """
+
+
+def close_quietly(connection):
+    """
+    Закрытие SMTP-соединения без исключений.
+    :param connection: объект smtplib.SMTP
+    """
+    try:
+        connection.quit()
+    except OSError:
+        connection.close()
+
+
+class SMTPConnectionPool(object):
+    """
+    Ограниченный пул SMTP-соединений к одному серверу.
+    Хранит счётчики отправок, переподключений и ошибок.
+    """
+    def __init__(self, size, idle_timeout):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._idle = []
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._counters = dict(sends=0, reconnects=0, failures=0, opened=0)
+
+    def count(self, name, value=1):
+        """
+        Увеличение счётчика.
+        :param name: название счётчика
+        :param value: на сколько увеличить
+        """
+        with self._lock:
+            self._counters[name] += value
+
+    def stats(self):
+        """
+        Снимок счётчиков пула.
+        :return: словарь счётчиков, число свободных соединений и размер пула
+        """
+        with self._lock:
+            return dict(self._counters, idle=len(self._idle), size=self.size)
+
+    def acquire(self, connect, timeout):
+        """
+        Получение соединения из пула.
+        Соединение, простоявшее дольше idle_timeout, открывается заново,
+        потому что сервер его, скорее всего, уже закрыл.
+        :param connect: функция открытия нового соединения
+        :param timeout: время ожидания свободного соединения
+        :return: объект smtplib.SMTP или None, если connect не смог открыть соединение
+        """
+        if not self._slots.acquire(timeout=timeout):
+            raise SMTPPoolTimeout('Нет свободных SMTP-соединений в пуле')
+        connection = None
+        with self._lock:
+            if self._idle:
+                connection, last_used = self._idle.pop()
+        if connection is not None and time.monotonic() - last_used > self.idle_timeout:
+            close_quietly(connection)
+            connection = None
+            self.count('reconnects')
+        if connection is None:
+            try:
+                connection = connect()
+            except Exception:
+                self._slots.release()
+                self.count('failures')
+                raise
+            if connection is None:
+                self._slots.release()
+                self.count('failures')
+                return None
+            self.count('opened')
+        return connection
+
+    def release(self, connection, broken=False):
+        """
+        Возврат соединения в пул.
+        :param connection: объект smtplib.SMTP
+        :param broken: соединение оборвалось и должно быть закрыто
+        """
+        if broken:
+            close_quietly(connection)
+        else:
+            with self._lock:
+                self._idle.append((connection, time.monotonic()))
+        self._slots.release()
+
+
+_pools = dict()
+_pools_lock = threading.Lock()
+
+
+def get_pool(key):
+    """
+    Пул соединений для набора параметров сервера.
+    :param key: кортеж параметров подключения
+    :return: объект SMTPConnectionPool
+    """
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = SMTPConnectionPool(
+                settings.MAIL_POOL_SIZE, settings.MAIL_POOL_IDLE_TIMEOUT
+            )
+        return _pools[key]
+
+
+def get_pool_stats():
+    """
+    Счётчики всех пулов процесса.
+    :return: словарь вида {"host:port": счётчики}
+    """
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {'{}:{}'.format(key[0], key[1]): pool.stats() for key, pool in pools}
+
+
+class PooledSMTPBackend(smtp.EmailBackend):
+    """
+    SMTP-бэкенд, который берёт соединения из пула вместо открытия нового
+    на каждый вызов send_messages.
+    При обрыве соединения письмо отправляется ещё раз через новое соединение.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = get_pool((
+            self.host, self.port, self.username, self.use_tls, self.use_ssl, self.timeout
+        ))
+
+    def _connect(self):
+        """
+        Открытие и авторизация нового соединения средствами smtp.EmailBackend.
+        :return: объект smtplib.SMTP или None, если ошибка подавлена fail_silently
+        """
+        self.connection = None
+        opened = super().open()
+        connection, self.connection = self.connection, None
+        return connection if opened else None
+
+    def open(self):
+        if self.connection:
+            return False
+        try:
+            self.connection = self.pool.acquire(self._connect, settings.MAIL_POOL_ACQUIRE_TIMEOUT)
+        except smtplib.SMTPException:
+            if not self.fail_silently:
+                raise
+            return None
+        return True if self.connection else None
+
+    def close(self, broken=False):
+        if self.connection is None:
+            return
+        connection, self.connection = self.connection, None
+        self.pool.release(connection, broken)
+
+    def _reconnect(self):
+        """
+        Замена оборвавшегося соединения новым.
+        """
+        self.close(broken=True)
+        self.pool.count('reconnects')
+        self.open()
+
+    def _send(self, email_message):
+        fail_silently, self.fail_silently = self.fail_silently, False
+        try:
+            try:
+                if self.connection is None:
+                    self.open()
+                sent = super()._send(email_message)
+            except smtplib.SMTPServerDisconnected:
+                self._reconnect()
+                sent = super()._send(email_message)
+        except OSError:
+            self.pool.count('failures')
+            if not fail_silently:
+                raise
+            return False
+        finally:
+            self.fail_silently = fail_silently
+        if sent:
+            self.pool.count('sends')
+        return sent
@@ -0,0 +1,165 @@
+"""
+Очередь исходящих писем.
+Обработчики страниц только добавляют письмо в таблицу OutboundEmail,
+а отправкой пачками с повторными попытками занимается команда run_mail_queue.
+Асинхронные обработчики добавляют письмо через aenqueue_mail.
+"""
+import datetime
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+
+def enqueue_mail(subject, body, to, from_email=None, html_body=''):
+    """
+    Добавление письма в очередь.
+    :param subject: тема письма
+    :param body: текст письма
+    :param to: список получателей
+    :param from_email: отправитель, по умолчанию DEFAULT_FROM_EMAIL
+    :param html_body: HTML-версия письма
+    :return: объект OutboundEmail
+    """
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        html_body=html_body or '',
+        from_email=from_email or '',
+        to='\n'.join(to)
+    )
+
+
+async def aenqueue_mail(subject, body, to, from_email=None, html_body=''):
+    """
+    Добавление письма в очередь из асинхронного обработчика.
+    Запись в БД выполняется в потоке, цикл событий не ждёт ни её, ни SMTP.
+    Параметры те же, что у enqueue_mail.
+    :return: объект OutboundEmail
+    """
+    return await sync_to_async(enqueue_mail)(subject, body, to, from_email, html_body)
+
+
+def retry_delay(attempts):
+    """
+    Задержка перед следующей попыткой отправки.
+    Растёт в два раза с каждой попыткой, но не больше MAIL_QUEUE_MAX_RETRY_DELAY.
+    :param attempts: число сделанных попыток
+    :return: задержка в секундах
+    """
+    delay = settings.MAIL_QUEUE_RETRY_DELAY * 2 ** max(attempts - 1, 0)
+    return min(delay, settings.MAIL_QUEUE_MAX_RETRY_DELAY)
+
+
+def build_message(outbound, connection):
+    """
+    Создание письма Django из строки очереди.
+    :param outbound: объект OutboundEmail
+    :param connection: соединение почтового бэкенда
+    :return: объект EmailMultiAlternatives
+    """
+    message = EmailMultiAlternatives(
+        outbound.subject,
+        outbound.body,
+        outbound.from_email or None,
+        outbound.recipients,
+        connection=connection
+    )
+    if outbound.html_body:
+        message.attach_alternative(outbound.html_body, 'text/html')
+    return message
+
+
+def mark_sent(outbound):
+    """
+    Отметка об успешной отправке письма.
+    :param outbound: объект OutboundEmail
+    """
+    outbound.attempts += 1
+    outbound.status = OutboundEmail.SENT
+    outbound.sent = timezone.now()
+    outbound.last_error = ''
+    outbound.save(update_fields=['attempts', 'status', 'sent', 'last_error'])
+
+
+def mark_failed(outbound, error):
+    """
+    Отметка о неудачной попытке отправки.
+    Назначает следующую попытку или переводит письмо в статус FAILED.
+    :param outbound: объект OutboundEmail
+    :param error: исключение, из-за которого письмо не ушло
+    """
+    outbound.attempts += 1
+    outbound.last_error = '{}: {}'.format(type(error).__name__, error)
+    if outbound.attempts >= settings.MAIL_QUEUE_MAX_ATTEMPTS:
+        outbound.status = OutboundEmail.FAILED
+    else:
+        outbound.next_attempt = timezone.now() + datetime.timedelta(
+            seconds=retry_delay(outbound.attempts)
+        )
+    outbound.save(update_fields=['attempts', 'status', 'next_attempt', 'last_error'])
+
+
+def send_pending(batch_size=None, backend=None):
+    """
+    Отправка одной пачки писем, время которых подошло.
+    Все письма пачки идут через одно соединение.
+    :param batch_size: размер пачки, по умолчанию MAIL_QUEUE_BATCH_SIZE
+    :param backend: путь к почтовому бэкенду, по умолчанию MAIL_QUEUE_BACKEND
+    :return: кортеж (отправлено, ошибок)
+    """
+    batch = list(
+        OutboundEmail.objects.filter(
+            status=OutboundEmail.PENDING, next_attempt__lte=timezone.now()
+        ).order_by('next_attempt', 'id')[:batch_size or settings.MAIL_QUEUE_BATCH_SIZE]
+    )
+    if not batch:
+        return 0, 0
+
+    sent, failed = 0, 0
+    connection = get_connection(backend or settings.MAIL_QUEUE_BACKEND)
+    try:
+        connection.open()
+    except Exception as error:
+        for outbound in batch:
+            mark_failed(outbound, error)
+        return 0, len(batch)
+    try:
+        for outbound in batch:
+            try:
+                build_message(outbound, connection).send()
+            except Exception as error:
+                failed += 1
+                mark_failed(outbound, error)
+            else:
+                sent += 1
+                mark_sent(outbound)
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def run_worker(interval=None, batch_size=None, backend=None, once=False, log=None):
+    """
+    Цикл отправки писем из очереди.
+    Пока в очереди есть готовые письма, пачки идут одна за другой,
+    иначе воркер ждёт interval секунд.
+    :param interval: пауза при пустой очереди, по умолчанию MAIL_QUEUE_POLL_INTERVAL
+    :param batch_size: размер пачки
+    :param backend: путь к почтовому бэкенду
+    :param once: обработать очередь один раз и выйти
+    :param log: функция для вывода статистики
+    """
+    interval = settings.MAIL_QUEUE_POLL_INTERVAL if interval is None else interval
+    while True:
+        sent, failed = send_pending(batch_size, backend)
+        if (sent or failed) and log is not None:
+            log('Отправлено: {}, ошибок: {}'.format(sent, failed))
+        if not sent and not failed:
+            if once:
+                return
+            time.sleep(interval)
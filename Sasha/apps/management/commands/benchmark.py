@@ -0,0 +1,150 @@
+"""
+Команда нагрузочного прогона всех страниц.
+Создаёт отдельную временную базу, заполняет её через apps.benchmark.seed,
+открывает каждую страницу из apps/urls.py при заданных числах одновременных
+клиентов и печатает или сохраняет результат в JSON. С --baseline сравнивает
+результат с сохранённым прогоном и сообщает о регрессиях.
+С --server asgi страницы открываются через ASGI, и прогон можно сравнить
+с сохранённым прогоном WSGI.
+"""
+import json
+import logging
+import os
+import platform
+import shutil
+import sqlite3
+import tempfile
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+)
+from django.utils import timezone
+
+from apps import benchmark
+
+
+def levels(value):
+    try:
+        result = [int(level) for level in value.split(',') if level.strip()]
+    except ValueError:
+        raise CommandError('Уровни нагрузки задаются числами через запятую, например 1,4,16.')
+    if not result or min(result) < 1:
+        raise CommandError('Число одновременных клиентов должно быть не меньше 1.')
+    return result
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный прогон всех страниц на заполненной временной базе.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='число пользователей')
+        parser.add_argument('--posts', type=int, default=20, help='сохранённых постов у пользователя')
+        parser.add_argument('--works', type=int, default=50, help='число работ в каталоге')
+        parser.add_argument('--canals', type=int, default=5, help='число каналов')
+        parser.add_argument('--seed', type=int, default=0, help='зерно генератора данных')
+        parser.add_argument('--concurrency', type=levels, default=[1, 4, 16],
+                            help='числа одновременных клиентов через запятую')
+        parser.add_argument('--server', choices=[benchmark.WSGI, benchmark.ASGI], default=benchmark.WSGI,
+                            help='wsgi - Client в потоках, asgi - приложение ASGI в одном цикле событий')
+        parser.add_argument('--requests', type=int, default=100,
+                            help='запросов на страницу при каждом числе клиентов')
+        parser.add_argument('--warmup', type=int, default=2, help='запросов на поток перед замером')
+        parser.add_argument('--route', action='append', default=[],
+                            help='прогнать только страницы, в адресе которых есть строка')
+        parser.add_argument('--output', help='файл для результата, по умолчанию стандартный вывод')
+        parser.add_argument('--baseline', help='файл с результатом прошлого прогона для сравнения')
+        parser.add_argument('--threshold', type=float, default=0.1,
+                            help='допустимое ухудшение задержки и пропускной способности, доля')
+        parser.add_argument('--fail', action='store_true',
+                            help='завершиться с ошибкой, если есть регрессии')
+        parser.add_argument('--keep', action='store_true', help='не удалять временную базу')
+
+    def handle(self, *args, **options):
+        if options['requests'] < max(options['concurrency']):
+            raise CommandError('Запросов должно быть не меньше, чем одновременных клиентов.')
+        if options['users'] < 1 or options['canals'] < 1 or options['works'] < 1:
+            raise CommandError('Нужны хотя бы один пользователь, канал и работа.')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as source:
+                baseline = json.load(source)
+
+        directory = tempfile.mkdtemp(prefix='sasha-benchmark-')
+        connections['default'].settings_dict['TEST']['NAME'] = os.path.join(directory, 'db.sqlite3')
+        setup_test_environment()
+        # Ответы 4xx ожидаемы, в журнал пишутся только ошибки сервера
+        request_logger = logging.getLogger('django.request')
+        log_level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self.stderr.write('Заполнение базы...')
+            fixture = benchmark.seed(options['users'], options['posts'], options['works'],
+                                     options['canals'], options['seed'], max(options['concurrency']))
+            routes, skipped = benchmark.run(
+                fixture, options['concurrency'], options['requests'], options['warmup'],
+                options['route'], progress=lambda route: self.stderr.write('/' + route),
+                server=options['server']
+            )
+        finally:
+            if options['keep']:
+                self.stderr.write('База сохранена: {}'.format(
+                    connections['default'].settings_dict['NAME']
+                ))
+            else:
+                teardown_databases(old_config, verbosity=0)
+                shutil.rmtree(directory, ignore_errors=True)
+            teardown_test_environment()
+            request_logger.setLevel(log_level)
+
+        result = {
+            'meta': {
+                'created': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'users': options['users'],
+                'posts_per_user': options['posts'],
+                'works': options['works'],
+                'canals': options['canals'],
+                'seed': options['seed'],
+                'server': options['server'],
+                'concurrency': options['concurrency'],
+                'requests': options['requests'],
+                'warmup': options['warmup'],
+            },
+            'routes': routes,
+            'skipped': skipped,
+        }
+        regressions = []
+        if baseline is not None:
+            result['comparison'] = benchmark.compare(result, baseline, options['threshold'])
+            regressions = [row for row in result['comparison'] if row['regressions']]
+
+        text = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as target:
+                target.write(text + '\n')
+        else:
+            self.stdout.write(text)
+
+        for row in regressions:
+            self.stderr.write(self.style.WARNING('/{} x{}: {}'.format(
+                row['route'], row['concurrency'], ', '.join(
+                    '{} {} -> {}'.format(name, row[name]['baseline'], row[name]['current'])
+                    for name in row['regressions']
+                )
+            )))
+        failed = [route for route, values in routes.items()
+                  if any('error' in level for level in values['levels'].values())]
+        for route in failed:
+            self.stderr.write(self.style.ERROR('/{}: прогон не удался'.format(route)))
+        summary = 'Страниц: {}, пропущено: {}, регрессий: {}'.format(
+            len(routes), len(skipped), len(regressions)
+        )
+        if regressions and options['fail']:
+            raise CommandError(summary)
+        self.stderr.write(self.style.WARNING(summary) if regressions else self.style.SUCCESS(summary))
@@ -0,0 +1,24 @@
+"""
+Команда создания уменьшенных копий для уже загруженных аватарок.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.avatars import build_thumbnails
+from apps.caching import invalidate_user_context
+from apps.models import UserAvatar
+
+
+class Command(BaseCommand):
+    help = 'Создаёт WebP и JPEG копии всех размеров для загруженных аватарок.'
+
+    def handle(self, *args, **options):
+        built = 0
+        for avatar in UserAvatar.objects.iterator():
+            try:
+                build_thumbnails(avatar.image)
+            except (OSError, ValueError) as error:
+                self.stderr.write('{}: {}'.format(avatar.image.name, error))
+                continue
+            invalidate_user_context(avatar.user_id)
+            built += 1
+        self.stdout.write(self.style.SUCCESS('Обработано аватарок: {}'.format(built)))
@@ -0,0 +1,16 @@
+"""
+Команда сборки CSS-файлов тем.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.theme_bundles import build_bundles
+
+
+class Command(BaseCommand):
+    help = 'Собирает CSS-файл с хэшем в имени для каждой комбинации темы и темы фона.'
+
+    def handle(self, *args, **options):
+        manifest = build_bundles()
+        for key, path in sorted(manifest.items()):
+            self.stdout.write('{}: {}'.format(key, path))
+        self.stdout.write(self.style.SUCCESS('Собрано тем: {}'.format(len(manifest))))
@@ -0,0 +1,132 @@
+"""
+Команда проверки планов запросов.
+Выполняет EXPLAIN QUERY PLAN для частых запросов приложения и для запросов,
+которые делают указанные страницы, и сообщает о полных просмотрах таблиц
+и сортировках без индекса.
+"""
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from apps import models
+from apps.user_emails import users_with_email
+
+
+# Частые запросы приложения: название и функция, строящая QuerySet
+QUERIES = [
+    ('user by username', lambda: User.objects.filter(username='user')),
+    ('user by email', lambda: users_with_email('user@example.com')),
+    ('saved posts of user', lambda: models.SavedPosts.objects.filter(user_id=1).order_by('-datetime')),
+    ('posts by tags', lambda: models.PostsTags.objects.filter(tag__in=['a', 'b'], post__user_id=1)
+        .order_by('tag', 'post_id').values_list('tag', 'post_id')),
+    ('timeline page', lambda: models.TimelineEntry.objects.filter(user_id=1)
+        .order_by('-datetime', '-post_id').values_list('datetime', 'post_id')[:21]),
+    ('large canals of user', lambda: models.UserCanals.objects
+        .filter(user_id=1, canal__fan_out_on_read=True).values_list('canal_id', flat=True)),
+    ('canal posts page', lambda: models.PostsCanals.objects.filter(canal_id=1)
+        .order_by('-datetime', '-id').values_list('datetime', 'id')[:21]),
+    ('canal members', lambda: models.UserCanals.objects.filter(canal_id=1).values_list('user_id', flat=True)),
+    ('canal post of member', lambda: models.PostsCanals.objects
+        .filter(canal__usercanals__user_id=1, id=1)),
+    ('like of user', lambda: models.LikesPostInCanals.objects.filter(user_id=1, post_id=1)),
+    ('works page', lambda: models.Work.objects.order_by('title', 'id')[:25]),
+    ('work by slug', lambda: models.Work.objects.filter(slug='work')),
+    ('search document', lambda: models.SearchDocument.objects.filter(kind='post', object_id=1)),
+]
+
+
+def explain(connection, sql, params=None):
+    """
+    План запроса.
+    :param connection: соединение с базой
+    :param sql: текст запроса
+    :param params: параметры запроса
+    :return: список строк плана
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params or [])
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def plan_problems(plan):
+    """
+    Шаги плана без индекса.
+    :param plan: список строк плана
+    :return: список проблемных строк
+    """
+    return [
+        step for step in plan
+        if (step.startswith('SCAN ') and ' INDEX ' not in step) or 'USE TEMP B-TREE' in step
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Проверяет планы запросов приложения через EXPLAIN QUERY PLAN.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', action='append', default=[],
+                            help='проверить также запросы страницы, можно указать несколько раз')
+        parser.add_argument('--user', help='логин пользователя, от имени которого открываются страницы')
+        parser.add_argument('--verbose-plans', action='store_true', help='печатать планы всех запросов')
+        parser.add_argument('--fail', action='store_true',
+                            help='завершиться с ошибкой, если есть запросы без индекса')
+
+    def handle(self, *args, **options):
+        connection = connections['default']
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN есть только в SQLite.')
+
+        checked = []
+        for name, build in QUERIES:
+            sql, params = build().query.sql_with_params()
+            checked.append((name, sql, params))
+        checked += self.page_queries(connection, options['url'], options['user'])
+
+        problems = 0
+        for name, sql, params in checked:
+            plan = explain(connection, sql, params)
+            bad = plan_problems(plan)
+            problems += bool(bad)
+            if bad:
+                self.stdout.write(self.style.WARNING('{}: {}'.format(name, '; '.join(bad))))
+                self.stdout.write('    ' + sql)
+            elif options['verbose_plans']:
+                self.stdout.write('{}: {}'.format(name, '; '.join(plan)))
+
+        summary = 'Проверено запросов: {}, без индекса: {}'.format(len(checked), problems)
+        if problems and options['fail']:
+            raise CommandError(summary)
+        self.stdout.write(self.style.WARNING(summary) if problems else self.style.SUCCESS(summary))
+
+    def page_queries(self, connection, urls, username):
+        """
+        Запросы SELECT, выполненные при открытии страниц.
+        :return: список троек (название, текст запроса, None)
+        """
+        if not urls:
+            return []
+        hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+        client = Client(SERVER_NAME=hosts[0] if hosts else 'localhost')
+        if username:
+            try:
+                client.force_login(User.objects.get(username=username))
+            except User.DoesNotExist:
+                raise CommandError('Пользователь {} не найден.'.format(username))
+        result = []
+        seen = set()
+        for url in urls:
+            with ExitStack() as stack:
+                contexts = [stack.enter_context(CaptureQueriesContext(connections[alias]))
+                            for alias in connections.databases]
+                client.get(url)
+            for query in [query for context in contexts for query in context.captured_queries]:
+                sql = query['sql']
+                if sql.upper().startswith('SELECT') and sql not in seen:
+                    seen.add(sql)
+                    result.append(('{} #{}'.format(url, len(result) + 1), sql, None))
+        return result
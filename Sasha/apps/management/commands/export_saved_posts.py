@@ -0,0 +1,32 @@
+"""
+Команда выгрузки сохранённых постов пользователя в NDJSON.
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.post_transfer import export_posts
+
+
+class Command(BaseCommand):
+    help = 'Выгружает сохранённые посты пользователя с тегами в NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='логин пользователя')
+        parser.add_argument('--output', help='файл для записи, по умолчанию стандартный вывод')
+        parser.add_argument('--chunk-size', type=int, help='сколько постов читать за раз')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError('Пользователь {} не найден.'.format(options['username']))
+
+        chunks = export_posts(user, options['chunk_size'])
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            for chunk in chunks:
+                output.write(chunk)
+        self.stderr.write(self.style.SUCCESS('Посты записаны в {}'.format(options['output'])))
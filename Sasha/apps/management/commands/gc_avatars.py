@@ -0,0 +1,47 @@
+"""
+Команда удаления файлов аватарок, на которые не ссылается ни один пользователь.
+"""
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.avatars import thumbnail_source
+from apps.models import UserAvatar
+from apps.storage import avatar_storage
+
+
+class Command(BaseCommand):
+    help = 'Удаляет файлы аватарок и их уменьшенные копии, не привязанные к пользователям.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=3600,
+                            help='Не трогать файлы моложе указанного числа секунд, '
+                                 'чтобы не задеть загрузки, которые ещё не сохранены в БД.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать файлы, которые будут удалены.')
+
+    def handle(self, *args, **options):
+        upload_to = UserAvatar._meta.get_field('image').upload_to
+        if not avatar_storage.exists(upload_to):
+            return
+        referenced = set(UserAvatar.objects.values_list('image', flat=True))
+        threshold = timezone.now() - datetime.timedelta(seconds=options['grace'])
+        removed, freed = 0, 0
+        for name in avatar_storage.walk(upload_to):
+            if (thumbnail_source(name) or name) in referenced:
+                continue
+            if avatar_storage.get_modified_time(name) > threshold:
+                continue
+            # Список ссылок собран до обхода, файл могли загрузить заново за это время
+            if UserAvatar.objects.filter(image=thumbnail_source(name) or name).exists():
+                continue
+            size = avatar_storage.size(name)
+            if not options['dry_run']:
+                avatar_storage.delete(name)
+            self.stdout.write(name)
+            removed += 1
+            freed += size
+        self.stdout.write(self.style.SUCCESS(
+            'Удалено файлов: {}, освобождено {} КБ'.format(removed, freed // 1024)
+        ))
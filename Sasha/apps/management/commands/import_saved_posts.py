@@ -0,0 +1,35 @@
+"""
+Команда загрузки сохранённых постов пользователя из NDJSON.
+"""
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.post_transfer import import_posts
+
+
+class Command(BaseCommand):
+    help = 'Загружает сохранённые посты с тегами из файла NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='логин пользователя')
+        parser.add_argument('path', help='файл NDJSON, - для стандартного ввода')
+        parser.add_argument('--batch-size', type=int, help='сколько постов записывать за раз')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError('Пользователь {} не найден.'.format(options['username']))
+
+        if options['path'] == '-':
+            report = import_posts(user, sys.stdin.buffer, options['batch_size'])
+        else:
+            with open(options['path'], 'rb') as source:
+                report = import_posts(user, source, options['batch_size'])
+        for error in report['errors']:
+            self.stderr.write('Строка {line}: {error}'.format(**error))
+        self.stdout.write(self.style.SUCCESS(
+            'Загружено постов: {}, пропущено строк: {}'.format(report['imported'], report['failed'])
+        ))
@@ -0,0 +1,25 @@
+"""
+Команда пересборки полнотекстового индекса работ и сохранённых постов.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.models import SavedPosts, Work
+from apps.text_search import index_post, index_work
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс работ и сохранённых постов.'
+
+    def handle(self, *args, **options):
+        works = posts = 0
+        with transaction.atomic():
+            for work in Work.objects.iterator():
+                index_work(work)
+                works += 1
+            for post in SavedPosts.objects.iterator():
+                index_post(post)
+                posts += 1
+        self.stdout.write(self.style.SUCCESS(
+            'Проиндексировано работ: {}, постов: {}'.format(works, posts)
+        ))
@@ -0,0 +1,20 @@
+"""
+Команда пересборки поискового индекса пользователей.
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.user_search import index_user
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает индекс триграмм для поиска пользователей.'
+
+    def handle(self, *args, **options):
+        indexed = 0
+        with transaction.atomic():
+            for user in User.objects.iterator():
+                index_user(user)
+                indexed += 1
+        self.stdout.write(self.style.SUCCESS('Проиндексировано пользователей: {}'.format(indexed)))
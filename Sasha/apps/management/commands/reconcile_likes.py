@@ -0,0 +1,19 @@
+"""
+Команда пересчёта счётчиков лайков.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.likes import reconcile_likes
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает PostsCanals.likes_count по строкам LikesPostInCanals. ' \
+           'Можно запускать при работающем сайте: изменения счётчиков, накопленные ' \
+           'процессами до пересчёта, отбрасываются.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('post_ids', nargs='*', type=int, help='ID публикаций, по умолчанию все')
+
+    def handle(self, *args, **options):
+        fixed = reconcile_likes(options['post_ids'] or None)
+        self.stdout.write(self.style.SUCCESS('Исправлено счётчиков: {}'.format(fixed)))
@@ -0,0 +1,33 @@
+"""
+Команда отправки писем из очереди OutboundEmail.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.mail_backends import get_pool_stats
+from apps.mail_queue import run_worker
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из очереди пачками с повторными попытками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Обработать очередь один раз и выйти.')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Число писем на одно соединение.')
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Пауза в секундах при пустой очереди.')
+        parser.add_argument('--backend', default=None,
+                            help='Почтовый бэкенд, например '
+                                 'django.core.mail.backends.console.EmailBackend.')
+
+    def handle(self, *args, **options):
+        run_worker(
+            interval=options['interval'],
+            batch_size=options['batch_size'],
+            backend=options['backend'],
+            once=options['once'],
+            log=self.stdout.write
+        )
+        for server, stats in get_pool_stats().items():
+            self.stdout.write('{}: {}'.format(server, stats))
@@ -0,0 +1,53 @@
+"""
+Команда прогрева кэша решений уравнений.
+"""
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.equation_cache import normalize_coefficients
+from apps.equation_streams import ROW_READERS, detect_format
+from apps.solvers import CoefficientsError, solve_quadratics
+
+
+class Command(BaseCommand):
+    help = 'Решает частые задачи из файла CSV или NDJSON и сохраняет решения ' \
+           'в EQUATIONS_CACHE_WARM_FILE, откуда их подгружают все процессы сайта.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с коэффициентами a, b, c')
+        parser.add_argument('--format', choices=sorted(ROW_READERS),
+                            help='Формат файла, по умолчанию определяется по расширению')
+        parser.add_argument('--output', default=settings.EQUATIONS_CACHE_WARM_FILE,
+                            help='Куда сохранить решения')
+
+    def handle(self, *args, **options):
+        file_format = detect_format(options['format'], options['path'])
+        if file_format is None:
+            raise CommandError('Не удалось определить формат файла, укажите --format.')
+        if not options['output']:
+            raise CommandError('Не задан EQUATIONS_CACHE_WARM_FILE, укажите --output.')
+
+        keys = dict()
+        skipped = 0
+        with open(options['path'], 'rb') as source:
+            for number, row in ROW_READERS[file_format](source):
+                if isinstance(row, CoefficientsError):
+                    self.stderr.write('Строка {}: {}'.format(number, row))
+                    skipped += 1
+                    continue
+                keys.setdefault(normalize_coefficients(*row), None)
+                if len(keys) >= settings.EQUATIONS_CACHE_SIZE:
+                    break
+        keys = list(keys)
+
+        temporary = options['output'] + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as output:
+            for key, result in zip(keys, solve_quadratics(keys)):
+                output.write(json.dumps({'key': key, 'result': result}) + '\n')
+        os.replace(temporary, options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            'Сохранено решений: {}, пропущено строк: {}'.format(len(keys), skipped)
+        ))
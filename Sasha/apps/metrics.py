@@ -0,0 +1,384 @@
+"""
+Метрики стоимости обработчиков страниц.
+MetricsMiddleware для каждого запроса считает число SQL-запросов и их время,
+время отрисовки шаблонов, размер ответа и общее время и складывает их
+в гистограммы процесса по обработчику из apps/urls.py.
+У потоковых ответов метрики записываются, когда отдача закончилась,
+и включают запросы, сделанные при отдаче.
+Гистограммы выводятся на странице /admin/metrics/ и в формате Prometheus.
+С заголовком X-Metrics-Debug: 1 (при DEBUG или для администратора) ответ
+получает заголовки Server-Timing и X-Request-Metrics с разбивкой по запросу.
+"""
+import asyncio
+import bisect
+import contextvars
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import Template
+
+
+DEBUG_HEADER = 'HTTP_X_METRICS_DEBUG'
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Название метрики, единица, границы корзин, описание
+METRICS = (
+    ('seconds', 'seconds', TIME_BUCKETS, 'Время обработки запроса'),
+    ('queries', 'queries', COUNT_BUCKETS, 'Число SQL-запросов'),
+    ('sql_seconds', 'seconds', TIME_BUCKETS, 'Время SQL-запросов'),
+    ('template_seconds', 'seconds', TIME_BUCKETS, 'Время отрисовки шаблонов'),
+    ('response_bytes', 'bytes', SIZE_BUCKETS, 'Размер ответа'),
+)
+METRIC_BUCKETS = {name: buckets for name, unit, buckets, description in METRICS}
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics(object):
+    """
+    Метрики одного запроса.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+
+    def as_dict(self, response_bytes):
+        return {
+            'seconds': time.perf_counter() - self.started,
+            'queries': self.queries,
+            'sql_seconds': self.sql_seconds,
+            'template_seconds': self.template_seconds,
+            'response_bytes': response_bytes,
+        }
+
+
+class Histogram(object):
+    """
+    Гистограмма с фиксированными границами корзин, как в Prometheus.
+    """
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Оценка квантиля линейной интерполяцией внутри корзины.
+        :param q: квантиль от 0 до 1
+        :return: значение или None, если наблюдений нет
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def cumulative(self):
+        """
+        Накопленные счётчики по корзинам.
+        :return: список пар (граница или '+Inf', число наблюдений не больше границы)
+        """
+        result = []
+        total = 0
+        for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class MetricsRegistry(object):
+    """
+    Гистограммы метрик по обработчикам страниц.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = dict()
+
+    def observe(self, view, values):
+        """
+        Добавляет метрики запроса.
+        :param view: имя обработчика
+        :param values: словарь {метрика: значение}, None пропускается
+        """
+        with self._lock:
+            histograms = self._views.get(view)
+            if histograms is None:
+                histograms = {name: Histogram(buckets) for name, buckets in METRIC_BUCKETS.items()}
+                self._views[view] = histograms
+            for name, value in values.items():
+                if value is not None:
+                    histograms[name].observe(value)
+
+    def snapshot(self):
+        """
+        Копия гистограмм.
+        :return: словарь {обработчик: {метрика: Histogram}}
+        """
+        with self._lock:
+            result = dict()
+            for view, histograms in self._views.items():
+                result[view] = dict()
+                for name, histogram in histograms.items():
+                    copy = Histogram(histogram.buckets)
+                    copy.counts = list(histogram.counts)
+                    copy.count, copy.sum = histogram.count, histogram.sum
+                    result[view][name] = copy
+            return result
+
+    def clear(self):
+        with self._lock:
+            self._views.clear()
+
+
+registry = MetricsRegistry()
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Обёртка выполнения SQL, учитывает запрос в метриках текущего запроса.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.sql_seconds += time.perf_counter() - started
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    """
+    Подключает record_query к каждому новому соединению с базой.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+_template_render = Template.render
+
+
+def timed_render(self, context=None, request=None):
+    """
+    Template.render с замером времени. Вложенные вызовы render_to_string
+    учитываются один раз, во внешнем.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return _template_render(self, context, request)
+    metrics.template_depth += 1
+    started = time.perf_counter()
+    try:
+        return _template_render(self, context, request)
+    finally:
+        metrics.template_depth -= 1
+        if not metrics.template_depth:
+            metrics.template_seconds += time.perf_counter() - started
+
+
+def install():
+    """
+    Включает сбор метрик: обёртку SQL для уже открытых и новых соединений
+    и замер шаблонов. Повторный вызов ничего не меняет.
+    """
+    connection_created.connect(install_query_wrapper, dispatch_uid='apps.metrics')
+    for connection in connections.all():
+        install_query_wrapper(None, connection)
+    Template.render = timed_render
+
+
+def view_name(request):
+    """
+    Имя обработчика страницы, например apps.views.get_works.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    function = getattr(match.func, 'view_class', match.func)
+    return '{}.{}'.format(function.__module__, function.__name__)
+
+
+def response_size(response):
+    """
+    Размер ответа в байтах. Для файла берётся из Content-Length.
+    :return: размер или None, если он неизвестен
+    """
+    if not response.streaming:
+        return len(response.content)
+    if response.has_header('Content-Length'):
+        return int(response['Content-Length'])
+    return None
+
+
+def measured_stream(content, metrics, view):
+    """
+    Отдаёт куски потокового ответа и записывает метрики запроса после последнего.
+    Пока готовится очередной кусок, SQL-запросы учитываются в metrics.
+    :param content: итератор кусков ответа
+    :param metrics: объект RequestMetrics
+    :param view: имя обработчика
+    """
+    size = 0
+    iterator = iter(content)
+    try:
+        while True:
+            token = _current.set(metrics)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                _current.reset(token)
+            size += len(chunk)
+            yield chunk
+    finally:
+        registry.observe(view, metrics.as_dict(size))
+
+
+def debug_headers(response, values):
+    """
+    Разбивка запроса в заголовках ответа.
+    """
+    response['Server-Timing'] = ', '.join([
+        'db;dur={:.2f};desc="{} queries"'.format(values['sql_seconds'] * 1000, values['queries']),
+        'tpl;dur={:.2f}'.format(values['template_seconds'] * 1000),
+        'total;dur={:.2f}'.format(values['seconds'] * 1000),
+    ])
+    response['X-Request-Metrics'] = '; '.join(
+        '{}={}'.format(name, round(value, 6) if isinstance(value, float) else value)
+        for name, value in values.items() if value is not None
+    )
+
+
+def wants_debug(request):
+    if request.META.get(DEBUG_HEADER) != '1':
+        return False
+    user = getattr(request, 'user', None)
+    return settings.DEBUG or (user is not None and user.is_superuser and user.is_staff)
+
+
+class MetricsMiddleware(object):
+    """
+    Сбор метрик запросов. Подключается первым в MIDDLEWARE,
+    чтобы учитывать и работу остальных middleware.
+    Работает и в синхронном, и в асинхронном режиме: под ASGI запрос
+    не переводится в отдельный поток. Метрики запроса хранятся
+    в contextvar, который asgiref передаёт в потоки sync_to_async.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Так Django узнаёт, что middleware асинхронный, как и MiddlewareMixin
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        install()
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, wants_debug(request))
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        # request.user может читать сессию из БД, это делается в потоке
+        debug = request.META.get(DEBUG_HEADER) == '1' and await sync_to_async(wants_debug)(request)
+        return self.finish(request, response, metrics, debug)
+
+    def finish(self, request, response, metrics, debug):
+        """
+        Записывает метрики запроса.
+        Потоковый ответ оборачивается, и метрики записываются после отдачи,
+        заголовки отладки у него - на момент начала отдачи.
+        Файл (FileResponse) не оборачивается, чтобы сервер мог отдать его
+        через wsgi.file_wrapper: при чтении файла запросов к базе нет.
+        """
+        if response.streaming and getattr(response, 'file_to_stream', None) is None:
+            if debug:
+                debug_headers(response, metrics.as_dict(None))
+            response.streaming_content = measured_stream(
+                response.streaming_content, metrics, view_name(request)
+            )
+            return response
+        values = metrics.as_dict(response_size(response))
+        registry.observe(view_name(request), values)
+        if debug:
+            debug_headers(response, values)
+        return response
+
+
+def summary(snapshot):
+    """
+    Сводка гистограмм для страницы метрик.
+    :param snapshot: результат registry.snapshot()
+    :return: список словарей по обработчикам, самые медленные первыми
+    """
+    rows = []
+    for view, histograms in snapshot.items():
+        row = {'view': view, 'requests': histograms['seconds'].count}
+        for name, histogram in histograms.items():
+            row[name] = {
+                'mean': histogram.sum / histogram.count if histogram.count else None,
+                'p50': histogram.quantile(0.5),
+                'p95': histogram.quantile(0.95),
+                'p99': histogram.quantile(0.99),
+            }
+        rows.append(row)
+    rows.sort(key=lambda row: -(row['seconds']['mean'] or 0) * row['requests'])
+    return rows
+
+
+def prometheus_text(snapshot):
+    """
+    Гистограммы в текстовом формате Prometheus.
+    :param snapshot: результат registry.snapshot()
+    :return: строка
+    """
+    lines = []
+    for name, unit, buckets, description in METRICS:
+        metric = 'sasha_view_{}'.format(name)
+        lines.append('# HELP {} {}'.format(metric, description))
+        lines.append('# TYPE {} histogram'.format(metric))
+        for view in sorted(snapshot):
+            histogram = snapshot[view][name]
+            for bound, count in histogram.cumulative():
+                lines.append('{}_bucket{{view="{}",le="{}"}} {}'.format(metric, view, bound, count))
+            lines.append('{}_sum{{view="{}"}} {}'.format(metric, view, repr(float(histogram.sum))))
+            lines.append('{}_count{{view="{}"}} {}'.format(metric, view, histogram.count))
+    return '\n'.join(lines) + '\n'
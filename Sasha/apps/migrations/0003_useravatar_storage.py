@@ -0,0 +1,19 @@
+# Generated by Django 3.1.4 on 2026-10-17 09:00
+
+import apps.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0002_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='useravatar',
+            name='image',
+            field=models.ImageField(storage=apps.storage.ContentAddressedStorage(), upload_to='avatars'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 3.1.4 on 2026-10-17 09:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_index(apps, schema_editor):
+    from apps.user_search import user_search_text, document_trigrams
+
+    User = apps.get_model('auth', 'User')
+    UserSearchIndex = apps.get_model('apps', 'UserSearchIndex')
+    UserSearchTrigram = apps.get_model('apps', 'UserSearchTrigram')
+    for user in User.objects.iterator():
+        text = user_search_text(user)
+        UserSearchIndex.objects.create(user=user, text=text)
+        UserSearchTrigram.objects.bulk_create(
+            [UserSearchTrigram(user=user, trigram=trigram) for trigram in document_trigrams(text)]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('apps', '0003_useravatar_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchIndex',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_index', serialize=False, to='auth.user')),
+                ('text', models.TextField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserSearchTrigram',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_trigrams', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='usersearchtrigram',
+            constraint=models.UniqueConstraint(fields=('trigram', 'user'), name='user_trigram_unique'),
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX auth_user_date_joined_id_idx ON auth_user (date_joined, id)',
+            'DROP INDEX auth_user_date_joined_id_idx'
+        ),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
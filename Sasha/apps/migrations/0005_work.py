@@ -0,0 +1,30 @@
+# Generated by Django 3.1.4 on 2026-10-17 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0004_user_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Work',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('slug', models.SlugField(allow_unicode=True, blank=True, max_length=200, unique=True)),
+                ('description', models.TextField(blank=True, default='')),
+                ('price', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('preview', models.ImageField(blank=True, upload_to='works')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='work',
+            index=models.Index(fields=['title', 'id'], name='work_title_id_idx'),
+        ),
+    ]
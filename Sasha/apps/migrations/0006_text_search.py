@@ -0,0 +1,91 @@
+# Generated by Django 3.1.4 on 2026-10-17 09:00
+
+from collections import Counter
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_fts_table(apps, schema_editor):
+    from apps.text_search import create_fts_table
+    create_fts_table(schema_editor)
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS apps_search_fts')
+
+
+def build_index(apps, schema_editor):
+    from apps.stemming import tokenize
+
+    Work = apps.get_model('apps', 'Work')
+    SavedPosts = apps.get_model('apps', 'SavedPosts')
+    PostsTags = apps.get_model('apps', 'PostsTags')
+    SearchDocument = apps.get_model('apps', 'SearchDocument')
+    SearchPosting = apps.get_model('apps', 'SearchPosting')
+    connection = schema_editor.connection
+    use_fts = connection.vendor == 'sqlite' and \
+        'apps_search_fts' in connection.introspection.table_names()
+
+    def add(kind, object_id, owner_id, text):
+        terms = tokenize(text)
+        document = SearchDocument.objects.create(
+            kind=kind, object_id=object_id, owner_id=owner_id, length=len(terms)
+        )
+        if use_fts:
+            with connection.cursor() as cursor:
+                cursor.execute('INSERT INTO apps_search_fts(rowid, body) VALUES (%s, %s)',
+                               [document.id, ' '.join(terms)])
+        else:
+            SearchPosting.objects.bulk_create([
+                SearchPosting(term=term, document=document, frequency=frequency)
+                for term, frequency in Counter(terms).items()
+            ])
+
+    for work in Work.objects.iterator():
+        add('work', work.id, None, '{}\n{}'.format(work.title, work.description))
+    for post in SavedPosts.objects.iterator():
+        tags = PostsTags.objects.filter(post=post).values_list('tag', flat=True)
+        add('post', post.id, post.user_id, '\n'.join([post.title] + list(tags)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('apps', '0005_work'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('work', 'Работа'), ('post', 'Сохранённый пост')], max_length=20)),
+                ('object_id', models.PositiveIntegerField()),
+                ('length', models.PositiveIntegerField(default=0)),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('frequency', models.PositiveIntegerField()),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='apps.searchdocument')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchdocument',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='search_document_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='searchposting',
+            index=models.Index(fields=['term', 'document'], name='search_posting_term_idx'),
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.4 on 2026-10-17 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0006_text_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='poststags',
+            index=models.Index(fields=['tag', 'post'], name='posts_tags_tag_post_idx'),
+        ),
+    ]
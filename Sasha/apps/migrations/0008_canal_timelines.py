@@ -0,0 +1,72 @@
+# Generated by Django 3.1.4 on 2026-10-17 09:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_timelines(apps, schema_editor):
+    Canals = apps.get_model('apps', 'Canals')
+    UserCanals = apps.get_model('apps', 'UserCanals')
+    PostsCanals = apps.get_model('apps', 'PostsCanals')
+    TimelineEntry = apps.get_model('apps', 'TimelineEntry')
+
+    for canal in Canals.objects.iterator():
+        member_ids = list(UserCanals.objects.filter(canal=canal)
+                          .values_list('user_id', flat=True).distinct())
+        canal.members_count = UserCanals.objects.filter(canal=canal).count()
+        canal.fan_out_on_read = canal.members_count > settings.CANAL_FANOUT_MAX_MEMBERS
+        canal.save(update_fields=['members_count', 'fan_out_on_read'])
+        if canal.fan_out_on_read:
+            continue
+        posts = list(PostsCanals.objects.filter(canal=canal).order_by('-datetime', '-id')
+                     .values_list('id', 'datetime')[:settings.CANAL_TIMELINE_BACKFILL])
+        TimelineEntry.objects.bulk_create([
+            TimelineEntry(user_id=user_id, post_id=post_id, canal_id=canal.id, datetime=datetime)
+            for user_id in member_ids
+            for post_id, datetime in posts
+        ], batch_size=settings.CANAL_FANOUT_BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('apps', '0007_posts_tags_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='canals',
+            name='fan_out_on_read',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='canals',
+            name='members_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('datetime', models.DateTimeField()),
+                ('canal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='apps.canals')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='apps.postscanals')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='timeline_entry_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', 'datetime', 'post'], name='timeline_user_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', 'canal'], name='timeline_user_canal_idx'),
+        ),
+        migrations.RunPython(build_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.1.4 on 2026-10-17 09:00
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_likes(apps, schema_editor):
+    LikesPostInCanals = apps.get_model('apps', 'LikesPostInCanals')
+    duplicates = LikesPostInCanals.objects.values('post', 'user').order_by() \
+        .annotate(first=Min('id'), count=Count('id')).filter(count__gt=1)
+    for duplicate in duplicates:
+        LikesPostInCanals.objects.filter(post=duplicate['post'], user=duplicate['user']) \
+            .exclude(id=duplicate['first']).delete()
+
+
+def count_likes(apps, schema_editor):
+    PostsCanals = apps.get_model('apps', 'PostsCanals')
+    LikesPostInCanals = apps.get_model('apps', 'LikesPostInCanals')
+    counts = LikesPostInCanals.objects.values('post').order_by().annotate(count=Count('id'))
+    for row in counts:
+        PostsCanals.objects.filter(id=row['post']).update(likes_count=row['count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0008_canal_timelines'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postscanals',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(remove_duplicate_likes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='likespostincanals',
+            constraint=models.UniqueConstraint(fields=('post', 'user'), name='like_post_user_unique'),
+        ),
+        migrations.RunPython(count_likes, migrations.RunPython.noop),
+    ]
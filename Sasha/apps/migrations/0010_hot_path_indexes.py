@@ -0,0 +1,52 @@
+# Generated by Django 3.1.4 on 2026-10-17 09:00
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def check_duplicate_emails(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    duplicates = list(
+        User.objects.exclude(email='').annotate(email_key=Lower('email'))
+        .values('email_key').order_by().annotate(count=Count('id'))
+        .filter(count__gt=1).values_list('email_key', flat=True)[:20]
+    )
+    if duplicates:
+        raise RuntimeError(
+            'Почта привязана к нескольким аккаунтам, исправьте перед миграцией: {}'.format(
+                ', '.join(duplicates)
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('apps', '0009_likes_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='savedposts',
+            index=models.Index(fields=['user', 'datetime'], name='saved_posts_user_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usercanals',
+            index=models.Index(fields=['user', 'canal'], name='user_canals_user_canal_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postscanals',
+            index=models.Index(fields=['canal', 'datetime'], name='canal_posts_datetime_idx'),
+        ),
+        migrations.RunPython(check_duplicate_emails, migrations.RunPython.noop),
+        migrations.RunSQL(
+            "CREATE UNIQUE INDEX auth_user_email_ci_uniq ON auth_user (LOWER(email)) WHERE email <> ''",
+            'DROP INDEX auth_user_email_ci_uniq',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX auth_user_email_lower_idx ON auth_user (LOWER(email))',
+            'DROP INDEX auth_user_email_lower_idx',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.4 on 2026-10-17 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0010_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postscanals',
+            name='likes_epoch',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
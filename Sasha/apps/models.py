@@ -3,24 +3,14 @@
 """
 
 from django.db import models
+from django.utils import timezone
+from django.utils.text import slugify
 from django.contrib.auth.models import User
 
+from .storage import avatar_storage
+from .themes import THEME_CHOICES, BACKGROUND_THEME_CHOICES, \
+    DEFAULT_THEME, DEFAULT_BACKGROUND_THEME
 
-THEMES = [
-    ('primary', 'Стандартный цвет'),
-    ('blue', 'Голубой'),
-    ('green', 'Зеленый'),
-    ('red', 'Карминный'),
-    ('indigo', 'Индиго'),
-    ('aqua', 'Бирюзовый'),
-    ('orange', 'Оранжевый'),
-    ('claret', 'Бордовый')
-]
-
-BG_THEMES = [
-    ('light', 'Светлая'),
-    ('dark', 'Тёмная')
-]
 
 POST_SORTS = [
     ('name', 'По названию'),
@@ -38,13 +28,13 @@ class ThemeChanger(models.Model):
     """
     theme = models.CharField(
         max_length=20,
-        default='primary',
-        choices=THEMES
+        default=DEFAULT_THEME.key,
+        choices=THEME_CHOICES
     )
     background_theme = models.CharField(
         max_length=20,
-        default='light',
-        choices=BG_THEMES
+        default=DEFAULT_BACKGROUND_THEME.key,
+        choices=BACKGROUND_THEME_CHOICES
     )
     user = models.OneToOneField(
         User,
@@ -73,9 +63,444 @@ class EditEmail(models.Model):
 class UserAvatar(models.Model):
     """
     Аватарка для пользователя.
+    Файлы хранятся под хэшем содержимого, см. apps.storage.
     Имеет два поля:
     1) Пользователь
     2) Аватарка (модель ImageField)
     """
     user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
-    image = models.ImageField(upload_to='avatars')
+    image = models.ImageField(upload_to='avatars', storage=avatar_storage)
+
+
+class OutboundEmail(models.Model):
+    """
+    Письмо в очереди на отправку.
+    Письма отправляет команда run_mail_queue.
+    Имеет поля:
+    1) тема, текст и HTML-версия письма
+    2) отправитель и получатели (по одному на строку)
+    3) статус, число попыток и время следующей попытки
+    4) текст последней ошибки
+    5) время создания и отправки
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUSES = [
+        (PENDING, 'В очереди'),
+        (SENT, 'Отправлено'),
+        (FAILED, 'Не отправлено')
+    ]
+
+    subject = models.CharField(
+        max_length=255
+    )
+    body = models.TextField()
+    html_body = models.TextField(
+        blank=True,
+        default=''
+    )
+    from_email = models.CharField(
+        max_length=254,
+        blank=True,
+        default=''
+    )
+    to = models.TextField()
+    status = models.CharField(
+        max_length=20,
+        default=PENDING,
+        choices=STATUSES
+    )
+    attempts = models.PositiveIntegerField(
+        default=0
+    )
+    next_attempt = models.DateTimeField(
+        default=timezone.now
+    )
+    last_error = models.TextField(
+        blank=True,
+        default=''
+    )
+    created = models.DateTimeField(
+        auto_now_add=True
+    )
+    sent = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt'], name='outbound_status_next_idx')
+        ]
+
+    @property
+    def recipients(self):
+        """
+        Список получателей письма.
+        :return: список адресов
+        """
+        return [address for address in self.to.splitlines() if address]
+
+
+class SavedPosts(models.Model):
+    """
+    Сохранённый пользователем пост.
+    Имеет поля:
+    1) Пользователь
+    2) Время сохранения
+    3) Заголовок и ссылка
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE
+    )
+    datetime = models.DateTimeField()
+    title = models.CharField(
+        max_length=512,
+        default=''
+    )
+    url = models.CharField(
+        max_length=512
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'datetime'], name='saved_posts_user_datetime_idx')
+        ]
+
+
+class PostsTags(models.Model):
+    """
+    Тег сохранённого поста.
+    Имеет два поля:
+    1) Тег
+    2) Пост
+    """
+    tag = models.CharField(
+        max_length=256
+    )
+    post = models.ForeignKey(
+        SavedPosts,
+        on_delete=models.CASCADE
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tag', 'post'], name='posts_tags_tag_post_idx')
+        ]
+
+
+class Canals(models.Model):
+    """
+    Канал, в который участники публикуют посты.
+    Имеет поля:
+    1) название и код приглашения
+    2) администратор
+    3) число участников
+    4) признак большого канала: его посты не раскладываются по лентам
+       участников при публикации, а читаются из PostsCanals при выводе ленты
+    """
+    name = models.CharField(
+        max_length=100
+    )
+    code = models.CharField(
+        max_length=50
+    )
+    admin = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE
+    )
+    members_count = models.PositiveIntegerField(
+        default=0
+    )
+    fan_out_on_read = models.BooleanField(
+        default=False
+    )
+
+    def __str__(self):
+        return self.name
+
+
+class UserCanals(models.Model):
+    """
+    Участник канала.
+    Имеет поля:
+    1) Пользователь
+    2) Канал
+    3) Время вступления
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE
+    )
+    canal = models.ForeignKey(
+        Canals,
+        on_delete=models.CASCADE
+    )
+    datetime = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'canal'], name='user_canals_user_canal_idx')
+        ]
+
+
+class PostsCanals(models.Model):
+    """
+    Пост, опубликованный в канале.
+    Имеет поля:
+    1) Сохранённый пост
+    2) Канал и автор публикации
+    3) Время публикации
+    4) Число лайков и номер его пересчёта, см. apps.likes
+    """
+    post = models.ForeignKey(
+        SavedPosts,
+        on_delete=models.CASCADE
+    )
+    canal = models.ForeignKey(
+        Canals,
+        on_delete=models.CASCADE
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE
+    )
+    datetime = models.DateTimeField()
+    likes_count = models.PositiveIntegerField(
+        default=0
+    )
+    likes_epoch = models.PositiveIntegerField(
+        default=0
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['canal', 'datetime'], name='canal_posts_datetime_idx')
+        ]
+
+
+class LikesPostInCanals(models.Model):
+    """
+    Лайк поста в канале, не больше одного от пользователя.
+    Имеет поля:
+    1) Пользователь
+    2) Публикация в канале
+    3) Время лайка
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE
+    )
+    post = models.ForeignKey(
+        PostsCanals,
+        on_delete=models.CASCADE
+    )
+    datetime = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'user'], name='like_post_user_unique')
+        ]
+
+
+class UserSearchIndex(models.Model):
+    """
+    Текст для поиска пользователя.
+    Логин, имя, фамилия и почта в нижнем регистре, по одному на строку.
+    Имеет два поля:
+    1) Пользователь
+    2) Текст
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_index'
+    )
+    text = models.TextField()
+
+
+class UserSearchTrigram(models.Model):
+    """
+    Триграмма из данных пользователя.
+    По триграммам быстро выбираются кандидаты для поиска по подстроке.
+    Имеет два поля:
+    1) Пользователь
+    2) Триграмма
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='search_trigrams'
+    )
+    trigram = models.CharField(
+        max_length=3
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['trigram', 'user'], name='user_trigram_unique')
+        ]
+
+
+class Work(models.Model):
+    """
+    Готовая работа из каталога.
+    Имеет поля:
+    1) название и адрес страницы (slug)
+    2) описание и цена
+    3) превью
+    4) время создания и изменения
+    """
+    title = models.CharField(
+        max_length=200
+    )
+    slug = models.SlugField(
+        max_length=200,
+        unique=True,
+        allow_unicode=True,
+        blank=True
+    )
+    description = models.TextField(
+        blank=True,
+        default=''
+    )
+    price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0
+    )
+    preview = models.ImageField(
+        upload_to='works',
+        blank=True
+    )
+    created = models.DateTimeField(
+        auto_now_add=True
+    )
+    updated = models.DateTimeField(
+        auto_now=True
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['title', 'id'], name='work_title_id_idx')
+        ]
+
+    def __str__(self):
+        return self.title
+
+    def save(self, *args, **kwargs):
+        """
+        Сохранение работы, slug по умолчанию строится из названия.
+        """
+        if not self.slug:
+            base = slugify(self.title, allow_unicode=True)[:190] or 'work'
+            self.slug, number = base, 2
+            while Work.objects.filter(slug=self.slug).exclude(pk=self.pk).exists():
+                self.slug, number = '{}-{}'.format(base, number), number + 1
+        super().save(*args, **kwargs)
+
+    def get_absolute_url(self):
+        return '/works/{}/'.format(self.slug)
+
+
+class SearchDocument(models.Model):
+    """
+    Документ полнотекстового поиска: работа или сохранённый пост.
+    Слова документа лежат в таблице FTS5 apps_search_fts с rowid = id документа,
+    а если SQLite собран без FTS5 - в SearchPosting.
+    Имеет поля:
+    1) вид и ID исходного объекта
+    2) владелец (для постов, которые видит только он)
+    3) число слов
+    """
+    WORK = 'work'
+    POST = 'post'
+    KINDS = [
+        (WORK, 'Работа'),
+        (POST, 'Сохранённый пост')
+    ]
+
+    kind = models.CharField(
+        max_length=20,
+        choices=KINDS
+    )
+    object_id = models.PositiveIntegerField()
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True
+    )
+    length = models.PositiveIntegerField(
+        default=0
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='search_document_unique')
+        ]
+
+
+class SearchPosting(models.Model):
+    """
+    Вхождение слова в документ, когда нет FTS5.
+    Имеет поля:
+    1) основа слова
+    2) документ
+    3) число вхождений
+    """
+    term = models.CharField(
+        max_length=64
+    )
+    document = models.ForeignKey(
+        SearchDocument,
+        on_delete=models.CASCADE,
+        related_name='postings'
+    )
+    frequency = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'document'], name='search_posting_term_idx')
+        ]
+
+
+class TimelineEntry(models.Model):
+    """
+    Запись ленты участника канала.
+    Заполняется при публикации поста в канал (fan-out on write),
+    так что лента читается одним запросом по индексу без соединения
+    UserCanals и PostsCanals.
+    Имеет поля:
+    1) Пользователь, чья это лента
+    2) Публикация и её канал
+    3) Время публикации
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        PostsCanals,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    canal = models.ForeignKey(
+        Canals,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    datetime = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], name='timeline_entry_unique')
+        ]
+        indexes = [
+            models.Index(fields=['user', 'datetime', 'post'], name='timeline_user_datetime_idx'),
+            models.Index(fields=['user', 'canal'], name='timeline_user_canal_idx')
+        ]
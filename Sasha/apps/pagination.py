@@ -0,0 +1,158 @@
+"""
+Постраничный вывод по ключу (keyset pagination).
+Вместо OFFSET следующая страница выбирается условием "ключ больше последнего
+показанного", поэтому стоимость запроса не растёт с номером страницы.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+# Целые за пределами 64 бит база не принимает
+MIN_INTEGER = -2 ** 63
+MAX_INTEGER = 2 ** 63 - 1
+
+
+class KeysetPage(object):
+    """
+    Страница результатов.
+    Имеет поля:
+    1) объекты страницы
+    2) курсоры для перехода вперёд и назад или None
+    """
+    def __init__(self, items, next_cursor, previous_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(values):
+    """
+    Кодирование значений ключа в строку для URL.
+    :param values: список значений полей ключа
+    :return: строка курсора
+    """
+    raw = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, fields, model):
+    """
+    Декодирование курсора.
+    Каждое значение приводится к типу поля и проверяется его валидаторами,
+    у внешнего ключа - полем, на которое он ссылается.
+    :param cursor: строка курсора
+    :param fields: поля ключа
+    :param model: модель, для определения типов полей
+    :return: список значений или None, если курсор некорректен
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(fields):
+        return None
+    result = []
+    for field_name, value in zip(fields, values):
+        field = model._meta.get_field(field_name)
+        field = getattr(field, 'target_field', field)
+        try:
+            value = field.to_python(value)
+            field.run_validators(value)
+        except (ValidationError, TypeError, ValueError, OverflowError):
+            return None
+        if value is None or isinstance(value, int) and not MIN_INTEGER <= value <= MAX_INTEGER:
+            return None
+        result.append(value)
+    return result
+
+
+def keyset_filter(fields, values, descending):
+    """
+    Условие "ключ после значений" для составного ключа.
+    (a, b) > (x, y) раскрывается в a > x OR (a = x AND b > y).
+    :param fields: поля ключа
+    :param values: значения ключа
+    :param descending: сравнение "меньше" вместо "больше"
+    :return: объект Q
+    """
+    lookup = 'lt' if descending else 'gt'
+    condition = Q()
+    for position in range(len(fields)):
+        part = Q(**{'{}__{}'.format(fields[position], lookup): values[position]})
+        for equal in range(position):
+            part &= Q(**{fields[equal]: values[equal]})
+        condition |= part
+    return condition
+
+
+def keyset_paginate(queryset, fields, per_page, after=None, before=None):
+    """
+    Выбор одной страницы из queryset по возрастанию ключа.
+    Последнее поле ключа должно быть уникальным, например id.
+    :param queryset: исходный QuerySet
+    :param fields: поля ключа, например ('date_joined', 'id')
+    :param per_page: размер страницы
+    :param after: курсор, после которого начинается страница
+    :param before: курсор, перед которым заканчивается страница
+    :return: объект KeysetPage
+    """
+    model = queryset.model
+    before_values = decode_cursor(before, fields, model) if before else None
+    after_values = decode_cursor(after, fields, model) if after and before_values is None else None
+
+    if before_values is not None:
+        queryset = queryset.filter(keyset_filter(fields, before_values, True))
+        items = list(queryset.order_by(*('-' + field for field in fields))[:per_page + 1])
+        has_more = len(items) > per_page
+        items = items[:per_page][::-1]
+        has_previous, has_next = has_more, True
+    else:
+        if after_values is not None:
+            queryset = queryset.filter(keyset_filter(fields, after_values, False))
+        items = list(queryset.order_by(*fields)[:per_page + 1])
+        has_more = len(items) > per_page
+        items = items[:per_page]
+        has_previous, has_next = after_values is not None, has_more
+
+    def cursor(item):
+        return encode_cursor([getattr(item, field) for field in fields])
+
+    return KeysetPage(
+        items,
+        cursor(items[-1]) if items and has_next else None,
+        cursor(items[0]) if items and has_previous else None
+    )
+
+
+def page_query(query_dict, **params):
+    """
+    Строка запроса для ссылки на другую страницу.
+    :param query_dict: текущий request.GET
+    :param params: параметры, которые нужно заменить; None удаляет параметр
+    :return: строка вида ?user=ivan&after=...
+    """
+    query = query_dict.copy()
+    for key, value in params.items():
+        if value is None:
+            query.pop(key, None)
+        else:
+            query[key] = value
+    return '?' + query.urlencode()
@@ -0,0 +1,138 @@
+"""
+Фильтрация сохранённых постов по тегам.
+Для каждого тега из запроса одним запросом по индексу (tag, post) таблицы
+PostsTags берутся отсортированные ID постов пользователя, а условия И/ИЛИ
+считаются в памяти пересечением и объединением отсортированных списков.
+"""
+import heapq
+import re
+from bisect import bisect_left
+from itertools import groupby
+
+from django.conf import settings
+
+from .models import PostsTags, SavedPosts
+
+
+AND = 'and'
+OR = 'or'
+
+TAG_SEPARATOR_RE = re.compile(r'[,\s]+')
+
+
+def parse_tags(text):
+    """
+    Теги из строки запроса, через запятую или пробел, без повторов.
+    :param text: строка
+    :return: список тегов в порядке ввода
+    """
+    tags = []
+    for tag in TAG_SEPARATOR_RE.split(text or ''):
+        tag = tag.lstrip('#')
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def intersect_sorted(lists):
+    """
+    Пересечение отсортированных списков без повторов.
+    Обход начинается с самого короткого списка, позиция в остальных
+    ищется двоичным поиском от последней найденной.
+    :param lists: список отсортированных списков
+    :return: отсортированный список
+    """
+    if not lists:
+        return []
+    lists = sorted(lists, key=len)
+    result = lists[0]
+    for other in lists[1:]:
+        if not result:
+            break
+        found = []
+        position = 0
+        for value in result:
+            position = bisect_left(other, value, position)
+            if position == len(other):
+                break
+            if other[position] == value:
+                found.append(value)
+        result = found
+    return list(result)
+
+
+def union_sorted(lists):
+    """
+    Объединение отсортированных списков слиянием.
+    :param lists: список отсортированных списков
+    :return: отсортированный список без повторов
+    """
+    result = []
+    for value in heapq.merge(*lists):
+        if not result or result[-1] != value:
+            result.append(value)
+    return result
+
+
+def tag_post_ids(user, tags):
+    """
+    ID постов пользователя по каждому тегу.
+    Один запрос, строки идут в порядке индекса (tag, post).
+    :param user: пользователь
+    :param tags: список тегов
+    :return: словарь {тег: отсортированный список ID постов}
+    """
+    rows = PostsTags.objects.filter(tag__in=tags, post__user=user) \
+        .order_by('tag', 'post_id').values_list('tag', 'post_id')
+    result = {tag: [] for tag in tags}
+    for tag, group in groupby(rows.iterator(), key=lambda row: row[0]):
+        post_ids = result[tag]
+        for _, post_id in group:
+            if not post_ids or post_ids[-1] != post_id:
+                post_ids.append(post_id)
+    return result
+
+
+class TagQuery(object):
+    """
+    Результат фильтра по тегам.
+    Имеет поля:
+    1) ID подходящих постов по возрастанию
+    2) число постов пользователя с каждым тегом
+    """
+    def __init__(self, post_ids, counts):
+        self.post_ids = post_ids
+        self.counts = counts
+
+    @property
+    def count(self):
+        return len(self.post_ids)
+
+    def page(self, number, per_page=None):
+        """
+        Посты страницы, новые первыми.
+        :param number: номер страницы с единицы
+        :param per_page: размер страницы, по умолчанию SAVED_POSTS_PAGE_SIZE
+        :return: список объектов SavedPosts
+        """
+        per_page = per_page or settings.SAVED_POSTS_PAGE_SIZE
+        end = len(self.post_ids) - (number - 1) * per_page
+        page_ids = self.post_ids[max(end - per_page, 0):max(end, 0)][::-1]
+        posts = SavedPosts.objects.in_bulk(page_ids)
+        return [posts[post_id] for post_id in page_ids if post_id in posts]
+
+
+def query_tags(user, tags, mode=AND):
+    """
+    Посты пользователя, у которых есть все (AND) или хотя бы один (OR) из тегов.
+    :param user: пользователь
+    :param tags: список тегов
+    :param mode: AND или OR
+    :return: объект TagQuery
+    """
+    by_tag = tag_post_ids(user, tags) if tags else {}
+    combine = intersect_sorted if mode == AND else union_sorted
+    return TagQuery(
+        combine(list(by_tag.values())),
+        {tag: len(post_ids) for tag, post_ids in by_tag.items()}
+    )
@@ -0,0 +1,199 @@
+"""
+Выгрузка и загрузка сохранённых постов пользователя в NDJSON.
+Каждая строка - объект {"title", "url", "datetime", "tags"}.
+Выгрузка читает посты через iterator() пачками по SAVED_POSTS_EXPORT_CHUNK_SIZE
+и теги каждой пачки одним запросом. Под ASGI она целиком пишется во временный
+файл до отдачи: ASGIHandler в Django 3.1 читает потоковый ответ в цикле событий,
+где обращаться к базе нельзя. Загрузка пишет пачки по
+SAVED_POSTS_IMPORT_BATCH_SIZE через bulk_create, каждую в своей транзакции.
+"""
+import json
+from itertools import islice
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import PostsTags, SavedPosts
+from .post_tags import parse_tags
+from .text_search import index_new_posts
+
+
+# Сколько ошибок разбора возвращать в отчёте о загрузке
+MAX_REPORTED_ERRORS = 100
+
+
+class PostFormatError(ValueError):
+    """
+    Ошибка в строке загружаемого файла.
+    """
+
+
+def export_posts(user, chunk_size=None):
+    """
+    Посты пользователя с тегами в формате NDJSON, старые первыми.
+    :param user: пользователь
+    :param chunk_size: сколько постов читать за раз, по умолчанию SAVED_POSTS_EXPORT_CHUNK_SIZE
+    :return: генератор кусков текста, по одному на пачку
+    """
+    chunk_size = chunk_size or settings.SAVED_POSTS_EXPORT_CHUNK_SIZE
+    posts = SavedPosts.objects.filter(user=user).order_by('id') \
+        .values_list('id', 'title', 'url', 'datetime').iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(posts, chunk_size))
+        if not chunk:
+            break
+        tags = dict()
+        for post_id, tag in PostsTags.objects.filter(post_id__in=[row[0] for row in chunk]) \
+                .order_by('id').values_list('post_id', 'tag'):
+            tags.setdefault(post_id, []).append(tag)
+        yield ''.join(
+            json.dumps({
+                'title': title,
+                'url': url,
+                'datetime': datetime.isoformat(),
+                'tags': tags.get(post_id, []),
+            }, ensure_ascii=False) + '\n'
+            for post_id, title, url, datetime in chunk
+        )
+
+
+def export_posts_file(user):
+    """
+    Выгрузка постов пользователя во временный файл.
+    Файл до SAVED_POSTS_EXPORT_SPOOL_SIZE байт держится в памяти, больше - на диске.
+    :param user: пользователь
+    :return: кортеж (файл, открытый на чтение с начала, размер в байтах)
+    """
+    export_file = SpooledTemporaryFile(max_size=settings.SAVED_POSTS_EXPORT_SPOOL_SIZE)
+    try:
+        for chunk in export_posts(user):
+            export_file.write(chunk.encode('utf-8'))
+        size = export_file.tell()
+        export_file.seek(0)
+    except BaseException:
+        export_file.close()
+        raise
+    return export_file, size
+
+
+def text_field(item, name, max_length, required):
+    value = item.get(name, '')
+    if not isinstance(value, str):
+        raise PostFormatError('Поле {} должно быть строкой.'.format(name))
+    if required and not value:
+        raise PostFormatError('Не заполнено поле {}.'.format(name))
+    if len(value) > max_length:
+        raise PostFormatError('Поле {} длиннее {} символов.'.format(name, max_length))
+    return value
+
+
+def parse_post(text):
+    """
+    Разбор строки загружаемого файла.
+    :param text: строка NDJSON
+    :return: кортеж (title, url, datetime, список тегов)
+    :raise PostFormatError: если строка некорректна
+    """
+    try:
+        item = json.loads(text)
+    except ValueError:
+        raise PostFormatError('Строка не является JSON.')
+    if not isinstance(item, dict):
+        raise PostFormatError('Ожидается объект JSON.')
+    title = text_field(item, 'title', SavedPosts._meta.get_field('title').max_length, False)
+    url = text_field(item, 'url', SavedPosts._meta.get_field('url').max_length, True)
+
+    value = item.get('datetime')
+    if value is None:
+        datetime = timezone.now()
+    else:
+        try:
+            datetime = parse_datetime(value) if isinstance(value, str) else None
+        except ValueError:
+            datetime = None
+        if datetime is None:
+            raise PostFormatError('Поле datetime должно быть датой ISO 8601.')
+        if timezone.is_naive(datetime):
+            datetime = timezone.make_aware(datetime, timezone.utc)
+
+    tags = item.get('tags', [])
+    if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        raise PostFormatError('Поле tags должно быть списком строк.')
+    # Теги приводятся к виду, в котором их ищет фильтр: без '#', по одному слову
+    tags = parse_tags(','.join(tags))
+    tag_length = PostsTags._meta.get_field('tag').max_length
+    if any(len(tag) > tag_length for tag in tags):
+        raise PostFormatError('Тег длиннее {} символов.'.format(tag_length))
+    return title, url, datetime, tags
+
+
+def save_batch(user, batch):
+    """
+    Запись пачки постов и их тегов.
+    SQLite не возвращает ID из bulk_create, поэтому ID новых постов берутся
+    как последние ID постов пользователя: пока транзакция открыта,
+    другие записи в базу ждут.
+    :param user: пользователь
+    :param batch: список результатов parse_post
+    """
+    with transaction.atomic():
+        posts = SavedPosts.objects.bulk_create([
+            SavedPosts(user=user, title=title, url=url, datetime=datetime)
+            for title, url, datetime, tags in batch
+        ])
+        if any(post.pk is None for post in posts):
+            ids = SavedPosts.objects.filter(user=user).order_by('-id') \
+                .values_list('id', flat=True)[:len(posts)]
+            for post, post_id in zip(posts, reversed(list(ids))):
+                post.pk = post_id
+        PostsTags.objects.bulk_create([
+            PostsTags(post=post, tag=tag)
+            for post, (title, url, datetime, tags) in zip(posts, batch)
+            for tag in tags
+        ], batch_size=settings.SAVED_POSTS_IMPORT_BATCH_SIZE)
+        index_new_posts(posts, {
+            post.id: item[3] for post, item in zip(posts, batch)
+        })
+
+
+def import_posts(user, lines, batch_size=None):
+    """
+    Загрузка постов пользователя из NDJSON.
+    Некорректные строки пропускаются и попадают в отчёт.
+    :param user: пользователь
+    :param lines: итератор байтовых строк
+    :param batch_size: размер пачки, по умолчанию SAVED_POSTS_IMPORT_BATCH_SIZE
+    :return: словарь с числом загруженных постов, числом ошибок и первыми ошибками
+    """
+    batch_size = batch_size or settings.SAVED_POSTS_IMPORT_BATCH_SIZE
+    report = {'imported': 0, 'failed': 0, 'errors': []}
+    batch = []
+    for number, line in enumerate(lines, 1):
+        if number == 1 and line.startswith(b'\xef\xbb\xbf'):
+            line = line[3:]
+        try:
+            text = line.decode('utf-8')
+        except UnicodeDecodeError:
+            text = None
+        if text is not None and not text.strip():
+            continue
+        try:
+            if text is None:
+                raise PostFormatError('Строка не в кодировке UTF-8.')
+            batch.append(parse_post(text))
+        except PostFormatError as error:
+            report['failed'] += 1
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'].append({'line': number, 'error': str(error)})
+            continue
+        if len(batch) >= batch_size:
+            save_batch(user, batch)
+            report['imported'] += len(batch)
+            batch = []
+    if batch:
+        save_batch(user, batch)
+        report['imported'] += len(batch)
+    return report
@@ -0,0 +1,161 @@
+"""
+Обработчики сигналов моделей.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import models
+from .avatars import build_thumbnails
+from .caching import invalidate_user_context, bump_works_version
+from .user_search import SEARCH_FIELDS, index_user
+from .text_search import index_work, index_post, remove_document
+from .feeds import add_member, fan_out_post, remove_member
+
+
+def reindex_post(post_id):
+    """
+    Переиндексирует пост, если он ещё есть в базе.
+    :param post_id: ID поста
+    """
+    post = models.SavedPosts.objects.filter(id=post_id).first()
+    if post is not None:
+        index_post(post)
+
+
+@receiver(post_save, sender=models.UserAvatar)
+def make_avatar_thumbnails(sender, instance, **kwargs):
+    """
+    Создаёт уменьшенные копии загруженной аватарки.
+    Подключён раньше сброса кэша, чтобы контекст собирался уже с копиями.
+    :param sender: класс модели
+    :param instance: сохранённая аватарка
+    """
+    if instance.image:
+        build_thumbnails(instance.image)
+
+
+@receiver(post_save, sender=models.ThemeChanger)
+@receiver(post_delete, sender=models.ThemeChanger)
+@receiver(post_save, sender=models.UserAvatar)
+@receiver(post_delete, sender=models.UserAvatar)
+def reset_user_context(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш базового контекста при изменении темы или аватарки.
+    Кэш сбрасывается после фиксации транзакции: до неё параллельный запрос
+    прочитал бы старую запись и снова положил её в кэш.
+    :param sender: класс модели
+    :param instance: изменённый объект
+    """
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_user_context(user_id))
+
+
+@receiver(post_save, sender=User)
+def update_user_search_index(sender, instance, update_fields=None, **kwargs):
+    """
+    Обновляет поисковый индекс пользователя.
+    Сохранения без полей из SEARCH_FIELDS, например last_login при входе, пропускаются.
+    :param sender: класс модели
+    :param instance: сохранённый пользователь
+    :param update_fields: сохранённые поля или None
+    """
+    if update_fields is not None and not set(update_fields) & set(SEARCH_FIELDS):
+        return
+    index_user(instance)
+
+
+@receiver(post_save, sender=models.Work)
+@receiver(post_delete, sender=models.Work)
+def reset_works_pages(sender, instance, **kwargs):
+    """
+    Сбрасывает закэшированные страницы каталога при изменении работы.
+    Версия меняется после фиксации транзакции, иначе параллельный запрос
+    закэшировал бы старую страницу уже под новой версией.
+    :param sender: класс модели
+    :param instance: изменённая работа
+    """
+    transaction.on_commit(bump_works_version)
+
+
+@receiver(post_save, sender=models.Work)
+def update_work_search(sender, instance, **kwargs):
+    """
+    Обновляет работу в полнотекстовом индексе.
+    :param sender: класс модели
+    :param instance: сохранённая работа
+    """
+    index_work(instance)
+
+
+@receiver(post_save, sender=models.SavedPosts)
+def update_post_search(sender, instance, **kwargs):
+    """
+    Обновляет сохранённый пост в полнотекстовом индексе.
+    :param sender: класс модели
+    :param instance: сохранённый пост
+    """
+    index_post(instance)
+
+
+@receiver(post_save, sender=models.PostsTags)
+@receiver(post_delete, sender=models.PostsTags)
+def update_post_tags_search(sender, instance, **kwargs):
+    """
+    Переиндексирует пост при изменении его тегов.
+    Переиндексация откладывается до фиксации транзакции: Django удаляет
+    теги раньше поста, и к этому моменту удалённого поста уже нет в базе.
+    :param sender: класс модели
+    :param instance: изменённый тег
+    """
+    post_id = instance.post_id
+    transaction.on_commit(lambda: reindex_post(post_id))
+
+
+@receiver(post_delete, sender=models.Work)
+@receiver(post_delete, sender=models.SavedPosts)
+def remove_from_search(sender, instance, **kwargs):
+    """
+    Убирает удалённую работу или пост из полнотекстового индекса.
+    :param sender: класс модели
+    :param instance: удалённый объект
+    """
+    if sender is models.Work:
+        remove_document(models.SearchDocument.WORK, instance.id)
+    else:
+        remove_document(models.SearchDocument.POST, instance.id)
+
+
+@receiver(post_save, sender=models.PostsCanals)
+def publish_to_timelines(sender, instance, created, **kwargs):
+    """
+    Раскладывает новую публикацию по лентам участников канала.
+    :param sender: класс модели
+    :param instance: публикация
+    :param created: создана ли запись
+    """
+    if created:
+        fan_out_post(instance)
+
+
+@receiver(post_save, sender=models.UserCanals)
+def join_canal(sender, instance, created, **kwargs):
+    """
+    Учитывает нового участника канала и заполняет его ленту.
+    :param sender: класс модели
+    :param instance: участие в канале
+    :param created: создана ли запись
+    """
+    if created:
+        add_member(instance)
+
+
+@receiver(post_delete, sender=models.UserCanals)
+def leave_canal(sender, instance, **kwargs):
+    """
+    Учитывает выход из канала и убирает его посты из ленты.
+    :param sender: класс модели
+    :param instance: удалённое участие в канале
+    """
+    remove_member(instance)
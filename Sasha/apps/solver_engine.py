@@ -0,0 +1,543 @@
+"""
+Движок решения задач для страницы уравнений.
+Умеет системы линейных уравнений (метод Гаусса с выбором главного элемента),
+корни многочленов любой степени (собственные числа сопровождающей матрицы)
+и численное интегрирование (Симпсон и трапеции).
+Пачка задач решается сгруппированно: системы одного размера и многочлены
+одной степени обрабатываются одной операцией над массивами NumPy.
+Без NumPy те же задачи решаются на чистом Python.
+Объём вычислений задачи оценивает Problem.work(), по сумме оценок
+страница ограничивает работу одного запроса.
+"""
+import ast
+import cmath
+import math
+
+from django.conf import settings
+
+from .equation_cache import cached_solve_quadratics
+from .solvers import CoefficientsError, ANY_NUMBER, NO_ROOTS, make_result, parse_coefficients, \
+    to_coefficient
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+QUADRATIC = 'quadratic'
+LINEAR_SYSTEM = 'linear'
+POLYNOMIAL = 'polynomial'
+INTEGRAL = 'integral'
+
+PROBLEM_TYPES = [QUADRATIC, LINEAR_SYSTEM, POLYNOMIAL, INTEGRAL]
+
+# Вид решения многочлена, у которого есть корни
+ROOTS = 'roots'
+
+SIMPSON = 'simpson'
+TRAPEZOID = 'trapezoid'
+
+# Функции и константы, разрешённые в подынтегральном выражении
+FUNCTIONS = ['sin', 'cos', 'tan', 'exp', 'log', 'sqrt', 'abs', 'arcsin', 'arccos', 'arctan',
+             'sinh', 'cosh', 'tanh']
+CONSTANTS = {'pi': math.pi, 'e': math.e}
+MATH_FUNCTIONS = dict(
+    {name: getattr(math, name) for name in FUNCTIONS if hasattr(math, name)},
+    abs=abs, arcsin=math.asin, arccos=math.acos, arctan=math.atan,
+)
+MAX_EXPRESSION_LENGTH = 200
+
+# Итерации метода Дюрана-Кернера, если нет NumPy
+DURAND_KERNER_ITERATIONS = 500
+
+
+class ProblemError(ValueError):
+    """
+    Некорректное описание задачи.
+    """
+
+
+class Problem(object):
+    """
+    Разобранная задача.
+    Имеет поля:
+    1) тип задачи
+    2) данные задачи: коэффициенты, матрица и правая часть или функция и отрезок
+    """
+    def __init__(self, kind, data):
+        self.kind = kind
+        self.data = data
+
+    def work(self):
+        """
+        Оценка объёма вычислений: n³ для системы из n уравнений,
+        степень³ для многочлена, число точек для интеграла, 1 для квадратного уравнения.
+        """
+        if self.kind == LINEAR_SYSTEM:
+            return len(self.data[1]) ** 3
+        if self.kind == POLYNOMIAL:
+            return (len(self.data) - 1) ** 3
+        if self.kind == INTEGRAL:
+            return self.data[3] + 1
+        return 1
+
+
+def to_numbers(values, name):
+    """
+    Приводит список значений к float.
+    :param values: список
+    :param name: название поля для текста ошибки
+    :return: список чисел
+    """
+    if not isinstance(values, list) or not values:
+        raise ProblemError('Поле {} должно быть непустым списком чисел.'.format(name))
+    try:
+        return [to_coefficient(value) for value in values]
+    except CoefficientsError as error:
+        raise ProblemError('{}: {}'.format(name, error))
+
+
+def parse_linear_system(item):
+    """
+    Система задаётся матрицей "a" (n×n) и правой частью "b" (n).
+    :return: кортеж (матрица, правая часть)
+    """
+    matrix = item.get('a')
+    if not isinstance(matrix, list) or not matrix:
+        raise ProblemError('Поле a должно быть квадратной матрицей.')
+    size = len(matrix)
+    if size > settings.EQUATIONS_MAX_SIZE:
+        raise ProblemError('Не больше {} неизвестных.'.format(settings.EQUATIONS_MAX_SIZE))
+    matrix = [to_numbers(row, 'a') for row in matrix]
+    if any(len(row) != size for row in matrix):
+        raise ProblemError('Поле a должно быть квадратной матрицей.')
+    right = to_numbers(item.get('b'), 'b')
+    if len(right) != size:
+        raise ProblemError('Длина b должна совпадать с размером матрицы.')
+    return matrix, right
+
+
+def parse_polynomial(item):
+    """
+    Многочлен задаётся коэффициентами от старшей степени к свободному члену.
+    :return: список коэффициентов
+    """
+    coefficients = to_numbers(item.get('coefficients'), 'coefficients')
+    if len(coefficients) > settings.EQUATIONS_MAX_SIZE + 1:
+        raise ProblemError('Степень не больше {}.'.format(settings.EQUATIONS_MAX_SIZE))
+    return coefficients
+
+
+class Expression(object):
+    """
+    Функция одной переменной x из безопасного подмножества выражений Python:
+    числа, x, pi, e, + - * / **, вызовы функций из FUNCTIONS.
+    Может вычисляться над числами и над массивами NumPy.
+    """
+    def __init__(self, source):
+        if not isinstance(source, str) or not source.strip():
+            raise ProblemError('Поле function должно быть выражением от x.')
+        if len(source) > MAX_EXPRESSION_LENGTH:
+            raise ProblemError('Выражение длиннее {} символов.'.format(MAX_EXPRESSION_LENGTH))
+        try:
+            tree = ast.parse(source.replace('^', '**'), mode='eval')
+        except SyntaxError:
+            raise ProblemError('Не удалось разобрать выражение.')
+        self.source = source
+        self.tree = tree.body
+        self.check(self.tree)
+
+    def check(self, node):
+        """
+        Проверяет, что выражение состоит только из разрешённых элементов.
+        """
+        if isinstance(node, ast.BinOp) and isinstance(
+                node.op, (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow)):
+            self.check(node.left)
+            self.check(node.right)
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+            self.check(node.operand)
+        elif isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+                and not isinstance(node.value, bool):
+            pass
+        elif isinstance(node, ast.Name) and (node.id == 'x' or node.id in CONSTANTS):
+            pass
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) \
+                and node.func.id in FUNCTIONS and len(node.args) == 1 and not node.keywords:
+            self.check(node.args[0])
+        else:
+            raise ProblemError('Недопустимый элемент выражения: {}.'.format(
+                ast.get_source_segment(self.source.replace('^', '**'), node) or type(node).__name__
+            ))
+
+    def evaluate(self, node, x, functions):
+        if isinstance(node, ast.BinOp):
+            left = self.evaluate(node.left, x, functions)
+            right = self.evaluate(node.right, x, functions)
+            if isinstance(node.op, ast.Add):
+                return left + right
+            if isinstance(node.op, ast.Sub):
+                return left - right
+            if isinstance(node.op, ast.Mult):
+                return left * right
+            if isinstance(node.op, ast.Div):
+                return left / right
+            value = left ** right
+            # Python возводит отрицательное число в дробную степень в комплексное,
+            # дальше math-функции падают с TypeError, а abs его молча схлопывает
+            if isinstance(value, complex):
+                raise ProblemError('Отрицательное число нельзя возвести в дробную степень.')
+            return value
+        if isinstance(node, ast.UnaryOp):
+            operand = self.evaluate(node.operand, x, functions)
+            return -operand if isinstance(node.op, ast.USub) else operand
+        if isinstance(node, ast.Constant):
+            return float(node.value)
+        if isinstance(node, ast.Name):
+            return x if node.id == 'x' else CONSTANTS[node.id]
+        return functions[node.func.id](self.evaluate(node.args[0], x, functions))
+
+    def __call__(self, x):
+        """
+        Значение в точке x.
+        :raise ProblemError: функция не определена в точке
+        """
+        try:
+            value = self.evaluate(self.tree, x, MATH_FUNCTIONS)
+        except (ArithmeticError, ValueError):
+            raise ProblemError('Функция не определена в точке x = {}.'.format(x))
+        if isinstance(value, complex) or not math.isfinite(value):
+            raise ProblemError('Функция не определена в точке x = {}.'.format(x))
+        return value
+
+    def evaluate_array(self, points):
+        """
+        Значения во всех точках массива NumPy.
+        :raise ProblemError: функция не определена хотя бы в одной точке
+        """
+        with numpy.errstate(all='ignore'):
+            values = self.evaluate(self.tree, points, NUMPY_FUNCTIONS)
+        values = numpy.broadcast_to(numpy.asarray(values, dtype=numpy.float64), points.shape)
+        bad = ~numpy.isfinite(values)
+        if bad.any():
+            raise ProblemError('Функция не определена в точке x = {}.'.format(
+                points[bad.argmax()]
+            ))
+        return values
+
+
+NUMPY_FUNCTIONS = {name: getattr(numpy, name) for name in FUNCTIONS} if numpy is not None else {}
+
+
+def parse_integral(item):
+    """
+    Интеграл задаётся функцией "function", отрезком "a".."b",
+    числом шагов "n" и методом "method" (simpson или trapezoid).
+    :return: кортеж (функция, a, b, n, метод)
+    """
+    expression = Expression(item.get('function'))
+    try:
+        lower = to_coefficient(item.get('a'))
+        upper = to_coefficient(item.get('b'))
+    except CoefficientsError as error:
+        raise ProblemError('Границы: {}'.format(error))
+    steps = item.get('n', settings.EQUATIONS_INTEGRAL_STEPS)
+    if not isinstance(steps, int) or isinstance(steps, bool) \
+            or not 1 <= steps <= settings.EQUATIONS_INTEGRAL_MAX_STEPS:
+        raise ProblemError('n должно быть целым от 1 до {}.'.format(
+            settings.EQUATIONS_INTEGRAL_MAX_STEPS
+        ))
+    method = item.get('method', SIMPSON)
+    if method not in (SIMPSON, TRAPEZOID):
+        raise ProblemError('Метод интегрирования: simpson или trapezoid.')
+    if method == SIMPSON and steps % 2:
+        steps += 1
+    return expression, lower, upper, steps, method
+
+
+def parse_problem(item):
+    """
+    Разбирает одну задачу вида {"type": .., ...}.
+    Задача без типа считается квадратным уравнением.
+    :param item: описание задачи из JSON
+    :return: объект Problem
+    """
+    if not isinstance(item, (dict, list)):
+        raise ProblemError('Задача должна быть объектом JSON.')
+    kind = item.get('type', QUADRATIC) if isinstance(item, dict) else QUADRATIC
+    try:
+        if kind == QUADRATIC:
+            return Problem(kind, parse_coefficients(item))
+    except CoefficientsError as error:
+        raise ProblemError(str(error))
+    if kind == LINEAR_SYSTEM:
+        return Problem(kind, parse_linear_system(item))
+    if kind == POLYNOMIAL:
+        return Problem(kind, parse_polynomial(item))
+    if kind == INTEGRAL:
+        return Problem(kind, parse_integral(item))
+    raise ProblemError('Тип задачи: {}.'.format(', '.join(PROBLEM_TYPES)))
+
+
+def gauss_solve(matrix, right):
+    """
+    Решение одной системы методом Гаусса с выбором главного элемента по столбцу.
+    :param matrix: матрица n×n списком строк
+    :param right: правая часть
+    :return: список неизвестных или None, если матрица вырождена
+    """
+    size = len(matrix)
+    rows = [list(row) + [value] for row, value in zip(matrix, right)]
+    tolerance = max(abs(value) for row in matrix for value in row) * size * 2.0 ** -52
+    for column in range(size):
+        pivot_row = max(range(column, size), key=lambda index: abs(rows[index][column]))
+        rows[column], rows[pivot_row] = rows[pivot_row], rows[column]
+        pivot = rows[column][column]
+        if abs(pivot) <= tolerance:
+            return None
+        for index in range(column + 1, size):
+            factor = rows[index][column] / pivot
+            if factor:
+                row, top = rows[index], rows[column]
+                for position in range(column, size + 1):
+                    row[position] -= factor * top[position]
+    solution = [0.0] * size
+    for index in reversed(range(size)):
+        row = rows[index]
+        total = row[size] - sum(row[position] * solution[position]
+                                for position in range(index + 1, size))
+        solution[index] = total / row[index]
+    return solution
+
+
+def gauss_solve_numpy(matrices, rights):
+    """
+    Тот же метод Гаусса, но сразу для пачки систем одного размера.
+    :param matrices: массив k×n×n
+    :param rights: массив k×n
+    :return: кортеж (массив решений k×n, маска вырожденных систем)
+    """
+    count, size = rights.shape
+    augmented = numpy.concatenate([matrices, rights[:, :, None]], axis=2)
+    tolerance = numpy.abs(matrices).max(axis=(1, 2)) * size * numpy.finfo(numpy.float64).eps
+    singular = numpy.zeros(count, dtype=bool)
+    systems = numpy.arange(count)
+    for column in range(size):
+        pivot_rows = column + numpy.abs(augmented[:, column:, column]).argmax(axis=1)
+        top = augmented[systems, pivot_rows].copy()
+        augmented[systems, pivot_rows] = augmented[:, column]
+        augmented[:, column] = top
+        pivot = augmented[:, column, column]
+        singular |= numpy.abs(pivot) <= tolerance
+        pivot = numpy.where(singular, 1.0, pivot)
+        factors = augmented[:, column + 1:, column] / pivot[:, None]
+        augmented[:, column + 1:, column:] -= factors[:, :, None] * augmented[:, None, column, column:]
+    solutions = numpy.zeros((count, size))
+    for index in reversed(range(size)):
+        total = augmented[:, index, size] - (
+            augmented[:, index, index + 1:size] * solutions[:, index + 1:]
+        ).sum(axis=1)
+        diagonal = numpy.where(singular, 1.0, augmented[:, index, index])
+        solutions[:, index] = total / diagonal
+    return solutions, singular
+
+
+def clean_root(root):
+    """
+    Отбрасывает мнимую часть на уровне погрешности вычислений.
+    :return: кортеж (re, im)
+    """
+    if abs(root.imag) <= 1e-12 * max(1.0, abs(root.real)):
+        return root.real, 0.0
+    return root.real, root.imag
+
+
+def strip_polynomial(coefficients):
+    """
+    Убирает нулевые старшие коэффициенты и нулевые корни.
+    :return: кортеж (коэффициенты без нулевых корней, число нулевых корней)
+    или (None, 0), если многочлен тождественно равен нулю
+    """
+    start = next((index for index, value in enumerate(coefficients) if value != 0), None)
+    if start is None:
+        return None, 0
+    coefficients = coefficients[start:]
+    end = len(coefficients)
+    while coefficients[end - 1] == 0:
+        end -= 1
+    return coefficients[:end], len(coefficients) - end
+
+
+def durand_kerner(coefficients):
+    """
+    Корни многочлена методом Дюрана-Кернера.
+    :param coefficients: коэффициенты от старшей степени, старший ненулевой
+    :return: список комплексных корней
+    """
+    monic = [value / coefficients[0] for value in coefficients]
+    degree = len(monic) - 1
+    radius = 1 + max(abs(value) for value in monic[1:])
+    roots = [radius * cmath.exp(2j * math.pi * index / degree + 0.4j) for index in range(degree)]
+    for _ in range(DURAND_KERNER_ITERATIONS):
+        shift = 0.0
+        for index, root in enumerate(roots):
+            value = 0j
+            for coefficient in monic:
+                value = value * root + coefficient
+            denominator = 1 + 0j
+            for other_index, other in enumerate(roots):
+                if other_index != index:
+                    denominator *= root - other
+            if denominator == 0:
+                denominator = 1e-300
+            step = value / denominator
+            roots[index] = root - step
+            shift = max(shift, abs(step))
+        if shift <= 1e-15 * radius:
+            break
+    return roots
+
+
+def companion_roots_numpy(polynomials):
+    """
+    Корни пачки многочленов одной степени как собственные числа сопровождающих матриц.
+    :param polynomials: массив k×(d+1) коэффициентов, старшие ненулевые
+    :return: массив k×d комплексных корней
+    """
+    count, length = polynomials.shape
+    degree = length - 1
+    companions = numpy.zeros((count, degree, degree))
+    companions[:, 0, :] = -polynomials[:, 1:] / polynomials[:, :1]
+    if degree > 1:
+        companions[:, numpy.arange(1, degree), numpy.arange(degree - 1)] = 1.0
+    return numpy.linalg.eigvals(companions)
+
+
+def polynomial_result(roots, zero_roots):
+    """
+    Ответ для многочлена: корни с кратностью, упорядоченные как у квадратного уравнения.
+    У многочлена с действительными коэффициентами комплексные корни идут
+    сопряжёнными парами, поэтому пара собирается из корня с положительной мнимой частью.
+    """
+    roots = [clean_root(root) for root in roots]
+    upper = [(real, imag) for real, imag in roots if imag > 0]
+    if 2 * len(upper) == sum(1 for real, imag in roots if imag != 0):
+        roots = [root for root in roots if root[1] == 0] + \
+            [pair for real, imag in upper for pair in ((real, imag), (real, -imag))]
+    roots += [(0.0, 0.0)] * zero_roots
+    return make_result(ROOTS if roots else NO_ROOTS, roots)
+
+
+def solve_polynomials(problems):
+    """
+    Решение пачки многочленов, одинаковые степени - одной операцией NumPy.
+    :param problems: список списков коэффициентов
+    :return: список ответов
+    """
+    results = [None] * len(problems)
+    groups = {}
+    for index, coefficients in enumerate(problems):
+        stripped, zero_roots = strip_polynomial(coefficients)
+        if stripped is None:
+            results[index] = make_result(ANY_NUMBER, [])
+        elif len(stripped) == 1:
+            results[index] = polynomial_result([], zero_roots)
+        elif numpy is None:
+            results[index] = polynomial_result(durand_kerner(stripped), zero_roots)
+        else:
+            groups.setdefault(len(stripped), []).append((index, stripped, zero_roots))
+    for group in groups.values():
+        try:
+            roots = companion_roots_numpy(numpy.array([stripped for _, stripped, _ in group]))
+            roots = roots.tolist()
+        except numpy.linalg.LinAlgError:
+            roots = [durand_kerner(stripped) for _, stripped, _ in group]
+        for (index, _, zero_roots), polynomial_roots in zip(group, roots):
+            results[index] = polynomial_result(polynomial_roots, zero_roots)
+    return results
+
+
+def solve_linear_systems(problems):
+    """
+    Решение пачки систем, системы одного размера - одной операцией NumPy.
+    :param problems: список кортежей (матрица, правая часть)
+    :return: список ответов
+    """
+    results = [None] * len(problems)
+    if numpy is None:
+        solutions = [gauss_solve(matrix, right) for matrix, right in problems]
+        singular = [solution is None for solution in solutions]
+    else:
+        solutions = [None] * len(problems)
+        singular = [False] * len(problems)
+        groups = {}
+        for index, (matrix, right) in enumerate(problems):
+            groups.setdefault(len(right), []).append(index)
+        for indexes in groups.values():
+            group_solutions, group_singular = gauss_solve_numpy(
+                numpy.array([problems[index][0] for index in indexes], dtype=numpy.float64),
+                numpy.array([problems[index][1] for index in indexes], dtype=numpy.float64),
+            )
+            for index, solution, is_singular in zip(
+                    indexes, group_solutions.tolist(), group_singular.tolist()):
+                solutions[index] = solution
+                singular[index] = is_singular
+    for index, (solution, is_singular) in enumerate(zip(solutions, singular)):
+        if is_singular or not all(math.isfinite(value) for value in solution):
+            results[index] = {'error': 'Матрица системы вырождена.'}
+        else:
+            results[index] = {'solution': [value + 0.0 for value in solution]}
+    return results
+
+
+def integrate(expression, lower, upper, steps, method):
+    """
+    Численный интеграл по формуле Симпсона или трапеций.
+    :return: ответ с значением интеграла или ошибкой
+    """
+    width = (upper - lower) / steps
+    try:
+        if numpy is not None:
+            values = expression.evaluate_array(numpy.linspace(lower, upper, steps + 1))
+            ends = values[0] + values[-1]
+            odd = values[1:-1:2].sum()
+            even = values[2:-1:2].sum()
+            inner = values[1:-1].sum()
+        else:
+            values = [expression(lower + width * index) for index in range(steps)]
+            values.append(expression(upper))
+            ends = values[0] + values[-1]
+            odd = math.fsum(values[1:-1:2])
+            even = math.fsum(values[2:-1:2])
+            inner = math.fsum(values[1:-1])
+    except ProblemError as error:
+        return {'error': str(error)}
+    if method == SIMPSON:
+        value = width / 3 * (ends + 4 * odd + 2 * even)
+    else:
+        value = width * (ends / 2 + inner)
+    return {'method': method, 'steps': steps, 'value': float(value) + 0.0}
+
+
+def solve_problems(problems):
+    """
+    Решает пачку разобранных задач любых типов.
+    :param problems: список объектов Problem
+    :return: список ответов с полем type в том же порядке
+    """
+    results = [None] * len(problems)
+    by_kind = {}
+    for index, problem in enumerate(problems):
+        by_kind.setdefault(problem.kind, []).append(index)
+    solvers = {
+        QUADRATIC: cached_solve_quadratics,
+        LINEAR_SYSTEM: solve_linear_systems,
+        POLYNOMIAL: solve_polynomials,
+        INTEGRAL: lambda items: [integrate(*item) for item in items],
+    }
+    for kind, indexes in by_kind.items():
+        solved = solvers[kind]([problems[index].data for index in indexes])
+        for index, result in zip(indexes, solved):
+            results[index] = dict(result, type=kind)
+    return results
@@ -0,0 +1,221 @@
+"""
+Решение квадратных уравнений ax² + bx + c = 0.
+Одно уравнение решается на чистом Python, большие пачки - векторно через NumPy,
+если он установлен. Оба пути дают одинаковый результат.
+"""
+import math
+
+from django.conf import settings
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Виды решений
+TWO_REAL = 'two_real'
+DOUBLE = 'double'
+COMPLEX = 'complex'
+LINEAR = 'linear'
+NO_ROOTS = 'none'
+ANY_NUMBER = 'any'
+
+KIND_CODES = [TWO_REAL, DOUBLE, COMPLEX, LINEAR, NO_ROOTS, ANY_NUMBER]
+
+
+class CoefficientsError(ValueError):
+    """
+    Некорректные коэффициенты уравнения.
+    """
+
+
+def to_coefficient(value):
+    """
+    Приводит коэффициент к float.
+    Принимает числа и строки с числами, True/False, NaN и бесконечность не принимает.
+    :param value: значение коэффициента
+    :return: коэффициент
+    """
+    if isinstance(value, bool):
+        raise CoefficientsError('Коэффициент должен быть числом.')
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise CoefficientsError('Коэффициент должен быть числом.')
+    if not math.isfinite(number):
+        raise CoefficientsError('Коэффициент должен быть конечным числом.')
+    return number
+
+
+def parse_coefficients(item):
+    """
+    Разбирает одно уравнение: [a, b, c] или {"a": .., "b": .., "c": ..}.
+    :param item: описание уравнения
+    :return: кортеж (a, b, c)
+    """
+    if isinstance(item, dict):
+        try:
+            values = [item[name] for name in ('a', 'b', 'c')]
+        except KeyError:
+            raise CoefficientsError('Нужны коэффициенты a, b и c.')
+    elif isinstance(item, (list, tuple)) and len(item) == 3:
+        values = item
+    else:
+        raise CoefficientsError('Уравнение задаётся как [a, b, c] или {"a", "b", "c"}.')
+    return tuple(to_coefficient(value) for value in values)
+
+
+def scale_coefficients(a, b, c):
+    """
+    Делит коэффициенты на степень двойки около наибольшего по модулю.
+    Корни от этого не меняются, деление на степень двойки точное,
+    а b² и 4ac больше не переполняются.
+    :return: кортеж (a, b, c) или None, если все коэффициенты нулевые
+    """
+    scale = max(abs(a), abs(b), abs(c))
+    if scale == 0:
+        return None
+    exponent = math.frexp(scale)[1]
+    return math.ldexp(a, -exponent), math.ldexp(b, -exponent), math.ldexp(c, -exponent)
+
+
+def classify(a, b, c):
+    """
+    Решает одно уравнение с уже нормированными коэффициентами.
+    При c = 0 корни 0 и -b/a считаются без дискриминанта, иначе b² может уйти в ноль.
+    Для двух действительных корней используется устойчивая формула
+    q = -(b + sign(b)·√D) / 2, x₁ = q / a, x₂ = c / q.
+    :return: кортеж (вид решения, список корней (re, im))
+    """
+    if a == 0:
+        if b == 0:
+            return NO_ROOTS, []
+        return LINEAR, [(-c / b, 0.0)]
+    if c == 0 and b != 0:
+        return TWO_REAL, [(0.0, 0.0), (-b / a, 0.0)]
+    discriminant = b * b - 4 * a * c
+    if discriminant > 0:
+        q = -0.5 * (b + math.copysign(math.sqrt(discriminant), b))
+        return TWO_REAL, [(q / a, 0.0), (c / q, 0.0)]
+    if discriminant == 0:
+        return DOUBLE, [(-b / (2 * a), 0.0)]
+    real = -b / (2 * a)
+    imag = math.sqrt(-discriminant) / (2 * abs(a))
+    return COMPLEX, [(real, imag), (real, -imag)]
+
+
+def json_number(value):
+    """
+    Переводит float в значение для JSON: без -0.0, бесконечность как null.
+    """
+    if not math.isfinite(value):
+        return None
+    return value + 0.0
+
+
+def make_result(kind, roots):
+    """
+    Собирает ответ для одного уравнения.
+    Корни упорядочены по действительной части, комплексные - сначала с +i.
+    :param kind: вид решения
+    :param roots: список корней (re, im)
+    :return: словарь {"kind": .., "roots": [{"real": .., "imag": ..}]}
+    """
+    return {
+        'kind': kind,
+        'roots': [
+            {'real': json_number(real), 'imag': json_number(imag)}
+            for real, imag in sorted(roots, key=lambda root: (root[0], -root[1]))
+        ],
+    }
+
+
+def solve_quadratic(a, b, c):
+    """
+    Решает уравнение ax² + bx + c = 0.
+    :return: словарь с видом решения и корнями
+    """
+    scaled = scale_coefficients(a, b, c)
+    if scaled is None:
+        return make_result(ANY_NUMBER, [])
+    return make_result(*classify(*scaled))
+
+
+def solve_quadratics_numpy(coefficients):
+    """
+    Векторное решение пачки уравнений.
+    Повторяет scale_coefficients, classify и make_result по шагам, но над массивами,
+    в цикле на Python остаётся только сборка словарей.
+    :param coefficients: список кортежей (a, b, c)
+    :return: список словарей с решениями
+    """
+    matrix = numpy.array(coefficients, dtype=numpy.float64).reshape(-1, 3)
+    scale = numpy.abs(matrix).max(axis=1)
+    all_zero = scale == 0
+    exponent = numpy.frexp(scale)[1]
+    a, b, c = numpy.ldexp(matrix, -exponent[:, None]).T
+
+    with numpy.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        discriminant = b * b - 4 * a * c
+        root = numpy.sqrt(numpy.abs(discriminant))
+        q = -0.5 * (b + numpy.copysign(root, b))
+        first = q / a
+        second = c / q
+        vertex = -b / (2 * a)
+        imag = root / (2 * numpy.abs(a))
+        linear = -c / b
+        factored = (c == 0) & (b != 0)
+        first = numpy.where(factored, 0.0, first)
+        second = numpy.where(factored, -b / a, second)
+
+    kinds = numpy.select(
+        [all_zero, (a == 0) & (b == 0), a == 0, factored | (discriminant > 0), discriminant == 0],
+        [KIND_CODES.index(ANY_NUMBER), KIND_CODES.index(NO_ROOTS), KIND_CODES.index(LINEAR),
+         KIND_CODES.index(TWO_REAL), KIND_CODES.index(DOUBLE)],
+        KIND_CODES.index(COMPLEX),
+    )
+    two_real = kinds == KIND_CODES.index(TWO_REAL)
+    is_complex = kinds == KIND_CODES.index(COMPLEX)
+    lower_real = numpy.select(
+        [two_real, is_complex, kinds == KIND_CODES.index(LINEAR)],
+        [numpy.minimum(first, second), vertex, linear],
+        vertex,
+    ) + 0.0
+    upper_real = numpy.where(two_real, numpy.maximum(first, second), vertex) + 0.0
+    upper_imag = numpy.where(is_complex, imag, 0.0) + 0.0
+    lower_imag = -upper_imag + 0.0
+    one_root = (kinds == KIND_CODES.index(DOUBLE)) | (kinds == KIND_CODES.index(LINEAR))
+    root_counts = numpy.select([two_real | is_complex, one_root], [2, 1], 0)
+    finite = (
+        numpy.isfinite(lower_real) & numpy.isfinite(upper_real) & numpy.isfinite(upper_imag)
+    ) | (root_counts == 0)
+
+    results = []
+    columns = zip(kinds.tolist(), root_counts.tolist(), finite.tolist(), lower_real.tolist(),
+                  upper_imag.tolist(), upper_real.tolist(), lower_imag.tolist())
+    for code, count, is_finite, real_1, imag_1, real_2, imag_2 in columns:
+        if not is_finite:
+            roots = [(real_1, imag_1), (real_2, imag_2)][:count]
+            results.append(make_result(KIND_CODES[code], roots))
+        elif count == 2:
+            results.append({'kind': KIND_CODES[code], 'roots': [
+                {'real': real_1, 'imag': imag_1}, {'real': real_2, 'imag': imag_2}
+            ]})
+        elif count == 1:
+            results.append({'kind': KIND_CODES[code], 'roots': [{'real': real_1, 'imag': imag_1}]})
+        else:
+            results.append({'kind': KIND_CODES[code], 'roots': []})
+    return results
+
+
+def solve_quadratics(coefficients):
+    """
+    Решает пачку уравнений.
+    Начиная с EQUATIONS_VECTORIZE_THRESHOLD уравнений используется NumPy, если он есть.
+    :param coefficients: список кортежей (a, b, c)
+    :return: список словарей с решениями в том же порядке
+    """
+    if numpy is not None and len(coefficients) >= settings.EQUATIONS_VECTORIZE_THRESHOLD:
+        return solve_quadratics_numpy(coefficients)
+    return [solve_quadratic(*item) for item in coefficients]
@@ -0,0 +1,118 @@
+"""
+Бэкенд SQLite с настройками для работы под нагрузкой.
+При открытии соединения включаются WAL и PRAGMA из ключа PRAGMAS
+настроек базы, транзакции пишущего соединения начинаются с BEGIN IMMEDIATE,
+а соединение с READ_ONLY: True открывается с query_only = ON.
+"""
+import logging
+import threading
+
+from django.db.backends.sqlite3 import base
+
+
+logger = logging.getLogger(__name__)
+
+# Значения по умолчанию, ключ PRAGMAS в DATABASES их дополняет или заменяет
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+_writer_locks = dict()
+_writer_locks_lock = threading.Lock()
+
+
+def get_writer_lock(name):
+    """
+    Блокировка записи в файл базы для потоков процесса.
+    :param name: путь к файлу базы
+    :return: объект threading.Lock
+    """
+    with _writer_locks_lock:
+        return _writer_locks.setdefault(str(name), threading.Lock())
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Соединение SQLite с PRAGMA из настроек.
+    В режиме WAL читатели не блокируют писателя и друг друга, а писатели
+    сразу берут блокировку записи (BEGIN IMMEDIATE) вместо ошибки
+    "database is locked" при попытке поднять блокировку чтения.
+    Транзакции потоков одного процесса к тому же файлу выстраиваются
+    в очередь на threading.Lock: SQLite при ожидании блокировки
+    опрашивает её с растущими паузами, и под нагрузкой часть писателей
+    не успевала дождаться её за busy_timeout.
+    """
+    holds_writer_lock = False
+
+    @property
+    def read_only(self):
+        return bool(self.settings_dict.get('READ_ONLY'))
+
+    def get_pragmas(self):
+        """
+        PRAGMA для нового соединения.
+        :return: список пар (имя, значение)
+        """
+        pragmas = dict(DEFAULT_PRAGMAS, **self.settings_dict.get('PRAGMAS', {}))
+        if self.read_only:
+            pragmas.pop('journal_mode', None)
+            pragmas['query_only'] = 'ON'
+        return list(pragmas.items())
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.get_pragmas():
+            conn.execute('PRAGMA {} = {}'.format(name, value))
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        """
+        Начало транзакции в режиме autocommit.
+        Пишущее соединение сначала ждёт очереди в процессе не дольше busy_timeout,
+        затем берёт блокировку записи в базе (BEGIN IMMEDIATE).
+        Если очереди дождаться не удалось, транзакция всё равно начинается
+        без неё: BEGIN IMMEDIATE сам ждёт блокировку ещё busy_timeout,
+        а случай пишется в журнал как признак перегрузки записи.
+        """
+        if self.read_only:
+            self.cursor().execute('BEGIN')
+            return
+        timeout = dict(self.get_pragmas()).get('busy_timeout', 0) / 1000
+        lock = get_writer_lock(self.settings_dict['NAME'])
+        self.holds_writer_lock = lock.acquire(timeout=timeout)
+        if not self.holds_writer_lock:
+            logger.warning('Очередь записи в %s не подошла за %s с, транзакция начинается без неё',
+                           self.settings_dict['NAME'], timeout)
+        try:
+            self.cursor().execute('BEGIN IMMEDIATE')
+        except Exception:
+            self.release_writer_lock()
+            raise
+
+    def release_writer_lock(self):
+        if self.holds_writer_lock:
+            self.holds_writer_lock = False
+            get_writer_lock(self.settings_dict['NAME']).release()
+
+    def _commit(self):
+        try:
+            return super()._commit()
+        finally:
+            self.release_writer_lock()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self.release_writer_lock()
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self.release_writer_lock()
@@ -1,50 +1,126 @@
+// Решение квадратного уравнения на сервере через equations/solve/
+function formatRoot(root)
+{
+if (root.real === null || root.imag === null)
+{
+return "Слишком большое число";
+}
+if (root.imag == 0)
+{
+return String(root.real);
+}
+return root.real + (root.imag > 0 ? " + " : " - ") + Math.abs(root.imag) + "i";
+}
+
 function kvadrt()
 {
-d=document
-var a = Number(d.form1.num1.value)//для поля ввода a
-var b = Number(d.form1.num2.value)//для поля ввода b
-var c = Number(d.form1.num3.value)//для поля ввода c
-var diz = eval(Math.pow(b,2)-4*a*c)//расчёт дискримина́нта
-var e = eval((-b+Math.sqrt(diz))/(2*a))// расчёт если дискр. > 0 для х1
-var e1 = eval((-b-Math.sqrt(diz))/(2*a))//расчёт если дискр. > 0 для х2
-var e2 = eval(- c/b)//расчёт если a=0, b и c !=0
-var e3 = eval(-b/2*a)//расчёт если дискр.=0
-var x1 = Number(d.form1.x1.value)//для поля вывода х1
-var x2 = Number(d.form1.x2.value)//для поля вывода х2
-if(a==0 && b==0 && c==0)
+var d = document;
+var query = new URLSearchParams({
+a: d.form1.num1.value || "0",//для поля ввода a
+b: d.form1.num2.value || "0",//для поля ввода b
+c: d.form1.num3.value || "0"//для поля ввода c
+});
+fetch("/equations/solve/?" + query.toString())
+.then(function (response) { return response.json(); })
+.then(function (result)
+{
+var x1 = " ";//для поля вывода х1
+var x2 = " ";//для поля вывода х2
+if (result.error)
+{
+x1 = result.error;
+}
+else if (result.kind == "any")
 {
 x1 = "Любое число";
 x2 = "Любое число";
 }
-else
-if(a==0 && b==0 && c!=0)
+else if (result.kind == "none")
 {
 x1 = "Решения нет";
 x2 = "Решения нет";
 }
 else
-if(a==0 && b!=0 && c!=0)
 {
-x1 =eval(e2);
-x2 =" ";
+x1 = formatRoot(result.roots[0]);
+if (result.roots.length > 1)
+{
+x2 = formatRoot(result.roots[1]);
 }
-else
-if(a!=0 && diz>0)
+}
+d.form1.x1.value = x1;
+d.form1.x2.value = x2;
+});
+}
+
+// Остальные задачи решаются через equations/problems/
+function splitNumbers(text)
 {
-x1=eval(e);
-x2=eval(e1);
+return text.trim().split(/\s+/).filter(function (value) { return value.length > 0; }).map(Number);
 }
-else
-if(a!=0 && diz==0)
+
+function showProblemFields()
 {
-x1=eval(e3);
-x2=" ";
+var type = document.form2.type.value;
+["linear", "polynomial", "integral"].forEach(function (name)
+{
+document.getElementById("problem-" + name).style.display = name == type ? "" : "none";
+});
 }
-else
+
+function readProblem()
 {
-x1 = "Решения нет";
-x2 = "Решения нет";
+var form = document.form2;
+var type = form.type.value;
+if (type == "linear")
+{
+var rows = form.system.value.trim().split("\n").map(splitNumbers);
+return {
+type: type,
+a: rows.map(function (row) { return row.slice(0, -1); }),
+b: rows.map(function (row) { return row[row.length - 1]; })
+};
+}
+if (type == "polynomial")
+{
+return {type: type, coefficients: splitNumbers(form.coefficients.value)};
+}
+var bound = function (value) { return value.trim() == "pi" ? Math.PI : Number(value); };
+return {type: type, function: form.function.value, a: bound(form.lower.value), b: bound(form.upper.value)};
+}
+
+function formatAnswer(result)
+{
+if (result.error)
+{
+return result.error;
+}
+if (result.type == "linear")
+{
+return result.solution.map(function (value, index) { return "x" + (index + 1) + " = " + value; }).join("\n");
+}
+if (result.type == "integral")
+{
+return "≈ " + result.value;
+}
+if (result.kind == "any")
+{
+return "Любое число";
+}
+if (result.kind == "none")
+{
+return "Решения нет";
+}
+return result.roots.map(formatRoot).join("\n");
+}
+
+function solveProblem()
+{
+fetch("/equations/problems/", {
+method: "POST",
+headers: {"Content-Type": "application/json"},
+body: JSON.stringify(readProblem())
+})
+.then(function (response) { return response.json(); })
+.then(function (result) { document.form2.answer.value = formatAnswer(result); });
 }
-d.form1.x1.value=x1;
-d.form1.x2.value=x2;
-}
\ No newline at end of file
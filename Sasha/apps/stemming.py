@@ -0,0 +1,240 @@
+"""
+Разбиение текста на слова и стемминг для полнотекстового поиска.
+Русские слова обрабатываются алгоритмом Портера (Snowball) для русского языка,
+английские - упрощённым стеммером Портера. Стоп-слова отбрасываются.
+"""
+import re
+
+
+TOKEN_RE = re.compile(r'[0-9a-zа-я]+')
+CYRILLIC_RE = re.compile(r'[а-я]')
+MAX_TOKEN_LENGTH = 64
+
+STOP_WORDS = frozenset('''
+и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по
+только ее мне было вот от меня еще нет о из ему теперь когда даже ну ли если уже
+или ни быть был него до вас нибудь опять уж вам ведь там потом себя ничего ей
+может они тут где есть надо ней для мы тебя их чем была сам чтоб без будто чего
+раз тоже себе под будет ж тогда кто этот того потому этого какой совсем ним
+здесь этом один почти мой тем чтобы нее были куда зачем всех никогда можно при
+наконец два об другой хоть после над больше тот через эти нас про всего них
+какая много разве три эту моя впрочем хорошо свою этой перед иногда лучше чуть
+том нельзя такой им более всегда конечно всю между
+a an and are as at be but by for if in into is it no not of on or such that the
+their then there these they this to was will with from has have had were been
+'''.split())
+
+RU_VOWELS = 'аеиоуыэюя'
+
+RU_PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+RU_ADJECTIVE = (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом',
+    'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+)
+RU_PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+RU_REFLEXIVE = ('ся', 'сь')
+RU_VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны', 'ть',
+     'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл', 'им',
+     'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть',
+     'ишь', 'ую', 'ю'),
+)
+RU_NOUN = (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией', 'ей',
+    'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы',
+    'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я',
+)
+RU_SUPERLATIVE = ('ейше', 'ейш')
+RU_DERIVATIONAL = ('ость', 'ост')
+
+EN_VOWELS = 'aeiouy'
+EN_SUFFIXES = (
+    ('ational', 'ate'), ('tional', 'tion'), ('ization', 'ize'), ('fulness', 'ful'),
+    ('ousness', 'ous'), ('iveness', 'ive'), ('biliti', 'ble'), ('ement', ''), ('ment', ''),
+    ('ness', ''), ('able', ''), ('ible', ''), ('ance', ''), ('ence', ''), ('ator', 'ate'),
+    ('alism', 'al'), ('aliti', 'al'), ('iviti', 'ive'), ('ful', ''), ('ous', ''),
+    ('ive', ''), ('ize', ''), ('ism', ''), ('ist', ''), ('ant', ''), ('ent', ''), ('al', ''),
+    ('er', ''), ('ic', ''),
+)
+
+
+def longest_suffix(word, suffixes, start=0):
+    """
+    Самое длинное окончание из списка, целиком лежащее в word[start:].
+    :return: окончание или None
+    """
+    region = word[start:]
+    found = None
+    for suffix in suffixes:
+        if region.endswith(suffix) and (found is None or len(suffix) > len(found)):
+            found = suffix
+    return found
+
+
+def remove_grouped(word, groups, start):
+    """
+    Удаляет окончание из пары групп Snowball: окончания первой группы
+    должны идти после "а" или "я", второй - после чего угодно.
+    :return: слово без окончания или None, если окончание не найдено
+    """
+    best = None
+    first = longest_suffix(word, groups[0], start)
+    if first and len(word) - len(first) - 1 >= start and word[-len(first) - 1] in 'ая':
+        best = first
+    second = longest_suffix(word, groups[1], start)
+    if second and (best is None or len(second) > len(best)):
+        best = second
+    if best is None:
+        return None
+    return word[:-len(best)]
+
+
+def russian_regions(word):
+    """
+    Области RV и R2 алгоритма Snowball.
+    :return: кортеж (начало RV, начало R2)
+    """
+    rv = next((index + 1 for index, letter in enumerate(word) if letter in RU_VOWELS), len(word))
+    r1 = len(word)
+    for index in range(1, len(word)):
+        if word[index] not in RU_VOWELS and word[index - 1] in RU_VOWELS:
+            r1 = index + 1
+            break
+    r2 = len(word)
+    for index in range(r1 + 1, len(word)):
+        if word[index] not in RU_VOWELS and word[index - 1] in RU_VOWELS:
+            r2 = index + 1
+            break
+    return rv, r2
+
+
+def stem_russian(word):
+    """
+    Стемминг русского слова по алгоритму Snowball.
+    :param word: слово в нижнем регистре, ё заменена на е
+    :return: основа слова
+    """
+    rv, r2 = russian_regions(word)
+
+    stripped = remove_grouped(word, RU_PERFECTIVE_GERUND, rv)
+    if stripped is not None:
+        word = stripped
+    else:
+        reflexive = longest_suffix(word, RU_REFLEXIVE, rv)
+        if reflexive:
+            word = word[:-len(reflexive)]
+        adjective = longest_suffix(word, RU_ADJECTIVE, rv)
+        if adjective:
+            word = word[:-len(adjective)]
+            stripped = remove_grouped(word, RU_PARTICIPLE, rv)
+            if stripped is not None:
+                word = stripped
+        else:
+            stripped = remove_grouped(word, RU_VERB, rv)
+            if stripped is not None:
+                word = stripped
+            else:
+                noun = longest_suffix(word, RU_NOUN, rv)
+                if noun:
+                    word = word[:-len(noun)]
+
+    if word[rv:].endswith('и'):
+        word = word[:-1]
+
+    derivational = longest_suffix(word, RU_DERIVATIONAL, r2)
+    if derivational:
+        word = word[:-len(derivational)]
+
+    superlative = longest_suffix(word, RU_SUPERLATIVE, rv)
+    if superlative:
+        word = word[:-len(superlative)]
+        if word[rv:].endswith('нн'):
+            word = word[:-1]
+    elif word[rv:].endswith('нн'):
+        word = word[:-1]
+    elif word[rv:].endswith('ь'):
+        word = word[:-1]
+    return word
+
+
+def has_vowel(word):
+    return any(letter in EN_VOWELS for letter in word)
+
+
+def stem_english(word):
+    """
+    Упрощённый стеммер Портера: множественное число, -ed/-ing
+    и частые словообразовательные суффиксы.
+    :param word: слово в нижнем регистре
+    :return: основа слова
+    """
+    if len(word) <= 3:
+        return word
+    if word.endswith('sses'):
+        word = word[:-2]
+    elif word.endswith('ies'):
+        word = word[:-2]
+    elif word.endswith('s') and not word.endswith('ss') and not word.endswith('us'):
+        word = word[:-1]
+
+    for ending in ('eed', 'ed', 'ing'):
+        if word.endswith(ending) and has_vowel(word[:-len(ending)]):
+            if ending == 'eed':
+                word = word[:-1]
+                break
+            word = word[:-len(ending)]
+            if word.endswith(('at', 'bl', 'iz')):
+                word += 'e'
+            elif len(word) > 2 and word[-1] == word[-2] and word[-1] not in 'lsz':
+                word = word[:-1]
+            break
+
+    if word.endswith('y') and has_vowel(word[:-1]):
+        word = word[:-1] + 'i'
+    if word.endswith('li') and len(word) > 4:
+        word = word[:-2]
+
+    for suffix, replacement in EN_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3 and has_vowel(word[:-len(suffix)]):
+            word = word[:-len(suffix)] + replacement
+            break
+    if word.endswith('e') and len(word) > 4:
+        word = word[:-1]
+    return word
+
+
+def stem(word):
+    """
+    Основа слова: русский стеммер для кириллицы, английский для латиницы,
+    числа и смешанные слова не меняются.
+    :param word: слово в нижнем регистре
+    :return: основа слова
+    """
+    if word.isdigit():
+        return word
+    if CYRILLIC_RE.search(word):
+        if word.isalpha() and not any('a' <= letter <= 'z' for letter in word):
+            return stem_russian(word)
+        return word
+    return stem_english(word)
+
+
+def tokenize(text):
+    """
+    Слова текста в нижнем регистре, без стоп-слов, приведённые к основе.
+    :param text: строка
+    :return: список основ в порядке следования в тексте
+    """
+    text = text.lower().replace('ё', 'е')
+    return [
+        stem(token)[:MAX_TOKEN_LENGTH]
+        for token in TOKEN_RE.findall(text)
+        if token not in STOP_WORDS
+    ]
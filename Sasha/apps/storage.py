@@ -0,0 +1,118 @@
+"""
+Хранилище файлов с адресацией по содержимому.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+from .uploads import IMAGE_EXTENSIONS, SIGNATURE_LENGTH, sniff_image_format
+
+
+# Имя вида avatars/ab/ab...(64 символа).png и производные от него
+CONTENT_ADDRESSED_RE = re.compile(r'(^|/)([0-9a-f]{2})/\2[0-9a-f]{62}(\.|$)')
+
+TEMP_PREFIX = 'tmp-'
+
+
+def is_content_addressed(name):
+    """
+    Проверка, что имя файла получено из хэша содержимого.
+    Такой файл никогда не меняется.
+    :param name: имя файла в хранилище
+    :return: True или False
+    """
+    return CONTENT_ADDRESSED_RE.search(name) is not None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файловое хранилище, в котором имя файла - SHA-256 его содержимого.
+    Одинаковые файлы хранятся один раз, а по одному имени всегда отдаётся
+    одно и то же содержимое, поэтому ссылки можно кэшировать бессрочно.
+    При удалении записей файлы остаются, их убирает команда gc_avatars.
+    """
+    def content_name(self, name, content):
+        """
+        Имя файла по его содержимому.
+        Папка берётся из исходного имени, а расширение - по формату,
+        определённому по сигнатуре: файл с именем evil.html не станет
+        страницей на домене сайта.
+        :param name: исходное имя, например avatars/photo.png
+        :param content: объект File
+        :return: имя вида avatars/ab/abcdef....png
+        :raise ValueError: если содержимое не PNG и не JPEG
+        """
+        content_hash = hashlib.sha256()
+        header = b''
+        for chunk in content.chunks():
+            if len(header) < SIGNATURE_LENGTH:
+                header += chunk[:SIGNATURE_LENGTH - len(header)]
+            content_hash.update(chunk)
+        image_format = sniff_image_format(header)
+        if image_format is None:
+            raise ValueError('Содержимое файла не является изображением PNG или JPEG.')
+        digest = content_hash.hexdigest()
+        extension = IMAGE_EXTENSIONS[image_format]
+        return posixpath.join(posixpath.dirname(name), digest[:2], digest + extension)
+
+    def _save_as(self, name, content):
+        """
+        Атомарная запись файла под заданным именем.
+        Файл пишется во временный и переименовывается, поэтому
+        параллельная запись того же содержимого безопасна.
+        :param name: итоговое имя
+        :param content: объект File
+        :return: итоговое имя
+        """
+        directory, filename = posixpath.split(name)
+        temp_name = posixpath.join(directory, TEMP_PREFIX + uuid.uuid4().hex + '-' + filename)
+        temp_name = super()._save(temp_name, content)
+        os.replace(self.path(temp_name), self.path(name))
+        return name
+
+    def _save(self, name, content):
+        """
+        Сохранение файла под именем из хэша содержимого.
+        Если такой файл уже есть, у него только обновляется время изменения:
+        gc_avatars не трогает недавно изменённые файлы, и повторно
+        загруженный старый файл не будет удалён, пока запись в БД не сохранена.
+        """
+        name = self.content_name(name, content)
+        if self.exists(name):
+            try:
+                os.utime(self.path(name))
+            except FileNotFoundError:
+                return self._save_as(name, content)
+            return name
+        return self._save_as(name, content)
+
+    def save_derivative(self, name, content):
+        """
+        Сохранение файла, производного от уже сохранённого, под точным именем.
+        Например, уменьшенной копии изображения.
+        :param name: имя файла
+        :param content: объект File
+        :return: имя файла
+        """
+        return self._save_as(name, content)
+
+    def walk(self, path=''):
+        """
+        Обход всех файлов в папке и вложенных папках.
+        :param path: папка в хранилище
+        :return: генератор имён файлов
+        """
+        directories, files = self.listdir(path)
+        for filename in files:
+            yield posixpath.join(path, filename)
+        for directory in directories:
+            yield from self.walk(posixpath.join(path, directory))
+
+
+avatar_storage = ContentAddressedStorage()
@@ -0,0 +1,21 @@
+"""
+Теги шаблонов для подключения тем.
+"""
+from django import template
+from django.templatetags.static import static
+
+from ..theme_bundles import bundle_path
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def theme_stylesheet(theme, bg_theme):
+    """
+    Ссылка на собранный CSS-файл темы.
+    :param theme: объект темы
+    :param bg_theme: ключ темы фона
+    :return: URL CSS-файла
+    """
+    return static(bundle_path(theme.key, bg_theme))
@@ -0,0 +1,51 @@
+import random
+
+from django.test import SimpleTestCase, override_settings
+
+from .equation_cache import cached_solve_quadratic, cached_solve_quadratics, get_solution_cache
+from .solvers import solve_quadratic, solve_quadratics
+
+
+class CachedSolveQuadraticTests(SimpleTestCase):
+    """
+    Решения через кэш совпадают с прямыми.
+    """
+    def setUp(self):
+        get_solution_cache().clear()
+
+    def textbook_coefficients(self, count):
+        generator = random.Random(0)
+        coefficients = []
+        for _ in range(count):
+            lead = generator.choice([0.1, 0.2, 0.3, 0.5, 1, 2, 3, -1, -0.3, 1e-3, 1e10])
+            first = generator.randint(-12, 12)
+            second = generator.randint(-12, 12)
+            # Корни first и second или комплексные при отрицательном свободном члене
+            if generator.random() < 0.5:
+                coefficients.append((lead, -lead * (first + second), lead * first * second))
+            else:
+                coefficients.append((lead, lead * first, lead * abs(second)))
+        coefficients += [(0.0, 0.0, 0.0), (0.0, 2.0, -4.0), (0.0, 0.0, 3.0), (-0.0, -0.0, 5e-324)]
+        return coefficients
+
+    def test_examples(self):
+        self.assertEqual(cached_solve_quadratic(0.1, -1.8, 8.1), solve_quadratic(0.1, -1.8, 8.1))
+        coefficients = (0.3, -3.5999999999999996, 10.799999999999999)
+        self.assertEqual(cached_solve_quadratic(*coefficients), solve_quadratic(*coefficients))
+
+    def test_single(self):
+        for coefficients in self.textbook_coefficients(5000):
+            with self.subTest(coefficients=coefficients):
+                self.assertEqual(cached_solve_quadratic(*coefficients), solve_quadratic(*coefficients))
+        # Повторный проход берёт ответы из кэша
+        for coefficients in self.textbook_coefficients(5000):
+            with self.subTest(coefficients=coefficients):
+                self.assertEqual(cached_solve_quadratic(*coefficients), solve_quadratic(*coefficients))
+
+    @override_settings(EQUATIONS_VECTORIZE_THRESHOLD=1)
+    def test_batch(self):
+        coefficients = self.textbook_coefficients(5000)
+        direct = [solve_quadratic(*item) for item in coefficients]
+        self.assertEqual(solve_quadratics(coefficients), direct)
+        self.assertEqual(cached_solve_quadratics(coefficients), direct)
+        self.assertEqual(cached_solve_quadratics(coefficients), direct)
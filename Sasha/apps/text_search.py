@@ -0,0 +1,290 @@
+"""
+Полнотекстовый поиск по работам и сохранённым постам.
+Текст разбивается на основы слов (apps.stemming), у каждого объекта есть
+SearchDocument. Слова документа хранятся в таблице SQLite FTS5 apps_search_fts
+с ранжированием bm25(), а если FTS5 нет - в таблице SearchPosting,
+по которой BM25 считается запросом с агрегатами.
+"""
+import math
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction, OperationalError
+from django.db.models import Avg, Case, Count, F, FloatField, Q, Sum, Value, When
+
+from .models import PostsTags, SavedPosts, SearchDocument, SearchPosting, Work
+from .stemming import tokenize
+
+
+FTS_TABLE = 'apps_search_fts'
+CREATE_FTS_SQL = (
+    'CREATE VIRTUAL TABLE {} USING fts5(body, tokenize="unicode61 remove_diacritics 0")'
+).format(FTS_TABLE)
+
+# Параметры BM25, те же, что у bm25() в FTS5
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_fts_enabled = dict()
+
+
+def create_fts_table(schema_editor):
+    """
+    Создаёт таблицу FTS5, если база - SQLite с поддержкой FTS5.
+    :param schema_editor: schema_editor миграции
+    :return: True, если таблица создана
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return False
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute(CREATE_FTS_SQL)
+    except OperationalError:
+        return False
+    return True
+
+
+def fts_enabled():
+    """
+    Есть ли в базе таблица FTS5. Проверяется один раз на процесс.
+    :return: True или False
+    """
+    alias = connection.alias
+    if alias not in _fts_enabled:
+        _fts_enabled[alias] = connection.vendor == 'sqlite' and \
+            FTS_TABLE in connection.introspection.table_names()
+    return _fts_enabled[alias]
+
+
+def work_text(work):
+    """
+    Текст работы для индекса.
+    """
+    return '{}\n{}'.format(work.title, work.description)
+
+
+def post_text(post, tags):
+    """
+    Текст сохранённого поста для индекса: заголовок и теги.
+    """
+    return '\n'.join([post.title] + list(tags))
+
+
+def index_document(kind, object_id, owner_id, text):
+    """
+    Добавляет или обновляет документ в индексе.
+    :param kind: SearchDocument.WORK или SearchDocument.POST
+    :param object_id: ID объекта
+    :param owner_id: ID владельца или None, если документ виден всем
+    :param text: текст документа
+    """
+    terms = tokenize(text)
+    with transaction.atomic():
+        document, _ = SearchDocument.objects.update_or_create(
+            kind=kind, object_id=object_id,
+            defaults=dict(owner_id=owner_id, length=len(terms))
+        )
+        if fts_enabled():
+            with connection.cursor() as cursor:
+                cursor.execute('DELETE FROM {} WHERE rowid = %s'.format(FTS_TABLE), [document.id])
+                cursor.execute('INSERT INTO {}(rowid, body) VALUES (%s, %s)'.format(FTS_TABLE),
+                               [document.id, ' '.join(terms)])
+        else:
+            document.postings.all().delete()
+            SearchPosting.objects.bulk_create([
+                SearchPosting(term=term, document=document, frequency=frequency)
+                for term, frequency in Counter(terms).items()
+            ])
+
+
+def remove_document(kind, object_id):
+    """
+    Удаляет документ из индекса.
+    :param kind: SearchDocument.WORK или SearchDocument.POST
+    :param object_id: ID объекта
+    """
+    with transaction.atomic():
+        document_id = SearchDocument.objects.filter(kind=kind, object_id=object_id) \
+            .values_list('id', flat=True).first()
+        if document_id is None:
+            return
+        if fts_enabled():
+            with connection.cursor() as cursor:
+                cursor.execute('DELETE FROM {} WHERE rowid = %s'.format(FTS_TABLE), [document_id])
+        SearchDocument.objects.filter(id=document_id).delete()
+
+
+def index_work(work):
+    index_document(SearchDocument.WORK, work.id, None, work_text(work))
+
+
+def index_post(post):
+    tags = PostsTags.objects.filter(post=post).values_list('tag', flat=True)
+    index_document(SearchDocument.POST, post.id, post.user_id, post_text(post, tags))
+
+
+def index_new_posts(posts, tags):
+    """
+    Добавляет в индекс пачку новых постов, которых в нём ещё нет.
+    Используется после bulk_create, когда сигналы не срабатывают.
+    :param posts: список сохранённых постов
+    :param tags: словарь {ID поста: список тегов}
+    """
+    terms = {post.id: tokenize(post_text(post, tags.get(post.id, []))) for post in posts}
+    with transaction.atomic():
+        SearchDocument.objects.bulk_create([
+            SearchDocument(kind=SearchDocument.POST, object_id=post.id,
+                           owner_id=post.user_id, length=len(terms[post.id]))
+            for post in posts
+        ])
+        documents = dict(SearchDocument.objects.filter(kind=SearchDocument.POST, object_id__in=terms)
+                         .values_list('object_id', 'id'))
+        if fts_enabled():
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    'INSERT INTO {}(rowid, body) VALUES (%s, %s)'.format(FTS_TABLE),
+                    [(documents[post_id], ' '.join(words)) for post_id, words in terms.items()]
+                )
+        else:
+            SearchPosting.objects.bulk_create([
+                SearchPosting(term=term, document_id=documents[post_id], frequency=frequency)
+                for post_id, words in terms.items()
+                for term, frequency in Counter(words).items()
+            ], batch_size=1000)
+
+
+class SearchPage(object):
+    """
+    Страница результатов поиска.
+    Имеет поля:
+    1) найденные объекты по убыванию релевантности
+    2) общее число найденных, номер страницы и число страниц
+    """
+    def __init__(self, results, count, number, per_page):
+        self.results = results
+        self.count = count
+        self.number = number
+        self.pages = max(1, math.ceil(count / per_page))
+
+    @property
+    def has_next(self):
+        return self.number < self.pages
+
+    @property
+    def has_previous(self):
+        return self.number > 1
+
+
+def search_fts(terms, visible, offset, limit):
+    """
+    Поиск по FTS5, все слова запроса обязательны.
+    :return: кортеж (список пар (ID документа, релевантность), всего найдено)
+    """
+    where, params = visible
+    match = ' '.join('"{}"'.format(term) for term in terms)
+    base = 'FROM {table} JOIN apps_searchdocument d ON d.id = {table}.rowid ' \
+           'WHERE {table} MATCH %s AND {where}'.format(table=FTS_TABLE, where=where)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT COUNT(*) ' + base, [match] + params)
+        count = cursor.fetchone()[0]
+        cursor.execute(
+            'SELECT d.id, -bm25({}) AS score '.format(FTS_TABLE) + base +
+            ' ORDER BY score DESC, d.id LIMIT %s OFFSET %s',
+            [match] + params + [limit, offset]
+        )
+        return cursor.fetchall(), count
+
+
+def search_postings(terms, visible, offset, limit):
+    """
+    Поиск по SearchPosting с ранжированием BM25, все слова запроса обязательны.
+    :return: кортеж (список пар (ID документа, релевантность), всего найдено)
+    """
+    total = SearchDocument.objects.aggregate(count=Count('id'), length=Avg('length'))
+    if not total['count']:
+        return [], 0
+    average_length = total['length'] or 1.0
+    frequencies = dict(SearchPosting.objects.filter(term__in=terms)
+                       .values_list('term').annotate(Count('id')))
+    weight = Case(
+        *[When(term=term, then=Value(math.log(
+            1 + (total['count'] - frequency + 0.5) / (frequency + 0.5)
+        ))) for term, frequency in frequencies.items()],
+        default=Value(0.0),
+        output_field=FloatField()
+    )
+    score = Sum(
+        weight * F('frequency') * Value(BM25_K1 + 1) / (
+            F('frequency') + Value(BM25_K1) * (
+                Value(1 - BM25_B) + Value(BM25_B) * F('document__length') / Value(average_length)
+            )
+        ),
+        output_field=FloatField()
+    )
+    postings = SearchPosting.objects.filter(Q(term__in=terms) & visible) \
+        .values('document').annotate(score=score, matched=Count('term', distinct=True)) \
+        .filter(matched=len(terms))
+    count = postings.count()
+    rows = postings.order_by('-score', 'document')[offset:offset + limit]
+    return [(row['document'], row['score']) for row in rows], count
+
+
+def resolve_documents(rows):
+    """
+    Загружает найденные объекты, по одному запросу на вид документа.
+    :param rows: список пар (ID документа, релевантность)
+    :return: список словарей с видом, ID, заголовком, ссылкой и релевантностью
+    """
+    documents = SearchDocument.objects.in_bulk([document_id for document_id, _ in rows])
+    ids = {kind: [] for kind, _ in SearchDocument.KINDS}
+    for document in documents.values():
+        ids[document.kind].append(document.object_id)
+    objects = {
+        SearchDocument.WORK: Work.objects.only('title', 'slug').in_bulk(ids[SearchDocument.WORK]),
+        SearchDocument.POST: SavedPosts.objects.only('title', 'url').in_bulk(ids[SearchDocument.POST]),
+    }
+    results = []
+    for document_id, score in rows:
+        document = documents.get(document_id)
+        item = document and objects[document.kind].get(document.object_id)
+        if item is None:
+            continue
+        results.append({
+            'type': document.kind,
+            'id': item.id,
+            'title': item.title,
+            'url': item.get_absolute_url() if document.kind == SearchDocument.WORK else item.url,
+            'score': round(score, 6),
+        })
+    return results
+
+
+def search(query, user, kind=None, page=1, per_page=None):
+    """
+    Ранжированный поиск по работам и постам пользователя.
+    :param query: строка запроса
+    :param user: пользователь, чужие посты ему не показываются
+    :param kind: SearchDocument.WORK, SearchDocument.POST или None для всех
+    :param page: номер страницы
+    :param per_page: размер страницы, по умолчанию SEARCH_PAGE_SIZE
+    :return: объект SearchPage
+    """
+    per_page = per_page or settings.SEARCH_PAGE_SIZE
+    terms = sorted(set(tokenize(query)))
+    if not terms:
+        return SearchPage([], 0, 1, per_page)
+    offset = (page - 1) * per_page
+
+    if fts_enabled():
+        where = '(d.kind = %s OR d.owner_id = %s)'
+        params = [SearchDocument.WORK, user.id]
+        if kind:
+            where += ' AND d.kind = %s'
+            params.append(kind)
+        rows, count = search_fts(terms, (where, params), offset, per_page)
+    else:
+        visible = Q(document__kind=SearchDocument.WORK) | Q(document__owner=user)
+        if kind:
+            visible &= Q(document__kind=kind)
+        rows, count = search_postings(terms, visible, offset, per_page)
+    return SearchPage(resolve_documents(rows), count, page, per_page)
@@ -0,0 +1,100 @@
+"""
+Сборка CSS-файлов для каждой комбинации темы и темы фона.
+Файлы кладутся в static/themes под именем с хэшем содержимого,
+поэтому браузер может кэшировать их без ограничения по времени.
+"""
+import hashlib
+import json
+import os
+from functools import lru_cache
+
+from django.contrib.staticfiles import finders
+from django.core.exceptions import ImproperlyConfigured
+from django.template.loader import render_to_string
+
+from .themes import THEMES, BACKGROUND_THEMES, DEFAULT_THEME, DEFAULT_BACKGROUND_THEME
+
+
+BUNDLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'themes')
+MANIFEST_NAME = 'manifest.json'
+
+
+def bundle_key(theme_key, bg_theme):
+    """
+    Ключ комбинации темы и темы фона.
+    :param theme_key: ключ темы из THEMES
+    :param bg_theme: ключ темы фона из BACKGROUND_THEMES
+    :return: ключ вида primary-light
+    """
+    return '{}-{}'.format(theme_key, bg_theme)
+
+
+def render_bundle(theme, bg_theme):
+    """
+    Рендеринг CSS для комбинации темы и темы фона.
+    :param theme: объект темы
+    :param bg_theme: объект темы фона
+    :return: текст CSS
+    """
+    dark_css = ''
+    if bg_theme.stylesheet:
+        with open(finders.find(bg_theme.stylesheet), encoding='utf-8') as bg_file:
+            dark_css = bg_file.read()
+    return render_to_string('themes/bundle.css', {'theme': theme, 'dark_css': dark_css})
+
+
+def build_bundles(output_dir=BUNDLE_DIR):
+    """
+    Сборка всех CSS-файлов тем и манифеста.
+    Файлы прошлых сборок удаляются.
+    :param output_dir: папка для файлов
+    :return: манифест вида {ключ: путь относительно STATIC_URL}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = dict()
+    for theme_key, theme in THEMES.items():
+        for bg_key, bg_theme in BACKGROUND_THEMES.items():
+            content = render_bundle(theme, bg_theme).encode('utf-8')
+            digest = hashlib.sha256(content).hexdigest()[:12]
+            key = bundle_key(theme_key, bg_key)
+            filename = '{}.{}.css'.format(key, digest)
+            with open(os.path.join(output_dir, filename), 'wb') as bundle_file:
+                bundle_file.write(content)
+            manifest[key] = 'themes/' + filename
+
+    built = {os.path.basename(path) for path in manifest.values()}
+    for filename in os.listdir(output_dir):
+        if filename.endswith('.css') and filename not in built:
+            os.remove(os.path.join(output_dir, filename))
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, indent=4, sort_keys=True)
+    get_manifest.cache_clear()
+    return manifest
+
+
+@lru_cache(maxsize=None)
+def get_manifest():
+    """
+    Чтение манифеста собранных тем.
+    Читается один раз на процесс.
+    :return: манифест вида {ключ: путь относительно STATIC_URL}
+    """
+    try:
+        with open(os.path.join(BUNDLE_DIR, MANIFEST_NAME), encoding='utf-8') as manifest_file:
+            return json.load(manifest_file)
+    except FileNotFoundError:
+        raise ImproperlyConfigured(
+            'CSS тем не собран, выполните "python manage.py build_theme_css".'
+        )
+
+
+def bundle_path(theme_key, bg_theme):
+    """
+    Путь к CSS-файлу комбинации темы и темы фона.
+    :param theme_key: ключ темы из THEMES
+    :param bg_theme: ключ темы фона из BACKGROUND_THEMES
+    :return: путь относительно STATIC_URL
+    """
+    manifest = get_manifest()
+    default_key = bundle_key(DEFAULT_THEME.key, DEFAULT_BACKGROUND_THEME.key)
+    return manifest.get(bundle_key(theme_key, bg_theme), manifest[default_key])
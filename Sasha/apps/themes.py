@@ -1,94 +1,96 @@
 """
 Темы для сайта, привязанные к аккаунту пользователя.
+Все темы описаны один раз в THEME_LIST и BACKGROUND_THEME_LIST,
+из них строятся реестры для поиска по ключу и варианты выбора для моделей и форм.
+Реестры собираются при импорте и не меняются во время работы.
 """
+from types import MappingProxyType
 
 
-class Theme(object):
+class FrozenSlots(object):
     """
-    Шаблон для остальных тем.
+    Неизменяемый объект со слотами вместо __dict__.
     """
-    base_color = None
-    secondary_color = None
+    __slots__ = ()
 
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
 
-class DefaultTheme(Theme):
-    """
-    Дефолтная тема голубоватого цвета.
-    Да, я взял её у ВК.
-    """
-    base_color = "#4a76a8"
-    secondary_color = "#3a6899"
+    def __setattr__(self, name, value):
+        raise AttributeError('{} нельзя изменить'.format(type(self).__name__))
 
+    def __delattr__(self, name):
+        raise AttributeError('{} нельзя изменить'.format(type(self).__name__))
 
-class BlueTheme(Theme):
-    """
-    Голубая тема на замену дефолтной.
-    """
-    base_color = "#2261a1"
-    secondary_color = "#205c99"
+    def __repr__(self):
+        return '{}({})'.format(
+            type(self).__name__,
+            ', '.join(repr(getattr(self, name)) for name in self.__slots__)
+        )
 
 
-class GreenTheme(Theme):
+class Theme(FrozenSlots):
     """
-    Зелёная тема.
-    Словно густой лес в ясную погоду.
+    Тема компонентов сайта.
+    Имеет четыре поля:
+    1) ключ, который хранится в ThemeChanger.theme
+    2) название для формы выбора
+    3) основной цвет
+    4) цвет при наведении
     """
-    base_color = '#156b39'
-    secondary_color = '#146636'
+    __slots__ = ('key', 'label', 'base_color', 'secondary_color')
 
 
-class RedTheme(Theme):
+class BackgroundTheme(FrozenSlots):
     """
-    Тема кирпичного цвета.
-    Такая же надежная, как и сам кирпич.
+    Тема фона сайта.
+    Имеет три поля:
+    1) ключ, который хранится в ThemeChanger.background_theme
+    2) название для формы выбора
+    3) дополнительный CSS-файл из static или None
     """
-    base_color = '#900c3e'
-    secondary_color = '#890b3b'
+    __slots__ = ('key', 'label', 'stylesheet')
 
 
-class IndigoTheme(Theme):
-    """
-    Тема цвета индиго.
-    На языке простых смертных - фиолетовая.
-    """
-    base_color = '#6c3483'
-    secondary_color = '#67317c'
+THEME_LIST = (
+    # Дефолтная тема голубоватого цвета. Да, я взял её у ВК.
+    Theme('primary', 'Стандартный цвет', '#4a76a8', '#3a6899'),
+    # Голубая тема на замену дефолтной.
+    Theme('blue', 'Голубой', '#2261a1', '#205c99'),
+    # Зелёная тема. Словно густой лес в ясную погоду.
+    Theme('green', 'Зеленый', '#156b39', '#146636'),
+    # Тема кирпичного цвета. Такая же надежная, как и сам кирпич.
+    Theme('red', 'Карминный', '#900c3e', '#890b3b'),
+    # Тема цвета индиго. На языке простых смертных - фиолетовая.
+    Theme('indigo', 'Индиго', '#6c3483', '#67317c'),
+    # Бирюзовая тема. Успокаивает агрессивных пользователей.
+    Theme('aqua', 'Бирюзовый', '#148f77', '#138b73'),
+    # Оранжевая тема. Оттенки оранжевого - мои кошмары. Этот вроде выглядит неплохо.
+    Theme('orange', 'Оранжевый', '#af601a', '#a65b19'),
+    # Бордовая тема.
+    Theme('claret', 'Бордовый', '#922b21', '#8d2a20'),
+)
 
+BACKGROUND_THEME_LIST = (
+    BackgroundTheme('light', 'Светлая', None),
+    BackgroundTheme('dark', 'Тёмная', 'another_dark.css'),
+)
 
-class AquaTheme(Theme):
-    """
-    Бирюзовая тема.
-    Успокаивает агрессивных пользователей.
-    """
-    base_color = '#148f77'
-    secondary_color = '#138b73'
+THEMES = MappingProxyType({theme.key: theme for theme in THEME_LIST})
+BACKGROUND_THEMES = MappingProxyType({theme.key: theme for theme in BACKGROUND_THEME_LIST})
 
+DEFAULT_THEME = THEMES['primary']
+DEFAULT_BACKGROUND_THEME = BACKGROUND_THEMES['light']
 
-class OrangeTheme(Theme):
-    """
-    Оранжевая тема.
-    Оттенки оранжевого - мои кошмары.
-    Этот вроде выглядит неплохо.
-    """
-    base_color = '#af601a'
-    secondary_color = '#a65b19'
+THEME_CHOICES = [(theme.key, theme.label) for theme in THEME_LIST]
+BACKGROUND_THEME_CHOICES = [(theme.key, theme.label) for theme in BACKGROUND_THEME_LIST]
 
 
-class ClaretTheme(Theme):
+def get_theme(key):
     """
-    Бордовая тема.
+    Получение темы по ключу.
+    :param key: ключ темы
+    :return: тема или тема по умолчанию, если ключ неизвестен
     """
-    base_color = '#922b21'
-    secondary_color = '#8d2a20'
-
-
-THEMES = {
-    'primary': DefaultTheme(),
-    'blue': BlueTheme(),
-    'green': GreenTheme(),
-    'red': RedTheme(),
-    'indigo': IndigoTheme(),
-    'aqua': AquaTheme(),
-    'orange': OrangeTheme(),
-    'claret': ClaretTheme()
-}
+    return THEMES.get(key, DEFAULT_THEME)
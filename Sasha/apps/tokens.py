@@ -4,7 +4,6 @@
 
 
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
-from django.utils import six
 
 
 class TokenGenerator(PasswordResetTokenGenerator):
@@ -13,8 +12,8 @@ class TokenGenerator(PasswordResetTokenGenerator):
     """
     def _make_hash_value(self, user, timestamp):
         return (
-            six.text_type(user.pk) + six.text_type(timestamp) +
-            six.text_type(user.is_active)
+            str(user.pk) + str(timestamp) +
+            str(user.is_active)
         )
 
 
@@ -0,0 +1,249 @@
+"""
+Потоковая проверка загружаемых изображений.
+Формат определяется по сигнатуре файла, а разрешение - по заголовку,
+поэтому для проверки не нужно читать файл целиком.
+"""
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+JPEG_SIGNATURE = b'\xff\xd8\xff'
+SIGNATURE_LENGTH = len(PNG_SIGNATURE)
+# Расширение файла для каждого формата: имя файла от клиента не используется
+IMAGE_EXTENSIONS = {'png': '.png', 'jpeg': '.jpg'}
+# Запас на CSRF-токен и границы multipart при проверке длины запроса
+REQUEST_OVERHEAD = 64 * 1024
+
+# Маркеры SOFn, в которых JPEG хранит размеры изображения
+JPEG_SOF_MARKERS = {
+    0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+    0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF
+}
+# Маркеры без поля длины
+JPEG_STANDALONE_MARKERS = {0x01, 0xD8} | set(range(0xD0, 0xD8))
+
+
+class UploadRejected(Exception):
+    """
+    Загруженный файл не прошёл проверку.
+    Текст исключения показывается пользователю.
+    """
+
+
+def sniff_image_format(header):
+    """
+    Определение формата изображения по первым байтам.
+    :param header: первые байты файла
+    :return: 'png', 'jpeg' или None
+    """
+    if header.startswith(PNG_SIGNATURE):
+        return 'png'
+    if header.startswith(JPEG_SIGNATURE):
+        return 'jpeg'
+    return None
+
+
+class PNGHeaderParser(object):
+    """
+    Чтение размеров PNG из блока IHDR, который идёт сразу за сигнатурой.
+    """
+    def __init__(self):
+        self.dimensions = None
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        self._buffer += data[:24 - len(self._buffer)]
+        if len(self._buffer) < 24:
+            return
+        if self._buffer[12:16] != b'IHDR':
+            raise UploadRejected('Повреждённый файл PNG.')
+        self.dimensions = (
+            int.from_bytes(self._buffer[16:20], 'big'),
+            int.from_bytes(self._buffer[20:24], 'big')
+        )
+
+
+class JPEGHeaderParser(object):
+    """
+    Поиск маркера SOFn в JPEG.
+    Содержимое остальных сегментов (EXIF, таблицы) пропускается, не накапливаясь в памяти.
+    """
+    def __init__(self):
+        self.dimensions = None
+        self._buffer = bytearray()
+        self._skip = 0
+
+    def feed(self, data):
+        self._buffer += data
+        while self.dimensions is None:
+            if self._skip:
+                skipped = min(self._skip, len(self._buffer))
+                del self._buffer[:skipped]
+                self._skip -= skipped
+                if self._skip:
+                    return
+            if len(self._buffer) < 4:
+                return
+            if self._buffer[0] != 0xFF:
+                raise UploadRejected('Повреждённый файл JPEG.')
+            marker = self._buffer[1]
+            if marker == 0xFF:
+                del self._buffer[:1]
+                continue
+            if marker in JPEG_STANDALONE_MARKERS:
+                del self._buffer[:2]
+                continue
+            if marker in JPEG_SOF_MARKERS:
+                if len(self._buffer) < 9:
+                    return
+                self.dimensions = (
+                    int.from_bytes(self._buffer[7:9], 'big'),
+                    int.from_bytes(self._buffer[5:7], 'big')
+                )
+                self._buffer = bytearray()
+                return
+            if marker in (0xD9, 0xDA):
+                raise UploadRejected('Повреждённый файл JPEG.')
+            self._skip = int.from_bytes(self._buffer[2:4], 'big')
+            del self._buffer[:2]
+
+
+HEADER_PARSERS = {
+    'png': PNGHeaderParser,
+    'jpeg': JPEGHeaderParser
+}
+
+
+class ImageHeaderValidator(object):
+    """
+    Проверка изображения по мере получения данных.
+    Считает размер файла, определяет формат по сигнатуре и читает разрешение из заголовка.
+    """
+    def __init__(self, max_size=None, max_side=None, formats=None):
+        self.max_size = max_size or settings.AVATAR_UPLOAD_MAX_SIZE
+        self.max_side = max_side or settings.AVATAR_UPLOAD_MAX_SIDE
+        self.formats = formats or settings.AVATAR_UPLOAD_FORMATS
+        self.size = 0
+        self.image_format = None
+        self.dimensions = None
+        self._signature = bytearray()
+        self._parser = None
+
+    def check_size(self, size):
+        """
+        Проверка размера файла.
+        :param size: размер в байтах
+        """
+        if size > self.max_size:
+            raise UploadRejected('Размер изображения больше {:g} МБ.'.format(
+                self.max_size / 1024 / 1024
+            ))
+
+    def feed(self, chunk):
+        """
+        Обработка очередного куска файла.
+        :param chunk: байты
+        """
+        self.size += len(chunk)
+        self.check_size(self.size)
+        if self.dimensions is not None:
+            return
+        if self._parser is None:
+            self._signature += chunk
+            if len(self._signature) < SIGNATURE_LENGTH:
+                return
+            self.image_format = sniff_image_format(bytes(self._signature))
+            if self.image_format not in self.formats:
+                raise UploadRejected('Поддерживаются только изображения {}.'.format(
+                    ', '.join(format_name.upper() for format_name in self.formats)
+                ))
+            self._parser = HEADER_PARSERS[self.image_format]()
+            chunk, self._signature = bytes(self._signature), None
+        self._parser.feed(chunk)
+        if self._parser.dimensions is not None:
+            self.dimensions = self._parser.dimensions
+            width, height = self.dimensions
+            if width > self.max_side or height > self.max_side:
+                raise UploadRejected('Разрешение изображения больше {0}x{0}.'.format(self.max_side))
+
+    @property
+    def header_complete(self):
+        """
+        Формат и разрешение уже известны.
+        """
+        return self.dimensions is not None
+
+    def finish(self):
+        """
+        Проверка после получения всего файла.
+        :return: кортеж (формат, ширина, высота)
+        """
+        if not self.header_complete:
+            raise UploadRejected('Файл не является изображением PNG или JPEG.')
+        return (self.image_format,) + self.dimensions
+
+
+def validate_image_file(uploaded_file, **limits):
+    """
+    Проверка уже загруженного файла.
+    Читается только заголовок, размер берётся из uploaded_file.size.
+    :param uploaded_file: объект UploadedFile
+    :param limits: max_size, max_side и formats для ImageHeaderValidator
+    :return: кортеж (формат, ширина, высота)
+    """
+    validator = ImageHeaderValidator(**limits)
+    validator.check_size(uploaded_file.size)
+    uploaded_file.seek(0)
+    for chunk in uploaded_file.chunks():
+        validator.feed(chunk)
+        if validator.header_complete:
+            break
+    uploaded_file.seek(0)
+    return validator.finish()
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """
+    Обработчик загрузки, который проверяет изображение на лету.
+    Должен стоять первым в request.upload_handlers: неподходящий файл
+    пропускается до того, как остальные обработчики сохранят его целиком.
+    Текст ошибки сохраняется в атрибуте error.
+    """
+    def __init__(self, request=None, field_name='image', **limits):
+        super().__init__(request)
+        self.field_name = field_name
+        self.limits = limits
+        self.validator = None
+        self.error = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        max_size = self.limits.get('max_size') or settings.AVATAR_UPLOAD_MAX_SIZE
+        if content_length > max_size + REQUEST_OVERHEAD:
+            self.error = 'Размер изображения больше {:g} МБ.'.format(max_size / 1024 / 1024)
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.validator = None
+        if field_name != self.field_name:
+            return
+        if self.error:
+            raise SkipFile()
+        self.validator = ImageHeaderValidator(**self.limits)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.validator is not None:
+            try:
+                self.validator.feed(raw_data)
+            except UploadRejected as error:
+                self.error = str(error)
+                raise SkipFile()
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.validator is not None:
+            try:
+                self.validator.finish()
+            except UploadRejected as error:
+                self.error = str(error)
+        return None
@@ -4,19 +4,21 @@ from django.urls import path
 from django.contrib.auth import views as auth_views
 
 from . import views
-from .themes import THEMES
-from .forms import LoginForm
+from .themes import DEFAULT_THEME, DEFAULT_BACKGROUND_THEME
+from .forms import LoginForm, QueuedPasswordResetForm
 
 
 urlpatterns = [
     path('admin/', views.admin_page),
     path('admin/users/', views.admin_opportunity_users),
+    path('admin/users/bulk/', views.admin_bulk_users),
+    path('admin/metrics/', views.admin_metrics),
+    path('admin/metrics/prometheus/', views.metrics_prometheus),
     path('admin/make-admin/<int:user_id>', views.admin_make_admin),
     path('admin/make-user/<int:user_id>', views.admin_make_user),
     path('admin/block-user/<int:user_id>', views.block_user),
     path('admin/unblock-user/<int:user_id>', views.unblock_user),
     path('', views.index_page),
-    path('api/', views.api),
     path('profile/', views.profile_edit_page),
     path('profile/edit/confirm/<uidb64>/<token>/', views.profile_edit_confirm_page, name='edit_confirm'),
     path('profile/reg/', views.profile_reg_page),
@@ -25,30 +27,47 @@ urlpatterns = [
     path('profile/login/', views.profile_login_page),
     path('profile/themes/', views.theme_changer_page),
     path('profile/password/',views. change_password_page),
-    path('profile/accounts/', views.accounts),
     path('profile/avatar/', views.upload_avatar),
     path('profile/avatar/remove/', views.remove_avatar),
     path('reset-password/', auth_views.PasswordResetView.as_view(
+        form_class=QueuedPasswordResetForm,
         email_template_name='password_reset/email.html',
         template_name='password_reset/form.html',
-        extra_context={'theme': THEMES['primary'], 'bg_theme': 'light', 'login_form': LoginForm()},
+        extra_context={
+            'theme': DEFAULT_THEME, 'bg_theme': DEFAULT_BACKGROUND_THEME.key, 'login_form': LoginForm()
+        },
         success_url='/reset-password/done',
         subject_template_name='password_reset/email_title.txt'
     )),
     path('reset-password/done', auth_views.PasswordResetDoneView.as_view(
         template_name='password_reset/done.html',
-        extra_context={'theme': THEMES['primary'], 'bg_theme': 'light', 'login_form': LoginForm()},
+        extra_context={
+            'theme': DEFAULT_THEME, 'bg_theme': DEFAULT_BACKGROUND_THEME.key, 'login_form': LoginForm()
+        },
     )),
     path('reset/<uidb64>/<token>/', auth_views.PasswordResetConfirmView.as_view(
         template_name='password_reset/confirm.html',
         success_url='/reset/done',
-        extra_context={'theme': THEMES['primary'], 'bg_theme': 'light', 'login_form': LoginForm()},
+        extra_context={
+            'theme': DEFAULT_THEME, 'bg_theme': DEFAULT_BACKGROUND_THEME.key, 'login_form': LoginForm()
+        },
     ), name='reset_confirm'),
     path('reset/done/', auth_views.PasswordResetCompleteView.as_view(
         template_name='password_reset/complete.html',
-        extra_context={'theme': THEMES['primary'], 'bg_theme': 'light', 'login_form': LoginForm()},
+        extra_context={
+            'theme': DEFAULT_THEME, 'bg_theme': DEFAULT_BACKGROUND_THEME.key, 'login_form': LoginForm()
+        },
     )),
     path('works/', views.get_works),
+    path('search/', views.search),
+    path('posts/tags/', views.saved_posts_by_tags),
+    path('posts/export/', views.export_saved_posts),
+    path('posts/import/', views.import_saved_posts),
+    path('feed/', views.canal_feed),
+    path('feed/<int:post_id>/like/', views.like_canal_post),
     path('equations/', views.get_equations),
-    path('works/show/', views.show_product)
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    path('equations/solve/', views.solve_equations),
+    path('equations/upload/', views.solve_equations_upload),
+    path('equations/problems/', views.solve_equation_problems),
+    path('works/<str:slug>/', views.show_work)
+] + static(settings.MEDIA_URL, view=views.serve_media, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -0,0 +1,29 @@
+"""
+Поиск пользователей по почте без учёта регистра.
+Почта сравнивается как LOWER(email), для этого в миграции 0010 созданы
+индекс auth_user_email_lower_idx и уникальный индекс auth_user_email_ci_uniq.
+"""
+from django.contrib.auth.models import User
+from django.db.models.functions import Lower
+
+
+def users_with_email(email):
+    """
+    Пользователи с данной почтой в любом регистре.
+    :param email: адрес почты
+    :return: QuerySet пользователей
+    """
+    return User.objects.annotate(email_key=Lower('email')).filter(email_key=email.lower())
+
+
+def email_in_use(email, user=None):
+    """
+    Занята ли почта другим пользователем.
+    :param email: адрес почты
+    :param user: пользователь, чья почта не считается занятой
+    :return: True или False
+    """
+    users = users_with_email(email)
+    if user is not None:
+        users = users.exclude(id=user.id)
+    return users.exists()
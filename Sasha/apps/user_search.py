@@ -0,0 +1,92 @@
+"""
+Поиск пользователей по логину, имени, фамилии и почте.
+Кандидаты выбираются по индексу триграмм UserSearchTrigram,
+а затем проверяются по тексту из UserSearchIndex.
+"""
+import re
+
+from django.db.models import Count
+
+from .models import UserSearchIndex, UserSearchTrigram
+
+
+SEARCH_FIELDS = ('username', 'first_name', 'last_name', 'email')
+WORD_RE = re.compile(r'\w+')
+
+
+def trigrams(text):
+    """
+    Все триграммы строки.
+    :param text: строка
+    :return: множество триграмм
+    """
+    return {text[position:position + 3] for position in range(len(text) - 2)}
+
+
+def user_search_text(user):
+    """
+    Текст пользователя для поиска.
+    :param user: пользователь
+    :return: значения SEARCH_FIELDS в нижнем регистре через перевод строки
+    """
+    return '\n'.join(getattr(user, field).lower() for field in SEARCH_FIELDS)
+
+
+def document_trigrams(text):
+    """
+    Триграммы для индекса.
+    Каждое поле целиком дополняется пробелами по краям, как в pg_trgm,
+    а каждое слово - ещё и отдельно, чтобы работал поиск по началу слова.
+    :param text: результат user_search_text
+    :return: множество триграмм
+    """
+    result = set()
+    for value in text.split('\n'):
+        for part in [value] + WORD_RE.findall(value):
+            if part:
+                result |= trigrams('  ' + part + ' ')
+    return result
+
+
+def query_trigrams(word):
+    """
+    Триграммы слова из запроса.
+    Для слов короче трёх символов ищется начало слова.
+    :param word: слово в нижнем регистре
+    :return: множество триграмм
+    """
+    if len(word) >= 3:
+        return trigrams(word)
+    return trigrams('  ' + word)
+
+
+def index_user(user):
+    """
+    Обновление поискового индекса пользователя.
+    :param user: пользователь
+    """
+    text = user_search_text(user)
+    UserSearchIndex.objects.update_or_create(user=user, defaults={'text': text})
+    UserSearchTrigram.objects.filter(user=user).delete()
+    UserSearchTrigram.objects.bulk_create(
+        [UserSearchTrigram(user=user, trigram=trigram) for trigram in document_trigrams(text)]
+    )
+
+
+def search_users(queryset, query):
+    """
+    Фильтрация пользователей по поисковому запросу.
+    Каждое слово запроса должно встречаться в логине, имени, фамилии или почте.
+    :param queryset: QuerySet пользователей
+    :param query: строка запроса
+    :return: отфильтрованный QuerySet
+    """
+    for word in query.lower().split():
+        word_trigrams = query_trigrams(word)
+        candidates = UserSearchTrigram.objects.filter(
+            trigram__in=word_trigrams
+        ).values('user').annotate(
+            matched=Count('trigram')
+        ).filter(matched=len(word_trigrams)).values('user')
+        queryset = queryset.filter(id__in=candidates, search_index__text__contains=word)
+    return queryset
@@ -2,35 +2,75 @@
 Модуль с функциями-обработчиками страниц.
 """
 import datetime
+import hmac
 import json
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.sites.shortcuts import get_current_site
 from django.contrib.auth import update_session_auth_hash, logout, authenticate, login
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
+from django.contrib.auth.views import redirect_to_login
 from django.core.exceptions import ObjectDoesNotExist
-from django.http import HttpResponse
-from django.shortcuts import render, redirect
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render, redirect, get_object_or_404
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.static import serve
 from django.utils.encoding import force_bytes, force_text
-from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode, \
+    url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST
 from django.template.loader import render_to_string
-from django.core.mail import EmailMessage
 
 from .forms import LoginForm, RegistrationForm, ThemeForm,\
-    ProfileEditForm, PasswordEditForm, SearchUser, AccountsForm, \
-    CreateCanalForm, AddUserToCanal, EditArticleForm, \
-    NewPostForm, FilterPostForm, AddImageUser, SearchPostForm, SearchCanalForm
+    ProfileEditForm, PasswordEditForm, SearchUser, AddImageUser, SearchPostForm, \
+    BulkUserActionForm
 from .tokens import CONFIRM_TOKEN
-from .themes import THEMES
+from .caching import get_user_context, get_works_page
+from .mail_queue import aenqueue_mail
+from .uploads import ImageUploadHandler
+from .storage import is_content_addressed
+from .pagination import keyset_paginate, page_query
+from .user_search import search_users
+from .user_emails import email_in_use
+from .text_search import search as search_documents
+from .post_tags import AND, query_tags
+from .feeds import get_feed
+from .likes import like_count, set_like
+from .post_transfer import export_posts, export_posts_file, import_posts
+from .metrics import prometheus_text, registry, summary
+from .solvers import CoefficientsError, parse_coefficients
+from .equation_cache import cached_solve_quadratic, cached_solve_quadratics
+from .equation_streams import CONTENT_TYPES, detect_format, stream_solutions
+from .solver_engine import ProblemError, parse_problem, solve_problems
+from .themes import DEFAULT_THEME, DEFAULT_BACKGROUND_THEME, get_theme
 from . import models
 
 
+USER_ACTIONS = {
+    'block': dict(is_active=False),
+    'unblock': dict(is_active=True),
+    'promote': dict(is_superuser=True, is_staff=True),
+    'demote': dict(is_superuser=False, is_staff=False),
+}
+
+USER_ORDERINGS = {
+    'id': ('id',),
+    'date_joined': ('date_joined', 'id'),
+}
+
+
 def admin_required(function):
     """
     Декоратор для проверки is_superuser и is_staff.
     :param function: функция
     :return: функция или перенаправление на главную страницу
     """
+    @wraps(function)
     def inner(request, *args, **kwargs):
         if request.user.is_superuser and request.user.is_staff:
             return function(request, *args, **kwargs)
@@ -39,6 +79,33 @@ def admin_required(function):
     return inner
 
 
+async def resolve_user(request):
+    """
+    Загрузка пользователя запроса для асинхронных обработчиков.
+    request.user читает сессию и пользователя из БД при первом обращении,
+    поэтому первое обращение выполняется в потоке.
+    :param request: объект запроса
+    :return: пользователь
+    """
+    await sync_to_async(lambda: request.user.is_authenticated)()
+    return request.user
+
+
+def async_login_required(function):
+    """
+    Декоратор login_required для асинхронных обработчиков.
+    :param function: асинхронная функция
+    :return: асинхронная функция
+    """
+    @wraps(function)
+    async def inner(request, *args, **kwargs):
+        user = await resolve_user(request)
+        if user.is_authenticated:
+            return await function(request, *args, **kwargs)
+        return redirect_to_login(request.get_full_path())
+    return inner
+
+
 def get_base_context(request):
     """
     Получение базового контекста.
@@ -47,38 +114,51 @@ def get_base_context(request):
     """
     context = dict()
     if request.user.is_authenticated:
-        try:
-            theme_model = models.ThemeChanger.objects.get(user=request.user)
-        except ObjectDoesNotExist:
-            theme_model = models.ThemeChanger(
-                theme='primary', background_theme='light', user=request.user
-            )
-            theme_model.save()
-
-        try:
-            avatar = models.UserAvatar.objects.get(user=request.user)
-            context['avatar'] = avatar.image.url
-            context['default_avatar'] = False
-        except ObjectDoesNotExist:
-            context['avatar'] = '/static/default.jpg'
-            context['default_avatar'] = True
-        context['theme'] = THEMES[theme_model.theme]
-        context['bg_theme'] = theme_model.background_theme
+        user_context = get_user_context(request.user)
+        context['avatar'] = user_context['avatar']
+        context['default_avatar'] = user_context['default_avatar']
+        context['theme'] = get_theme(user_context['theme'])
+        context['bg_theme'] = user_context['bg_theme']
     else:
-        context['theme'] = THEMES['primary']
-        context['bg_theme'] = 'light'
+        context['theme'] = DEFAULT_THEME
+        context['bg_theme'] = DEFAULT_BACKGROUND_THEME.key
     context['user'] = request.user
     context['login_form'] = LoginForm()
     return context
 
 
+async def aget_base_context(request):
+    """
+    get_base_context для асинхронных обработчиков.
+    Тема и аватарка читаются из кэша или БД в потоке.
+    :param request: объект запроса
+    :return: базовый контекст
+    """
+    await resolve_user(request)
+    return await sync_to_async(get_base_context)(request)
+
+
+def user_from_uid(uidb64):
+    """
+    Пользователь по ключу из ссылки в письме.
+    :param uidb64: закодированный ключ
+    :return: пользователь или None
+    """
+    try:
+        uid = force_text(urlsafe_base64_decode(uidb64))
+        return User.objects.get(pk=uid)
+    except(TypeError, ValueError, OverflowError, ObjectDoesNotExist):
+        return None
+
+
 def get_base_admin_context():
     """
     Получение базового контекста администратора.
     :return: базовый контекст администратора
     """
     opportunities = [
-        dict(name='Управление пользователями', url='/admin/users/')
+        dict(name='Управление пользователями', url='/admin/users/'),
+        dict(name='Метрики страниц', url='/admin/metrics/')
     ]
     return opportunities
 
@@ -93,15 +173,34 @@ def index_page(request):
     return render(request, 'index.html', context)
 
 
-def profile_reg_page(request):
+def create_inactive_user(username, email, password, first_name, last_name):
+    """
+    Создание неактивного пользователя с темой по умолчанию.
+    :return: пользователь
+    """
+    user = User.objects.create_user(username, email, password)
+    user.first_name = first_name
+    user.last_name = last_name
+    user.is_active = False
+    user.save()
+    theme = models.ThemeChanger(
+        theme=DEFAULT_THEME.key,
+        background_theme=DEFAULT_BACKGROUND_THEME.key,
+        user=user
+    )
+    theme.save()
+    return user
+
+
+async def profile_reg_page(request):
     """
     Страница регистрации пользователя.
     :param request: объект запроса
     :return render: объект ответа сервера с HTML
     :return redirect: перенаправление на главную страницу сайта
     """
-    if not request.user.is_authenticated:
-        context = get_base_context(request)
+    if not (await resolve_user(request)).is_authenticated:
+        context = await aget_base_context(request)
         context['reg_form'] = RegistrationForm()
         if request.method == 'POST':
             reg_form = RegistrationForm(request.POST)
@@ -112,18 +211,11 @@ def profile_reg_page(request):
                 first_name = reg_form.data['first_name']
                 last_name = reg_form.data['last_name']
                 email = reg_form.data['email']
-                if not User.objects.filter(username=username).exists():
-                    if not User.objects.filter(email=email).exists():
-                        user = User.objects.create_user(username, email, password)
-                        user.first_name = first_name
-                        user.last_name = last_name
-                        user.is_active = False
-                        user.save()
-                        theme = models.ThemeChanger(
-                            theme='primary', background_theme='light', user=user
+                if not await sync_to_async(User.objects.filter(username=username).exists)():
+                    if not await sync_to_async(email_in_use)(email):
+                        user = await sync_to_async(create_inactive_user)(
+                            username, email, password, first_name, last_name
                         )
-                        theme.save()
-
                         current_site = get_current_site(request)
                         mail_subject = 'Активация аккаунта на сайте Sasha'
                         message = render_to_string('registration/reg_confirm_email.html', {
@@ -132,10 +224,7 @@ def profile_reg_page(request):
                             'uid': urlsafe_base64_encode(force_bytes(user.pk)),
                             'token': CONFIRM_TOKEN.make_token(user),
                         })
-                        email_message = EmailMessage(
-                            mail_subject, message, to=[reg_form.data['email']]
-                        )
-                        email_message.send()
+                        await aenqueue_mail(mail_subject, message, [reg_form.data['email']])
                         messages.add_message(
                             request, messages.INFO,
                             "Мы отправили Вам письмо с инструкцией для активации аккаунта."
@@ -155,7 +244,16 @@ def profile_reg_page(request):
     return redirect('/')
 
 
-def profile_activate_page(request, uidb64, token):
+def activate_user(request, user):
+    """
+    Активация пользователя и вход под ним.
+    """
+    user.is_active = True
+    user.save()
+    login(request, user)
+
+
+async def profile_activate_page(request, uidb64, token):
     """
     Страница подтверждения регистрации профиля.
     :param request: объект запроса
@@ -163,15 +261,9 @@ def profile_activate_page(request, uidb64, token):
     :param token: токен
     :return redirect: перенаправление на главную страницу
     """
-    try:
-        uid = force_text(urlsafe_base64_decode(uidb64))
-        user = User.objects.get(pk=uid)
-    except(TypeError, ValueError, OverflowError, ObjectDoesNotExist):
-        user = None
+    user = await sync_to_async(user_from_uid)(uidb64)
     if user is not None and CONFIRM_TOKEN.check_token(user, token):
-        user.is_active = True
-        user.save()
-        login(request, user)
+        await sync_to_async(activate_user)(request, user)
         messages.add_message(request, messages.SUCCESS, "Вы успешно зарегистрировались.")
     else:
         messages.add_message(request, messages.ERROR,
@@ -179,15 +271,15 @@ def profile_activate_page(request, uidb64, token):
     return redirect('/')
 
 
-@login_required
-def profile_edit_page(request):
+@async_login_required
+async def profile_edit_page(request):
     """
     Страница изменения данных пользователя.
     :param request: объект запроса
     :return render: объект ответа сервера с HTML
     :return redirect: перенаправление на эту же страницу
     """
-    context = get_base_context(request)
+    context = await aget_base_context(request)
     context['edit_form'] = ProfileEditForm(initial={
         'first_name': request.user.first_name,
         'last_name': request.user.last_name,
@@ -200,11 +292,10 @@ def profile_edit_page(request):
             if request.user.first_name != edit_form.data['first_name'] or \
                     request.user.last_name != edit_form.data['last_name'] or \
                     request.user.email != edit_form.data['email']:
-                if not User.objects.filter(email=edit_form.data['email']).exists() or \
-                        request.user.email == edit_form.data['email']:
+                if not await sync_to_async(email_in_use)(edit_form.data['email'], request.user):
                     request.user.first_name = edit_form.data['first_name']
                     request.user.last_name = edit_form.data['last_name']
-                    request.user.save()
+                    await sync_to_async(request.user.save)()
                     if request.user.email != edit_form.data['email']:
                         current_site = get_current_site(request)
                         mail_subject = 'Изменение почтового адреса на сайте Reader'
@@ -214,14 +305,11 @@ def profile_edit_page(request):
                             'uid': urlsafe_base64_encode(force_bytes(request.user.pk)),
                             'token': CONFIRM_TOKEN.make_token(request.user),
                         })
-                        email_message = EmailMessage(
-                            mail_subject, message, to=[edit_form.data['email']]
-                        )
-                        email_message.send()
+                        await aenqueue_mail(mail_subject, message, [edit_form.data['email']])
                         edit_email = models.EditEmail(
                             user=request.user, email=edit_form.data['email']
                         )
-                        edit_email.save()
+                        await sync_to_async(edit_email.save)()
                         messages.add_message(request, messages.INFO,
                                              "Мы отправили Вам на почту письмо"
                                              " с инструкциями для изменения E-mail."
@@ -241,7 +329,21 @@ def profile_edit_page(request):
     return render(request, 'registration/edit.html', context)
 
 
-def profile_edit_confirm_page(request, uidb64, token):
+def apply_edit_email(user):
+    """
+    Замена E-mail пользователя на ожидающий подтверждения.
+    :param user: пользователь
+    :raise ObjectDoesNotExist: если замена не запрашивалась
+    :raise IntegrityError: если почта уже привязана к другому аккаунту
+    """
+    edit_email = models.EditEmail.objects.get(user=user)
+    user.email = edit_email.email
+    with transaction.atomic():
+        user.save()
+    edit_email.delete()
+
+
+async def profile_edit_confirm_page(request, uidb64, token):
     """
     Страница подтверждения изменения E-mail.
     :param request: объект запроса
@@ -249,18 +351,14 @@ def profile_edit_confirm_page(request, uidb64, token):
     :param token: токен
     :return redirect: перенаправление на страницу редактирования профиля
     """
-    try:
-        uid = force_text(urlsafe_base64_decode(uidb64))
-        user = User.objects.get(pk=uid)
-    except(TypeError, ValueError, OverflowError, ObjectDoesNotExist):
-        user = None
+    user = await sync_to_async(user_from_uid)(uidb64)
     if user is not None and CONFIRM_TOKEN.check_token(user, token):
         try:
-            edit_email = models.EditEmail.objects.get(user=user)
-            user.email = edit_email.email
-            user.save()
-            edit_email.delete()
+            await sync_to_async(apply_edit_email)(user)
             messages.add_message(request, messages.SUCCESS, "Вы успешно изменили E-mail.")
+        except IntegrityError:
+            messages.add_message(request, messages.ERROR,
+                                 "Выбранная почта привязана к другому аккаунту.")
         except ObjectDoesNotExist:
             messages.add_message(request, messages.ERROR,
                                  "Не удалось изменить E-mail.")
@@ -270,27 +368,35 @@ def profile_edit_confirm_page(request, uidb64, token):
     return redirect('/profile')
 
 
-@login_required
-def change_password_page(request):
+def set_new_password(request, password):
+    """
+    Смена пароля без выхода из текущей сессии.
+    """
+    request.user.set_password(password)
+    request.user.save()
+    update_session_auth_hash(request, request.user)
+
+
+@async_login_required
+async def change_password_page(request):
     """
     Страница смены пароля пользователя.
+    Хэши паролей считаются в потоке, цикл событий их не ждёт.
     :param request: объект запроса
     :return: объект ответа сервера с HTML
     """
-    context = get_base_context(request)
+    context = await aget_base_context(request)
     context['password_edit'] = PasswordEditForm()
     if request.method == 'POST':
         password_edit_form = PasswordEditForm(request.POST)
         if password_edit_form.is_valid():
             old_password = password_edit_form.data['old_password']
-            if request.user.check_password(old_password):
+            if await sync_to_async(request.user.check_password)(old_password):
                 new_password = password_edit_form.data['new_password']
                 password_confirmation = password_edit_form.data['password_confirmation']
                 if new_password == password_confirmation:
                     if new_password != old_password:
-                        request.user.set_password(new_password)
-                        request.user.save()
-                        update_session_auth_hash(request, request.user)
+                        await sync_to_async(set_new_password)(request, new_password)
                         messages.add_message(request, messages.SUCCESS,
                                              "Вы успешно изменили пароль.")
                     else:
@@ -306,7 +412,23 @@ def change_password_page(request):
     return render(request, "registration/password_edit.html", context)
 
 
-def profile_login_page(request):
+def login_error(username):
+    """
+    Сообщение о неудачной авторизации.
+    :param username: введённый логин
+    :return: пара (уровень сообщения, текст)
+    """
+    try:
+        selected_user = User.objects.get(username=username)
+    except ObjectDoesNotExist:
+        return messages.WARNING, "Пользователя с таким логином не существует," \
+                                 " но вы можете стать им :)"
+    if selected_user.is_active:
+        return messages.ERROR, "Неправильный логин или пароль."
+    return messages.ERROR, "Данный пользователь заблокирован."
+
+
+async def profile_login_page(request):
     """
     Авторизация пользователя на сайте.
     Не имеет своей страницы.
@@ -318,44 +440,33 @@ def profile_login_page(request):
         if login_form.is_valid():
             username = login_form.data['username']
             password = login_form.data['password']
-            user = authenticate(request, username=username, password=password)
+            user = await sync_to_async(authenticate)(request, username=username, password=password)
             if user is not None:
-                login(request, user)
+                await sync_to_async(login)(request, user)
                 messages.add_message(request, messages.SUCCESS, "Авторизация успешна.")
             else:
-                try:
-                    selected_user = User.objects.get(username=username)
-                    if selected_user.is_active:
-                        messages.add_message(request, messages.ERROR,
-                                             "Неправильный логин или пароль.")
-                    else:
-                        messages.add_message(request, messages.ERROR,
-                                             "Данный пользователь заблокирован.")
-                except ObjectDoesNotExist:
-                    messages.add_message(request, messages.WARNING,
-                                         "Пользователя с таким логином не существует,"
-                                         " но вы можете стать им :)")
+                messages.add_message(request, *await sync_to_async(login_error)(username))
         else:
             messages.add_message(request, messages.ERROR,
                                  "Некорректные данные в форме авторизации.")
     return redirect('/')
 
 
-@login_required
-def profile_logout_page(request):
+@async_login_required
+async def profile_logout_page(request):
     """
     Деавторизация пользователя.
     Не имеет своей страницы.
     :param request: объект запроса
     :return: перенаправление на главную страницу
     """
-    logout(request)
+    await sync_to_async(logout)(request)
     messages.add_message(request, messages.SUCCESS, "Вы успешно вышли из аккаунта")
     return redirect('/')
 
 
-@login_required
-def theme_changer_page(request):
+@async_login_required
+async def theme_changer_page(request):
     """
     Страница смены темы сайта.
     Тема привязывается к аккаунту на сайте.
@@ -363,22 +474,97 @@ def theme_changer_page(request):
     :return render: объект ответа сервера с HTML
     :return redirect: перенаправление на эту же страницу
     """
-    context = get_base_context(request)
-    theme = models.ThemeChanger.objects.get(user=request.user)
+    context = await aget_base_context(request)
+    theme_changer = await sync_to_async(
+        models.ThemeChanger.objects.filter(user=request.user).first
+    )() or models.ThemeChanger(user=request.user)
     context['theme_form'] = ThemeForm(
-        initial={'theme': theme.theme, 'bg_theme': theme.background_theme}
+        initial={'theme': theme_changer.theme, 'bg_theme': theme_changer.background_theme}
     )
     if request.method == 'POST':
         theme_form = ThemeForm(request.POST)
         if theme_form.is_valid():
-            theme_changer = models.ThemeChanger.objects.get(user=request.user)
             theme_changer.theme = theme_form.data['theme']
             theme_changer.background_theme = theme_form.data['bg_theme']
-            theme_changer.save()
+            await sync_to_async(theme_changer.save)()
             return redirect('/profile/themes')
     return render(request, 'themes.html', context)
 
 
+@async_login_required
+async def upload_avatar(request):
+    """
+    Страница загрузки аватарки пользователя.
+    До разбора тела запроса подключается ImageUploadHandler, который
+    отбрасывает неподходящий файл, не дожидаясь его полной загрузки.
+    Поэтому CSRF проверяется уже в upload_avatar_page.
+    Разбор файла и создание уменьшенных копий выполняются в потоке.
+    :param request: объект запроса
+    :return: ответ upload_avatar_page
+    """
+    upload_handler = ImageUploadHandler(request)
+    request.upload_handlers.insert(0, upload_handler)
+    return await sync_to_async(upload_avatar_page)(request, upload_handler)
+
+
+# csrf_exempt оборачивает обработчик в синхронную функцию,
+# поэтому для асинхронного обработчика отметка ставится напрямую
+upload_avatar.csrf_exempt = True
+
+
+@csrf_protect
+def upload_avatar_page(request, upload_handler):
+    """
+    Загрузка аватарки после проверки CSRF.
+    Уменьшенные копии создаются при сохранении модели.
+    Старый файл не удаляется сразу, его убирает команда gc_avatars.
+    :param request: объект запроса
+    :param upload_handler: обработчик загрузки с результатом проверки
+    :return render: объект ответа сервера с HTML
+    :return redirect: перенаправление на эту же страницу
+    """
+    context = get_base_context(request)
+    context['avatar_form'] = AddImageUser()
+    if request.method == 'POST':
+        avatar_form = AddImageUser(request.POST, request.FILES)
+        context['avatar_form'] = avatar_form
+        if upload_handler.error:
+            messages.add_message(request, messages.ERROR, upload_handler.error)
+        elif avatar_form.is_valid():
+            avatar = models.UserAvatar.objects.filter(user=request.user).first() or \
+                models.UserAvatar(user=request.user)
+            avatar.image = avatar_form.cleaned_data['image']
+            try:
+                with transaction.atomic():
+                    avatar.save()
+            except (OSError, ValueError):
+                messages.add_message(request, messages.ERROR,
+                                     "Не удалось обработать изображение.")
+            else:
+                messages.add_message(request, messages.SUCCESS, "Аватарка успешно изменена.")
+                return redirect('/profile/avatar/')
+        else:
+            for error in avatar_form.errors.get('image', ["Некорректные данные в форме."]):
+                messages.add_message(request, messages.ERROR, error)
+    return render(request, 'avatar.html', context)
+
+
+@async_login_required
+async def remove_avatar(request):
+    """
+    Удаление аватарки пользователя.
+    Не имеет своей страницы.
+    Файл может использоваться другими пользователями, поэтому
+    удаляется позже командой gc_avatars.
+    :param request: объект запроса
+    :return redirect: перенаправление на страницу аватарки
+    """
+    deleted, _ = await sync_to_async(models.UserAvatar.objects.filter(user=request.user).delete)()
+    if deleted:
+        messages.add_message(request, messages.SUCCESS, "Аватарка удалена.")
+    return redirect('/profile/avatar/')
+
+
 @admin_required
 @login_required
 def admin_page(request):
@@ -398,21 +584,57 @@ def admin_page(request):
 def admin_opportunity_users(request):
     """
     Управление пользователями.
+    Список выводится постранично по ключу из USER_ORDERINGS,
+    параметры: user (поиск), order, per_page, after, before.
     :param request: объект запроса
     :return render: объект ответа сервера с HTML
     :return redirect: перенаправление на главную страницу
     """
     context = get_base_context(request)
-    context['all_users'] = User.objects.all()
-    context['search_user'] = SearchUser()
-    if request.method == 'POST':
-        search_user = SearchUser(request.POST)
-        context['search_user'] = search_user
-        if search_user.is_valid():
-            context['all_users'] = User.objects.filter(username__contains=search_user.data['user'])
+    search_user = SearchUser(request.GET)
+    context['search_user'] = search_user
+    context['bulk_form'] = BulkUserActionForm()
+    users = User.objects.all()
+    if search_user.is_valid() and search_user.cleaned_data['user']:
+        users = search_users(users, search_user.cleaned_data['user'])
+
+    order = request.GET.get('order')
+    if order not in USER_ORDERINGS:
+        order = 'id'
+    try:
+        per_page = int(request.GET.get('per_page', settings.ADMIN_USERS_PAGE_SIZE))
+    except ValueError:
+        per_page = settings.ADMIN_USERS_PAGE_SIZE
+    per_page = max(1, min(per_page, settings.ADMIN_USERS_MAX_PAGE_SIZE))
+
+    page = keyset_paginate(
+        users, USER_ORDERINGS[order], per_page,
+        after=request.GET.get('after'), before=request.GET.get('before')
+    )
+    context['all_users'] = page.items
+    context['page'] = page
+    if page.has_next:
+        context['next_page'] = page_query(request.GET, after=page.next_cursor, before=None)
+    if page.has_previous:
+        context['previous_page'] = page_query(request.GET, before=page.previous_cursor, after=None)
     return render(request, 'admin/admin_op_users.html', context)
 
 
+def apply_user_action(action, user_ids, current_user):
+    """
+    Применяет действие из USER_ACTIONS к пользователям одним UPDATE.
+    Администратор не может изменить сам себя.
+    :param action: ключ из USER_ACTIONS
+    :param user_ids: список ID пользователей
+    :param current_user: администратор, выполняющий действие
+    :return: число изменённых пользователей
+    """
+    with transaction.atomic():
+        return User.objects.filter(id__in=user_ids).exclude(id=current_user.id).update(
+            **USER_ACTIONS[action]
+        )
+
+
 @admin_required
 @login_required
 def admin_make_admin(request, user_id):
@@ -420,13 +642,9 @@ def admin_make_admin(request, user_id):
     Делает пользователя superuser'ом.
     :param request: объект запроса
     :param user_id: ID пользователя
-    :return:
+    :return redirect: перенаправление на страницу
     """
-    selected_user = User.objects.get(id=user_id)
-    selected_user.is_superuser = 1
-    selected_user.is_staff = 1
-    selected_user.save()
-    print(request)
+    apply_user_action('promote', [user_id], request.user)
     return redirect('/admin/users')
 
 
@@ -437,13 +655,9 @@ def admin_make_user(request, user_id):
     Понижает до пользователя.
     :param request: объект запроса
     :param user_id: ID пользователя
-    :return:
+    :return redirect: перенаправление на страницу
     """
-    selected_user = User.objects.get(id=user_id)
-    selected_user.is_superuser = 0
-    selected_user.is_staff = 0
-    selected_user.save()
-    print(request)
+    apply_user_action('demote', [user_id], request.user)
     return redirect('/admin/users')
 
 
@@ -456,32 +670,135 @@ def block_user(request, user_id):
     :param user_id: ID пользователя
     :return redirect: перенаправление на страницу
     """
-    selected_user = User.objects.get(id=user_id)
-    selected_user.is_active = 0
-    selected_user.save()
-    print(request)
+    apply_user_action('block', [user_id], request.user)
     return redirect('/admin/users')
 
+
+@admin_required
+@login_required
+def unblock_user(request, user_id):
+    """
+    Разблокирует пользователя.
+    :param request: объект запроса
+    :param user_id: ID пользователя
+    :return redirect: перенаправление на страницу
+    """
+    apply_user_action('unblock', [user_id], request.user)
+    return redirect('/admin/users')
+
+
+@admin_required
+@login_required
+@require_POST
+def admin_bulk_users(request):
+    """
+    Применяет одно действие к выбранным пользователям.
+    Не имеет своей страницы.
+    :param request: объект запроса
+    :return redirect: перенаправление на список пользователей
+    """
+    bulk_form = BulkUserActionForm(request.POST)
+    if bulk_form.is_valid():
+        updated = apply_user_action(
+            bulk_form.cleaned_data['action'], bulk_form.cleaned_data['user_ids'], request.user
+        )
+        messages.add_message(request, messages.SUCCESS,
+                             "Изменено пользователей: {}.".format(updated))
+    else:
+        messages.add_message(request, messages.ERROR,
+                             "Не выбраны пользователи или действие.")
+    next_url = request.POST.get('next', '')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        next_url = '/admin/users/'
+    return redirect(next_url)
+
+
+@admin_required
+@login_required
+def admin_metrics(request):
+    """
+    Страница метрик обработчиков: время, SQL-запросы, шаблоны и размер ответа.
+    С параметром format=json отдаёт те же данные в JSON.
+    :param request: объект запроса
+    :return: объект ответа сервера с HTML или JSON
+    """
+    rows = summary(registry.snapshot())
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'views': rows})
+
+    def milliseconds(value):
+        return None if value is None else value * 1000
+
+    context = get_base_context(request)
+    context['rows'] = [
+        dict(
+            view=row['view'],
+            requests=row['requests'],
+            p50=milliseconds(row['seconds']['p50']),
+            p95=milliseconds(row['seconds']['p95']),
+            p99=milliseconds(row['seconds']['p99']),
+            queries=row['queries']['mean'],
+            queries_p95=row['queries']['p95'],
+            sql=milliseconds(row['sql_seconds']['mean']),
+            templates=milliseconds(row['template_seconds']['mean']),
+            size=row['response_bytes']['mean'],
+        )
+        for row in rows
+    ]
+    return render(request, 'admin/admin_metrics.html', context)
+
+
+def metrics_prometheus(request):
+    """
+    Метрики обработчиков в текстовом формате Prometheus.
+    Доступны администратору или по заголовку Authorization: Bearer METRICS_TOKEN.
+    :param request: объект запроса
+    :return: объект ответа сервера с текстом
+    """
+    token = settings.METRICS_TOKEN
+    authorized = request.user.is_superuser and request.user.is_staff or \
+        token and hmac.compare_digest(force_bytes(request.META.get('HTTP_AUTHORIZATION', '')),
+                                      force_bytes('Bearer ' + token))
+    if not authorized:
+        return HttpResponse(status=403)
+    return HttpResponse(prometheus_text(registry.snapshot()),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @login_required
 def get_works(request):
     """
-    Страница готовых работ
-    :param request: объекст запроса
-    :param render: объект ответа сервера HTML
+    Каталог готовых работ.
+    Выводится постранично по названию, параметры: after, before.
+    Карточки страницы берутся из кэша, см. get_works_page.
+    :param request: объект запроса
+    :return render: объект ответа сервера HTML
     """
     context = get_base_context(request)
+    works_page = get_works_page(after=request.GET.get('after'), before=request.GET.get('before'))
+    context['works_html'] = works_page['html']
+    if works_page['next_cursor']:
+        context['next_page'] = page_query(request.GET, after=works_page['next_cursor'], before=None)
+    if works_page['previous_cursor']:
+        context['previous_page'] = page_query(
+            request.GET, before=works_page['previous_cursor'], after=None
+        )
     return render(request, 'works.html', context)
 
+
 @login_required
-def show_product(request):
+def show_work(request, slug):
     """
-    Страница готовых работ
-    :param request: объекст запроса
-    :param render: объект ответа сервера HTML
+    Страница готовой работы.
+    :param request: объект запроса
+    :param slug: адрес работы
+    :return render: объект ответа сервера HTML
     """
     context = get_base_context(request)
+    context['work'] = get_object_or_404(models.Work, slug=slug)
     return render(request, 'show.html', context)
 
+
 @login_required
 def get_equations(request):
     """
@@ -491,3 +808,334 @@ def get_equations(request):
     """
     context = get_base_context(request)
     return render(request, 'equations.html', context)
+
+
+def equations_error(message, index=None):
+    """
+    Ответ с ошибкой для equations/solve/.
+    :param message: текст ошибки
+    :param index: номер уравнения в пачке
+    :return: объект ответа сервера JSON с кодом 400
+    """
+    error = {'error': message}
+    if index is not None:
+        error['index'] = index
+    return JsonResponse(error, status=400)
+
+
+@csrf_exempt
+def solve_equations(request):
+    """
+    Решение квадратных уравнений.
+    GET ?a=..&b=..&c=.. или POST JSON с одним уравнением {"a", "b", "c"},
+    списком уравнений или {"equations": [...]}.
+    Каждое уравнение в пачке - [a, b, c] или {"a", "b", "c"}.
+    Состояния не меняет, поэтому CSRF не проверяется.
+    :param request: объект запроса
+    :return: объект ответа сервера JSON
+    """
+    if request.method == 'GET':
+        try:
+            coefficients = parse_coefficients(
+                {name: request.GET[name] for name in ('a', 'b', 'c') if name in request.GET}
+            )
+        except CoefficientsError as error:
+            return equations_error(str(error))
+        return JsonResponse(cached_solve_quadratic(*coefficients))
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Метод не поддерживается.'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return equations_error('Тело запроса должно быть JSON.')
+    if isinstance(data, dict) and 'equations' not in data:
+        try:
+            return JsonResponse(cached_solve_quadratic(*parse_coefficients(data)))
+        except CoefficientsError as error:
+            return equations_error(str(error))
+
+    equations = data.get('equations') if isinstance(data, dict) else data
+    if not isinstance(equations, list):
+        return equations_error('Ожидается список уравнений.')
+    if len(equations) > settings.EQUATIONS_MAX_BATCH:
+        return equations_error(
+            'Не больше {} уравнений за запрос.'.format(settings.EQUATIONS_MAX_BATCH)
+        )
+    coefficients = []
+    for index, item in enumerate(equations):
+        try:
+            coefficients.append(parse_coefficients(item))
+        except CoefficientsError as error:
+            return equations_error(str(error), index)
+    results = cached_solve_quadratics(coefficients)
+    return JsonResponse({'count': len(results), 'results': results})
+
+
+@csrf_exempt
+@require_POST
+def solve_equation_problems(request):
+    """
+    Решение задач движком solver_engine.
+    POST JSON с одной задачей или {"problems": [...]}. Задачи:
+    {"type": "linear", "a": [[..], ..], "b": [..]} - система линейных уравнений,
+    {"type": "polynomial", "coefficients": [..]} - корни многочлена от старшей степени,
+    {"type": "integral", "function": "sin(x)", "a": .., "b": .., "n": .., "method": ..},
+    {"type": "quadratic", "a": .., "b": .., "c": ..} - квадратное уравнение.
+    Состояния не меняет, поэтому CSRF не проверяется.
+    Суммарный объём вычислений ограничен EQUATIONS_MAX_WORK.
+    :param request: объект запроса
+    :return: объект ответа сервера JSON
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return equations_error('Тело запроса должно быть JSON.')
+    single = not (isinstance(data, dict) and 'problems' in data)
+    items = [data] if single else data['problems']
+    if not isinstance(items, list):
+        return equations_error('Ожидается список задач.')
+    if len(items) > settings.EQUATIONS_MAX_BATCH:
+        return equations_error('Не больше {} задач за запрос.'.format(settings.EQUATIONS_MAX_BATCH))
+    problems = []
+    work = 0
+    for index, item in enumerate(items):
+        try:
+            problem = parse_problem(item)
+        except ProblemError as error:
+            return equations_error(str(error), None if single else index)
+        work += problem.work()
+        if work > settings.EQUATIONS_MAX_WORK:
+            return equations_error('Слишком много вычислений за один запрос, разделите задачи.',
+                                   None if single else index)
+        problems.append(problem)
+    results = solve_problems(problems)
+    if single:
+        return JsonResponse(results[0])
+    return JsonResponse({'count': len(results), 'results': results})
+
+
+@csrf_exempt
+def solve_equations_upload(request):
+    """
+    Решение уравнений из файла CSV или NDJSON.
+    Файл передаётся полем file формы multipart/form-data или телом запроса
+    с Content-Type text/csv / application/x-ndjson.
+    Ответ в том же формате отдаётся потоком по мере решения,
+    ошибки разбора пишутся в строку ответа с номером строки файла.
+    Параметр format задаёт формат явно, chunk_size - размер пачки.
+    :param request: объект запроса
+    :return: объект ответа сервера с потоком решений
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Метод не поддерживается.'}, status=405)
+    try:
+        chunk_size = int(request.GET.get('chunk_size', settings.EQUATIONS_UPLOAD_CHUNK_SIZE))
+    except ValueError:
+        return equations_error('chunk_size должен быть целым числом.')
+    chunk_size = min(max(chunk_size, 1), settings.EQUATIONS_MAX_BATCH)
+
+    if request.content_type == 'multipart/form-data':
+        upload = request.FILES.get('file')
+        if upload is None:
+            return equations_error('Не передан файл.')
+        file_format = detect_format(request.POST.get('format') or request.GET.get('format'),
+                                    upload.name, upload.content_type)
+        lines = iter(upload)
+        filename = upload.name.rsplit('.', 1)[0]
+    else:
+        file_format = detect_format(request.GET.get('format'), request.content_type)
+        lines = iter(request)
+        filename = 'equations'
+    if file_format is None:
+        return equations_error('Поддерживаются только файлы CSV и NDJSON.')
+
+    response = StreamingHttpResponse(
+        stream_solutions(lines, file_format, chunk_size),
+        content_type=CONTENT_TYPES[file_format]
+    )
+    response['Content-Disposition'] = 'attachment; filename="{}-solutions.{}"'.format(
+        filename.replace('"', ''), file_format
+    )
+    return response
+
+
+@login_required
+def search(request):
+    """
+    Полнотекстовый поиск по работам и своим сохранённым постам.
+    Параметры: q - запрос, type - work или post, page - номер страницы.
+    :param request: объект запроса
+    :return: объект ответа сервера JSON с найденными объектами по убыванию релевантности
+    """
+    query = request.GET.get('q', '')
+    kind = request.GET.get('type') or None
+    if kind is not None and kind not in dict(models.SearchDocument.KINDS):
+        return JsonResponse({'error': 'Неизвестный тип: {}.'.format(kind)}, status=400)
+    try:
+        number = int(request.GET.get('page', 1))
+    except ValueError:
+        number = 1
+    number = max(number, 1)
+
+    page = search_documents(query, request.user, kind=kind, page=number)
+    response = {
+        'query': query,
+        'count': page.count,
+        'page': page.number,
+        'pages': page.pages,
+        'results': page.results,
+    }
+    if page.has_next:
+        response['next_page'] = page_query(request.GET, page=page.number + 1)
+    if page.has_previous:
+        response['previous_page'] = page_query(request.GET, page=page.number - 1)
+    return JsonResponse(response)
+
+
+@login_required
+def saved_posts_by_tags(request):
+    """
+    Сохранённые посты пользователя с фильтром по тегам.
+    Параметры: tags - теги через запятую, type - and или or, page - номер страницы.
+    :param request: объект запроса
+    :return: объект ответа сервера JSON с постами, новыми первыми, и числом постов по каждому тегу
+    """
+    form = SearchPostForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    tags = form.cleaned_data['tags']
+    number = form.cleaned_data['page'] or 1
+    if not tags:
+        return JsonResponse({'tags': {}, 'count': 0, 'page': number, 'results': []})
+
+    result = query_tags(request.user, tags, form.cleaned_data['type'] or AND)
+    per_page = settings.SAVED_POSTS_PAGE_SIZE
+    response = {
+        'tags': result.counts,
+        'count': result.count,
+        'page': number,
+        'results': [
+            {'id': post.id, 'title': post.title, 'url': post.url, 'datetime': post.datetime}
+            for post in result.page(number, per_page)
+        ],
+    }
+    if number * per_page < result.count:
+        response['next_page'] = page_query(request.GET, page=number + 1)
+    if number > 1:
+        response['previous_page'] = page_query(request.GET, page=number - 1)
+    return JsonResponse(response)
+
+
+@login_required
+def canal_feed(request):
+    """
+    Лента постов из каналов пользователя, новые первыми.
+    Выводится постранично по времени публикации, параметр: after.
+    :param request: объект запроса
+    :return: объект ответа сервера JSON
+    """
+    page = get_feed(request.user, after=request.GET.get('after'))
+    response = {
+        'results': [
+            {
+                'id': item.id,
+                'canal': {'id': item.canal.id, 'name': item.canal.name},
+                'author': item.user.username,
+                'title': item.post.title,
+                'url': item.post.url,
+                'datetime': item.datetime,
+                'likes': like_count(item),
+            }
+            for item in page
+        ],
+    }
+    if page.has_next:
+        response['next_page'] = page_query(request.GET, after=page.next_cursor)
+    return JsonResponse(response)
+
+
+LIKE_VALUES = {
+    '1': True, 'true': True, 'on': True,
+    '0': False, 'false': False, 'off': False,
+}
+
+
+@login_required
+@require_POST
+def like_canal_post(request, post_id):
+    """
+    Лайк поста в канале пользователя.
+    Параметр liked (1 или 0) задаёт нужное состояние, повторный запрос ничего не меняет.
+    :param request: объект запроса
+    :param post_id: ID публикации в канале
+    :return: объект ответа сервера JSON с состоянием лайка и числом лайков
+    """
+    liked = LIKE_VALUES.get(request.POST.get('liked', '').lower())
+    if liked is None:
+        return JsonResponse({'error': 'Параметр liked должен быть 1 или 0.'}, status=400)
+    post = get_object_or_404(
+        models.PostsCanals.objects.filter(canal__usercanals__user=request.user).distinct(),
+        id=post_id
+    )
+    set_like(request.user, post, liked)
+    return JsonResponse({'post': post.id, 'liked': liked, 'likes': like_count(post)})
+
+
+@login_required
+def export_saved_posts(request):
+    """
+    Выгрузка сохранённых постов пользователя с тегами.
+    Под WSGI выгрузка идёт потоком. ASGIHandler читает потоковый ответ в цикле
+    событий, где к базе обращаться нельзя, поэтому под ASGI файл собирается
+    здесь же целиком и отдаётся готовым.
+    :param request: объект запроса
+    :return: объект ответа сервера с потоком или файлом NDJSON
+    """
+    content_type = 'application/x-ndjson; charset=utf-8'
+    if not isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(export_posts(request.user), content_type=content_type)
+        response['Content-Disposition'] = 'attachment; filename="saved-posts.ndjson"'
+        return response
+    export_file, size = export_posts_file(request.user)
+    response = FileResponse(
+        export_file, as_attachment=True, filename='saved-posts.ndjson',
+        content_type=content_type
+    )
+    response['Content-Length'] = size
+    return response
+
+
+@login_required
+@require_POST
+def import_saved_posts(request):
+    """
+    Загрузка сохранённых постов из NDJSON.
+    Файл передаётся полем file формы multipart/form-data или телом запроса.
+    :param request: объект запроса
+    :return: объект ответа сервера JSON с числом загруженных постов и ошибками разбора
+    """
+    if request.content_type == 'multipart/form-data':
+        upload = request.FILES.get('file')
+        if upload is None:
+            return JsonResponse({'error': 'Не передан файл.'}, status=400)
+        lines = iter(upload)
+    else:
+        lines = iter(request)
+    return JsonResponse(import_posts(request.user, lines))
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """
+    Отдача загруженных файлов при DEBUG.
+    Файлы с адресацией по содержимому никогда не меняются и кэшируются бессрочно.
+    :param request: объект запроса
+    :param path: путь к файлу относительно MEDIA_ROOT
+    :param document_root: MEDIA_ROOT
+    :param show_indexes: показывать список файлов в папке
+    :return: объект ответа сервера с файлом
+    """
+    response = serve(request, path, document_root, show_indexes)
+    if is_content_addressed(path):
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response